@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'inventario.metricas.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,11 +55,44 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Métricas de consultas SQL e tempo de resposta por rota (inventario/metricas.py).
+# Os histogramas ficam em /desempenho/ (somente staff).
+MEDIR_DESEMPENHO = os.getenv('MEDIR_DESEMPENHO', 'False') == 'True'
+# Requisições acima deste tempo (ms) são registradas no log; None desativa.
+MEDIR_DESEMPENHO_LENTO_MS = int(os.getenv('MEDIR_DESEMPENHO_LENTO_MS')) if os.getenv('MEDIR_DESEMPENHO_LENTO_MS') else None
+
+# Processos usados para converter os PDFs de um lote de OS (inventario/relatorios.py);
+# vazio = um por núcleo.
+RELATORIOS_PROCESSOS = int(os.getenv('RELATORIOS_PROCESSOS')) if os.getenv('RELATORIOS_PROCESSOS') else None
+
+# Formato dos gráficos embutidos nos PDFs: 'png' ou 'svg' (vetorial, PDF menor; usa o svglib).
+GRAFICOS_FORMATO = os.getenv('GRAFICOS_FORMATO', 'png')
+
+# Cache usado pelos dados de referência (inventario/referencias.py). O padrão
+# em memória vale por processo; com vários workers, configure um cache
+# compartilhado (Redis/Memcached) para a invalidação valer para todos.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'controle-estoque',
+    }
+}
+# Validade (s) das listas de referência: limita quanto tempo um worker pode
+# mostrar uma lista desatualizada quando o cache não é compartilhado.
+REFERENCIAS_CACHE_TIMEOUT = int(os.getenv('REFERENCIAS_CACHE_TIMEOUT', '300'))
+# Validade (s) das buscas dos campos de autocompletar (inventario/autocompletar.py).
+AUTOCOMPLETAR_CACHE_TIMEOUT = int(os.getenv('AUTOCOMPLETAR_CACHE_TIMEOUT', '30'))
+# Validade (s) dos indicadores do painel da navegação (inventario/indicadores.py).
+INDICADORES_CACHE_TIMEOUT = int(os.getenv('INDICADORES_CACHE_TIMEOUT', '60'))
+# Validade (s) dos meses encerrados na análise das OS (inventario/analise_os.py).
+ANALISE_OS_CACHE_TIMEOUT = int(os.getenv('ANALISE_OS_CACHE_TIMEOUT', '86400'))
+
 ROOT_URLCONF = 'controle_estoque.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Mesmo backend do Django, medindo o tempo de renderização (ver MEDIR_DESEMPENHO).
+        'BACKEND': 'inventario.metricas.DjangoTemplatesMedidos',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
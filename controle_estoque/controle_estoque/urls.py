@@ -26,7 +26,17 @@ urlpatterns = [
     path('categorias/excluir/<int:pk>/', views.excluir_categoria, name='excluir_categoria'),
     path('transacao/',views.listar_transacao, name='listar_transacao'),
     path('transacao/novo/', views.criar_transacao, name='criar_transacao'),
+    path('transacao/exportar/', views.exportar_transacoes, name='exportar_transacoes'),
+    path('transacao/importar/', views.importar_transacoes, name='importar_transacoes'),
+    path('transacao/documento/novo/', views.criar_documento, name='criar_documento'),
+    path('transacao/documento/<int:pk>/', views.detalhe_documento, name='detalhe_documento'),
+    path('estoque/exportar/', views.exportar_estoque, name='exportar_estoque'),
     path('relatorios/', views.transacao_pdf_view, name='relatorio_transacoes'),
+    path('relatorios/tarefas/<int:pk>/', views.acompanhar_relatorio, name='acompanhar_relatorio'),
+    path('relatorios/tarefas/<int:pk>/status/', views.status_relatorio, name='status_relatorio'),
+    path('relatorios/tarefas/<int:pk>/download/', views.baixar_relatorio, name='baixar_relatorio'),
+    path('desempenho/', views.metricas_desempenho, name='metricas_desempenho'),
+    path('autocompletar/<str:tabela>/', views.autocompletar_opcoes, name='autocompletar'),
     
     # Módulo Usuários
     path('usuario/', views.gerenciamento_usuario, name='gerenciamento_usuario'),
@@ -40,6 +50,8 @@ urlpatterns = [
     path('clientes/editar/<int:pk>/', views_cliente.editar_cliente, name='editar_cliente'),
     path('clientes/excluir/<int:pk>/', views_cliente.excluir_cliente, name='excluir_cliente'),
     path('clientes/detalhe/<int:pk>/', views_cliente.detalhe_cliente, name='detalhe_cliente'),
+    path('clientes/detalhe/<int:pk>/historico/<str:aba>/', views_cliente.historico_cliente, name='historico_cliente'),
+    path('clientes/exportar/', views_cliente.exportar_clientes, name='exportar_clientes'),
     
     # Sistemas
     path('sistemas/', views_cliente.listar_sistemas, name='listar_sistemas'),
@@ -51,6 +63,8 @@ urlpatterns = [
 
     # Agendamentos
     path('agendamentos/', views_cliente.listar_agendamentos, name='listar_agendamentos'),
+    path('agendamentos/agenda/', views_cliente.agenda_tecnicos, name='agenda_tecnicos'),
+    path('agendamentos/escalonar/', views_cliente.escalonar_agendamentos, name='escalonar_agendamentos'),
     path('clientes/<int:cliente_pk>/agendar/', views_cliente.criar_agendamento, name='criar_agendamento'),
     path('agendamentos/finalizar/<int:pk>/', views_cliente.finalizar_agendamento, name='finalizar_agendamento'),
 
@@ -59,6 +73,8 @@ urlpatterns = [
     path('os/<int:pk>/', views_cliente.detalhe_ordem_de_servico, name='detalhe_os'),
     path('os/<int:pk>/fechar/', views_cliente.fechar_ordem_de_servico, name='fechar_os'),
     path('os/<int:pk>/imprimir/', views_cliente.imprimir_ordem_de_servico_pdf, name='imprimir_os'),
+    path('os/imprimir/', views_cliente.imprimir_ordens_servico_lote, name='imprimir_os_lote'),
+    path('os/analise/', views_cliente.analise_ordens_servico, name='analise_os'),
     
     # Redefinição de Senha
     path('password-reset/', views.password_reset_request, name='password_reset'),
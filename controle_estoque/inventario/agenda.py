@@ -0,0 +1,75 @@
+import calendar
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from . import referencias
+from .models import Agendamento
+
+# ==================================
+# Agenda dos técnicos
+# ==================================
+# Um agendamento ocupa o técnico de data + hora até duracao_minutos depois.
+# A verificação de conflito lê só os agendamentos do técnico na véspera, no
+# dia e no dia seguinte (índice tecnico, data, hora): como a duração máxima
+# é de um dia, nada mais distante pode se sobrepor. O calendário lê o
+# período inteiro numa única consulta e monta a grade técnico x dia em Python.
+
+DURACAO_MAXIMA = 24 * 60
+VISOES = ('dia', 'semana', 'mes')
+
+
+def intervalo(agendamento):
+    """(início, fim) do agendamento, em horário local."""
+    inicio = datetime.combine(agendamento.data_agendamento, agendamento.hora_agendamento)
+    return inicio, inicio + timedelta(minutes=agendamento.duracao_minutos)
+
+
+def conflitos(agendamento):
+    """Agendamentos pendentes do mesmo técnico que se sobrepõem ao agendamento."""
+    if agendamento.tecnico_id is None:
+        return []
+    inicio, fim = intervalo(agendamento)
+    dia = agendamento.data_agendamento
+    vizinhos = (Agendamento.objects
+                .filter(tecnico_id=agendamento.tecnico_id, situacao='AGENDADO',
+                        data_agendamento__range=(dia - timedelta(days=1), dia + timedelta(days=1)))
+                .exclude(pk=agendamento.pk)
+                .select_related('cliente'))
+    sobrepostos = []
+    for outro in vizinhos:
+        outro_inicio, outro_fim = intervalo(outro)
+        if outro_inicio < fim and inicio < outro_fim:
+            sobrepostos.append(outro)
+    return sorted(sobrepostos, key=intervalo)
+
+
+def periodo(visao, referencia):
+    """Dias exibidos pela visão ('dia', 'semana' de segunda a domingo ou 'mes') que contém a data de referência."""
+    if visao == 'dia':
+        return [referencia]
+    if visao == 'semana':
+        segunda = referencia - timedelta(days=referencia.weekday())
+        return [segunda + timedelta(days=n) for n in range(7)]
+    primeiro = referencia.replace(day=1)
+    return [primeiro + timedelta(days=n) for n in range(calendar.monthrange(primeiro.year, primeiro.month)[1])]
+
+
+def grade(dias, tecnico_id=None):
+    """Linhas do calendário: [{'tecnico': Tecnico ou None, 'dias': [[agendamentos do dia], ...]}]."""
+    agendamentos = (Agendamento.objects.filter(data_agendamento__range=(dias[0], dias[-1]))
+                    .exclude(situacao='CANCELADO').select_related('cliente').order_by())
+    tecnicos = referencias.tecnicos()
+    if tecnico_id is not None:
+        agendamentos = agendamentos.filter(tecnico_id=tecnico_id)
+        tecnicos = [tecnico for tecnico in tecnicos if tecnico.pk == tecnico_id]
+
+    por_celula = defaultdict(list)
+    for agendamento in agendamentos:
+        por_celula[agendamento.tecnico_id, agendamento.data_agendamento].append(agendamento)
+    for celula in por_celula.values():
+        celula.sort(key=intervalo)
+
+    linhas = [{'tecnico': tecnico, 'dias': [por_celula[tecnico.pk, dia] for dia in dias]} for tecnico in tecnicos]
+    if tecnico_id is None and any(tecnico is None for tecnico, _ in por_celula):
+        linhas.append({'tecnico': None, 'dias': [por_celula[None, dia] for dia in dias]})
+    return linhas
@@ -0,0 +1,58 @@
+from django.utils import timezone
+
+from .models import ATIVO, AlertaEstoque, Produto
+
+# ==================================
+# Alertas de estoque baixo
+# ==================================
+# Cada produto pode ter um estoque mínimo e um ponto de reposição (0 = sem
+# alerta). A avaliação é incremental: estoque.py chama avaliar() com os
+# produtos de cada transação, na mesma transação de banco que alterou o
+# saldo. O custo depende do número de produtos movimentados, nunca do
+# tamanho do catálogo: duas consultas e, se algo mudou, um INSERT/UPDATE em
+# lote. Cada produto tem no máximo um alerta aberto; como a linha do produto
+# já está travada pela movimentação, não há dois alertas abertos ao mesmo tempo.
+
+
+def nivel(saldo, estoque_minimo, ponto_reposicao):
+    """'CRITICO', 'REPOR' ou None para o saldo e os limites do produto."""
+    if estoque_minimo and saldo < estoque_minimo:
+        return 'CRITICO'
+    if ponto_reposicao and saldo <= ponto_reposicao:
+        return 'REPOR'
+    return None
+
+
+def avaliar(produto_ids):
+    """Abre, atualiza ou encerra o alerta de cada produto. Deve rodar na transação que alterou o saldo."""
+    produto_ids = list(produto_ids)
+    produtos = (Produto.objects.filter(pk__in=produto_ids)
+                .values_list('pk', 'estoque_total', 'estoque_minimo', 'ponto_reposicao', 'ativo'))
+    abertos = {alerta.produto_id: alerta
+               for alerta in AlertaEstoque.objects.filter(produto_id__in=produto_ids, data_resolucao__isnull=True)}
+
+    novos, alterados, resolvidos = [], [], []
+    for pk, saldo, minimo, reposicao, ativo in produtos:
+        atual = nivel(saldo, minimo, reposicao) if ativo == ATIVO else None
+        alerta = abertos.get(pk)
+        if atual is None:
+            if alerta:
+                resolvidos.append(alerta.pk)
+        elif alerta is None:
+            novos.append(AlertaEstoque(produto_id=pk, nivel=atual, saldo=saldo))
+        elif (alerta.nivel, alerta.saldo) != (atual, saldo):
+            alerta.nivel, alerta.saldo = atual, saldo
+            alterados.append(alerta)
+
+    if novos:
+        AlertaEstoque.objects.bulk_create(novos)
+    if alterados:
+        AlertaEstoque.objects.bulk_update(alterados, ['nivel', 'saldo'])
+    if resolvidos:
+        AlertaEstoque.objects.filter(pk__in=resolvidos).update(data_resolucao=timezone.now())
+
+
+def abertos():
+    """Alertas abertos, críticos primeiro e, dentro do nível, o menor saldo primeiro."""
+    return (AlertaEstoque.objects.filter(data_resolucao__isnull=True)
+            .select_related('produto').order_by('nivel', 'saldo', 'pk'))
@@ -0,0 +1,153 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum
+from django.utils import timezone
+
+from . import referencias
+from .models import OrdemDeServico
+from .resumo_mensal import periodo_do_mes
+
+# ==================================
+# Faturamento e prazo das ordens de serviço
+# ==================================
+# Cada mês é lido com uma consulta agregada (SUM/COUNT com GROUP BY sistema
+# do cliente e técnico) sobre as OS concluídas no mês, pelo índice (status,
+# data_fechamento). O p90 do tempo de fechamento precisa dos valores: as
+# durações vêm do banco em blocos (iterator) e o percentil é calculado com
+# NumPy quando instalado, senão em Python puro (mesma interpolação linear).
+#
+# Meses já encerrados não mudam mais: ficam no cache por
+# ANALISE_OS_CACHE_TIMEOUT segundos e, em cada carga do painel, só o mês
+# corrente volta ao banco. Salvar ou excluir uma OS invalida o mês do seu
+# fechamento e, se a data mudou, o mês da data anterior (signals.py). A
+# divisão por sistema usa o sistema atual do cliente; trocar o sistema de um
+# cliente só aparece nos meses encerrados quando o cache expira.
+
+MESES_PADRAO = 12
+MESES_MAXIMO = 36
+PERCENTIL = 90
+
+
+def _chave(ano, mes):
+    return f'analise_os:{ano}-{mes:02d}'
+
+
+def _concluidas_no_mes(ano, mes):
+    inicio, fim = periodo_do_mes(ano, mes)
+    return OrdemDeServico.objects.filter(status='CONCLUIDA', data_fechamento__gte=inicio,
+                                         data_fechamento__lt=fim).order_by()
+
+
+def _horas(duracao):
+    return duracao.total_seconds() / 3600
+
+
+def percentil(valores, p=PERCENTIL):
+    """Percentil p (0 a 100) de um iterável de números, com interpolação linear; None se vazio."""
+    try:
+        import numpy
+    except ImportError:
+        return _percentil_python(sorted(valores), p)
+    dados = numpy.fromiter(valores, dtype=float)
+    return float(numpy.percentile(dados, p)) if dados.size else None
+
+
+def _percentil_python(dados, p):
+    if not dados:
+        return None
+    posicao = (len(dados) - 1) * p / 100
+    abaixo = int(posicao)
+    acima = min(abaixo + 1, len(dados) - 1)
+    return dados[abaixo] + (dados[acima] - dados[abaixo]) * (posicao - abaixo)
+
+
+def calcular_mes(ano, mes):
+    """Faturamento e tempo de fechamento das OS concluídas no mês (sem cache)."""
+    ordens = _concluidas_no_mes(ano, mes).annotate(
+        duracao=ExpressionWrapper(F('data_fechamento') - F('data_abertura'), output_field=DurationField()))
+    grupos = (ordens.values('cliente__sistema_id', 'tecnico_responsavel_id')
+              .annotate(receita=Sum('valor'), ordens=Count('pk'), duracao_total=Sum('duracao')))
+
+    resultado = {'ano': ano, 'mes': mes, 'receita': Decimal('0'), 'ordens': 0, 'media_horas': None,
+                 'por_sistema': defaultdict(lambda: {'receita': Decimal('0'), 'ordens': 0}),
+                 'por_tecnico': defaultdict(lambda: {'receita': Decimal('0'), 'ordens': 0, 'horas': 0.0})}
+    horas = 0.0
+    for grupo in grupos:
+        horas_do_grupo = _horas(grupo['duracao_total'])
+        for total in (resultado, resultado['por_sistema'][grupo['cliente__sistema_id']]):
+            total['receita'] += grupo['receita']
+            total['ordens'] += grupo['ordens']
+        tecnico = resultado['por_tecnico'][grupo['tecnico_responsavel_id']]
+        tecnico['receita'] += grupo['receita']
+        tecnico['ordens'] += grupo['ordens']
+        tecnico['horas'] += horas_do_grupo
+        horas += horas_do_grupo
+    if resultado['ordens']:
+        resultado['media_horas'] = horas / resultado['ordens']
+    resultado['p90_horas'] = percentil(_horas(duracao) for duracao in
+                                       ordens.values_list('duracao', flat=True).iterator(chunk_size=2000))
+    resultado['por_sistema'] = dict(resultado['por_sistema'])
+    resultado['por_tecnico'] = dict(resultado['por_tecnico'])
+    return resultado
+
+
+def obter_mes(ano, mes, agora=None):
+    """Resultado do mês; meses encerrados vêm do cache."""
+    inicio_do_mes_atual = periodo_do_mes(*_mes_local(agora or timezone.now()))[0]
+    if periodo_do_mes(ano, mes)[1] > inicio_do_mes_atual:
+        return calcular_mes(ano, mes)
+    resultado = cache.get(_chave(ano, mes))
+    if resultado is None:
+        resultado = calcular_mes(ano, mes)
+        cache.set(_chave(ano, mes), resultado, getattr(settings, 'ANALISE_OS_CACHE_TIMEOUT', 86400))
+    return resultado
+
+
+def invalidar(data_fechamento):
+    """Descarta o mês em cache que contém a data de fechamento (nada a fazer se None)."""
+    if data_fechamento is not None:
+        cache.delete(_chave(*_mes_local(data_fechamento)))
+
+
+def _mes_local(momento):
+    local = timezone.localtime(momento)
+    return local.year, local.month
+
+
+def meses_ate(ano, mes, quantidade):
+    """Os `quantidade` meses terminando em (ano, mes), do mais antigo ao mais recente."""
+    indice = ano * 12 + mes - 1
+    return [(n // 12, n % 12 + 1) for n in range(indice - quantidade + 1, indice + 1)]
+
+
+def painel(quantidade=MESES_PADRAO, agora=None):
+    """Linhas por mês e totais do período por sistema e por técnico, com os nomes."""
+    agora = agora or timezone.now()
+    meses = [obter_mes(ano, mes, agora) for ano, mes in meses_ate(*_mes_local(agora), quantidade)]
+
+    por_sistema = defaultdict(lambda: {'receita': Decimal('0'), 'ordens': 0})
+    por_tecnico = defaultdict(lambda: {'receita': Decimal('0'), 'ordens': 0, 'horas': 0.0})
+    for resultado in meses:
+        for sistema_id, total in resultado['por_sistema'].items():
+            por_sistema[sistema_id]['receita'] += total['receita']
+            por_sistema[sistema_id]['ordens'] += total['ordens']
+        for tecnico_id, total in resultado['por_tecnico'].items():
+            for campo in ('receita', 'ordens', 'horas'):
+                por_tecnico[tecnico_id][campo] += total[campo]
+
+    sistemas = {sistema.pk: sistema.nome for sistema in referencias.sistemas()}
+    tecnicos = {tecnico.pk: tecnico.nome for tecnico in referencias.tecnicos()}
+    return {
+        'por_mes': meses,
+        'receita': sum((resultado['receita'] for resultado in meses), Decimal('0')),
+        'ordens': sum(resultado['ordens'] for resultado in meses),
+        'por_sistema': sorted(({'nome': sistemas.get(pk, 'Sem sistema'), **total} for pk, total in por_sistema.items()),
+                              key=lambda linha: -linha['receita']),
+        'por_tecnico': sorted(({'nome': tecnicos.get(pk, 'Sem técnico'), 'receita': total['receita'],
+                                'ordens': total['ordens'], 'media_horas': total['horas'] / total['ordens']}
+                               for pk, total in por_tecnico.items()),
+                              key=lambda linha: -linha['receita']),
+    }
@@ -0,0 +1,62 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import ATIVO, INATIVO, Cliente, Produto, Tecnico
+
+# ==================================
+# Autocompletar (busca por prefixo)
+# ==================================
+# Os campos de produto, cliente e técnico não trazem mais a tabela inteira
+# no <select>: o navegador busca as opções em /autocompletar/<tabela>/?q=...
+# enquanto o usuário digita (static/js/autocompletar.js). Cada busca usa um
+# índice com o nome como prefixo, devolve no máximo LIMITE resultados e fica
+# em cache por AUTOCOMPLETAR_CACHE_TIMEOUT segundos: a mesma digitação de
+# vários usuários não volta ao banco, e um cadastro novo aparece logo.
+
+LIMITE = 20
+
+
+def _produtos(termo, todos=False):
+    # (ativo, nome) é indexado: com ativo__in a busca continua sendo um
+    # intervalo do índice para cada valor de ativo.
+    produtos = Produto.objects.filter(ativo__in=[ATIVO, INATIVO] if todos else [ATIVO], nome__istartswith=termo)
+    return [
+        {'id': pk, 'texto': nome if ativo == ATIVO else f"{nome} (inativo)"}
+        for pk, nome, ativo in produtos.order_by('nome', 'pk').values_list('pk', 'nome', 'ativo')[:LIMITE]
+    ]
+
+
+def _clientes(termo, todos=False):
+    clientes = Cliente.objects.buscar(termo).order_by('razao_social', 'pk')
+    return [
+        {'id': pk, 'texto': f"{razao_social} ({cnpj})"}
+        for pk, razao_social, cnpj in clientes.values_list('pk', 'razao_social', 'cnpj')[:LIMITE]
+    ]
+
+
+def _tecnicos(termo, todos=False):
+    tecnicos = Tecnico.objects.filter(nome__istartswith=termo).order_by('nome')
+    return [{'id': pk, 'texto': nome} for pk, nome in tecnicos.values_list('pk', 'nome')[:LIMITE]]
+
+
+BUSCAS = {
+    'produtos': _produtos,
+    'clientes': _clientes,
+    'tecnicos': _tecnicos,
+}
+
+
+def buscar(tabela, termo, todos=False):
+    """Até LIMITE opções [{'id', 'texto'}] da tabela cujo nome começa com o termo."""
+    termo = ' '.join(termo.split())[:100]
+    if not termo:
+        return []
+    # Hash do termo: chaves do Memcached não aceitam espaços nem acentos.
+    chave = f"autocompletar:{tabela}:{int(todos)}:{hashlib.sha1(termo.lower().encode('utf-8')).hexdigest()}"
+    resultados = cache.get(chave)
+    if resultados is None:
+        resultados = BUSCAS[tabela](termo, todos=todos)
+        cache.set(chave, resultados, getattr(settings, 'AUTOCOMPLETAR_CACHE_TIMEOUT', 30))
+    return resultados
@@ -0,0 +1,126 @@
+from bisect import bisect_left, insort
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+
+from . import referencias
+from .models import Agendamento
+
+# ==================================
+# Distribuição automática das visitas
+# ==================================
+# Distribui os agendamentos pendentes de um dia entre os técnicos
+# disponíveis. É um algoritmo guloso de particionamento de intervalos, sem
+# banco (escalonar recebe e devolve estruturas simples):
+#   - As visitas são percorridas por horário de início. Assim, se em nenhum
+#     momento há mais visitas simultâneas que técnicos, todas recebem um.
+#   - Cada visita vai para um técnico livre no horário, preferindo quem ainda
+#     não chegou à meta de carga (total de minutos / técnicos), depois quem já
+#     atende o mesmo bairro (cidade/bairro do cliente), depois a mesma cidade,
+#     depois o menos carregado. É o agrupamento por região que reduz o
+#     deslocamento.
+# A agenda de cada técnico é uma lista ordenada de intervalos: verificar se
+# ele está livre é uma busca binária. Para V visitas e T técnicos o custo é
+# O(V·T·log V); centenas de visitas levam poucos milissegundos.
+#
+# Só o próprio dia é considerado (uma visita da véspera que passa da
+# meia-noite não bloqueia o técnico) e o deslocamento entre visitas não
+# entra no horário: agrupar por região é o que reduz o deslocamento.
+
+Visita = namedtuple('Visita', ['pk', 'inicio', 'fim', 'cidade', 'bairro', 'tecnico_id'])
+Escala = namedtuple('Escala', ['atribuicoes', 'sem_tecnico', 'carga'])
+
+
+def escalonar(visitas, tecnico_ids, reatribuir=False):
+    """Escala das visitas (início e fim em minutos desde a meia-noite) entre os técnicos.
+
+    Sem reatribuir, visitas que já têm um dos técnicos ficam com ele e só as
+    demais são distribuídas. Retorna Escala: atribuicoes {visita: técnico},
+    sem_tecnico [visitas sem técnico livre no horário] e carga {técnico: minutos}.
+    """
+    agendas = {tecnico: [] for tecnico in tecnico_ids}
+    carga = dict.fromkeys(tecnico_ids, 0)
+    bairros = defaultdict(set)
+    cidades = defaultdict(set)
+    atribuicoes, sem_tecnico = {}, []
+
+    def reservar(visita, tecnico):
+        insort(agendas[tecnico], (visita.inicio, visita.fim))
+        carga[tecnico] += visita.fim - visita.inicio
+        bairros[tecnico].add(_regiao(visita))
+        cidades[tecnico].add(_regiao(visita)[0])
+        atribuicoes[visita.pk] = tecnico
+
+    pendentes = []
+    for visita in visitas:
+        if not reatribuir and visita.tecnico_id in agendas:
+            reservar(visita, visita.tecnico_id)
+        else:
+            pendentes.append(visita)
+    if not agendas:
+        return Escala(atribuicoes, [visita.pk for visita in pendentes], carga)
+
+    meta = sum(visita.fim - visita.inicio for visita in visitas) / len(agendas)
+    for visita in sorted(pendentes, key=lambda v: (v.inicio, v.pk)):
+        livres = [tecnico for tecnico, agenda in agendas.items() if _livre(agenda, visita)]
+        if not livres:
+            sem_tecnico.append(visita.pk)
+            continue
+        regiao = _regiao(visita)
+
+        def custo(tecnico):
+            proximidade = 0 if regiao in bairros[tecnico] else 1 if regiao[0] in cidades[tecnico] else 2
+            return carga[tecnico] >= meta, proximidade, carga[tecnico], tecnico
+
+        reservar(visita, min(livres, key=custo))
+    return Escala(atribuicoes, sem_tecnico, carga)
+
+
+def _regiao(visita):
+    return ' '.join((visita.cidade or '').split()).casefold(), ' '.join((visita.bairro or '').split()).casefold()
+
+
+def _livre(agenda, visita):
+    posicao = bisect_left(agenda, (visita.inicio, visita.fim))
+    if posicao and agenda[posicao - 1][1] > visita.inicio:
+        return False
+    return posicao == len(agenda) or agenda[posicao][0] >= visita.fim
+
+
+def agendamentos_do_dia(dia):
+    return list(Agendamento.objects.filter(situacao='AGENDADO', data_agendamento=dia)
+                .select_related('cliente').order_by('hora_agendamento', 'pk'))
+
+
+def visita(agendamento):
+    inicio = agendamento.hora_agendamento.hour * 60 + agendamento.hora_agendamento.minute
+    return Visita(agendamento.pk, inicio, inicio + agendamento.duracao_minutos,
+                  agendamento.cliente.cidade, agendamento.cliente.bairro, agendamento.tecnico_id)
+
+
+def propor(dia, tecnico_ids=None, reatribuir=False):
+    """(agendamentos do dia, Escala) sem gravar nada. Sem tecnico_ids, todos os técnicos."""
+    if tecnico_ids is None:
+        tecnico_ids = [tecnico.pk for tecnico in referencias.tecnicos()]
+    agendamentos = agendamentos_do_dia(dia)
+    return agendamentos, escalonar([visita(agendamento) for agendamento in agendamentos], tecnico_ids, reatribuir)
+
+
+def aplicar(dia, tecnico_ids=None, reatribuir=False):
+    """Recalcula e grava a escala do dia; visitas sem técnico livre ficam como estão.
+
+    Retorna (Escala, agendamentos alterados).
+    """
+    with transaction.atomic():
+        # Trava os agendamentos do dia: ninguém muda a escala entre o cálculo e a gravação.
+        list(Agendamento.objects.select_for_update()
+             .filter(situacao='AGENDADO', data_agendamento=dia).values_list('pk', flat=True))
+        agendamentos, escala = propor(dia, tecnico_ids, reatribuir)
+        alterados = []
+        for agendamento in agendamentos:
+            tecnico_id = escala.atribuicoes.get(agendamento.pk, agendamento.tecnico_id)
+            if tecnico_id != agendamento.tecnico_id:
+                agendamento.tecnico_id = tecnico_id
+                alterados.append(agendamento)
+        Agendamento.objects.bulk_update(alterados, ['tecnico'])
+    return escala, alterados
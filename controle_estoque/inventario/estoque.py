@@ -0,0 +1,246 @@
+import logging
+import random
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+from django.forms import ValidationError
+from django.utils import timezone
+
+from . import alertas, indicadores, resumo_mensal
+from .models import LoteEstoque, MovimentacaoLote, Produto, Transacao
+
+logger = logging.getLogger(__name__)
+
+# ==================================
+# Livro de estoque por lote
+# ==================================
+# O saldo fica em LoteEstoque (uma linha por produto/lote) e cada transação
+# registra em MovimentacaoLote quanto de cada lote entrou ou saiu. O custo de
+# uma entrada ou saída depende da quantidade de lotes envolvidos, não da
+# quantidade de unidades. Produto.estoque_total é atualizado na mesma
+# transação de banco.
+#
+# Concorrência: toda movimentação começa pelo UPDATE condicional em
+# Produto.estoque_total, que trava a linha do produto até o COMMIT. Duas
+# saídas simultâneas do mesmo produto ficam enfileiradas ali e a segunda só
+# passa se ainda houver saldo. Os lotes são lidos com SELECT ... FOR UPDATE,
+# sempre depois do produto, para manter a mesma ordem de travas em entradas
+# e saídas.
+
+TENTATIVAS = 5
+ESPERA_BASE = 0.05  # segundos; dobra a cada nova tentativa
+
+# MySQL: 1213 = deadlock, 1205 = tempo de espera por trava esgotado.
+ERROS_DE_CONCORRENCIA = {1213, 1205}
+
+TAMANHO_LOTE_INSERCAO = 1000
+
+
+class SaldoInsuficiente(ValidationError):
+    """Saídas de registrar_varias sem saldo. falhas é uma lista de (índice da transação, mensagem)."""
+
+    def __init__(self, falhas):
+        self.falhas = falhas
+        super().__init__([f"Item {indice + 1}: {mensagem}" for indice, mensagem in falhas])
+
+
+def registrar_transacao(transacao, lote=None):
+    """Grava a transação e movimenta o estoque numa única transação de banco, com novas tentativas em deadlock."""
+    def _executar():
+        with transaction.atomic():
+            # Se uma tentativa anterior foi desfeita, a PK atribuída não existe mais.
+            transacao.pk = None
+            transacao.save()
+            if transacao.tipo_transacao.entrada:
+                registrar_entrada(transacao, lote)
+            else:
+                registrar_saida(transacao)
+            resumo_mensal.registrar_no_resumo(transacao)
+            alertas.avaliar([transacao.produto_id])
+            transaction.on_commit(indicadores.invalidar)
+        return transacao
+    return com_retentativa(_executar)
+
+
+def com_retentativa(funcao, tentativas=TENTATIVAS, espera_base=ESPERA_BASE):
+    """Executa funcao repetindo-a com espera exponencial quando o banco aborta por deadlock."""
+    for tentativa in range(1, tentativas + 1):
+        try:
+            return funcao()
+        except OperationalError as erro:
+            # Dentro de um atomic externo o deadlock já desfez a transação inteira;
+            # quem abriu o bloco é que precisa repetir.
+            if tentativa == tentativas or connection.in_atomic_block or not _erro_de_concorrencia(erro):
+                raise
+            espera = espera_base * 2 ** (tentativa - 1) * random.uniform(0.5, 1.5)
+            logger.warning("Conflito de concorrência no estoque (%s); nova tentativa em %.3fs", erro, espera)
+            time.sleep(espera)
+
+
+def _erro_de_concorrencia(erro):
+    codigo = erro.args[0] if erro.args else None
+    if codigo in ERROS_DE_CONCORRENCIA:
+        return True
+    # SQLite não tem deadlock, mas devolve "database is locked" na disputa por escrita.
+    return isinstance(codigo, str) and 'locked' in codigo
+
+
+def registrar_entrada(transacao, lote):
+    """Soma a quantidade da transação ao saldo do lote, criando-o se necessário."""
+    lote = lote or ''
+    with transaction.atomic():
+        _ajustar_saldo(transacao.produto, transacao.quantidade)
+        lote_estoque, _ = LoteEstoque.objects.get_or_create(produto=transacao.produto, lote=lote)
+        # Um lote zerado que volta a receber unidades entra no fim da fila FIFO,
+        # como aconteceria com itens novos no modelo antigo.
+        LoteEstoque.objects.filter(pk=lote_estoque.pk, quantidade=0).update(data_criacao=timezone.now())
+        LoteEstoque.objects.filter(pk=lote_estoque.pk).update(quantidade=F('quantidade') + transacao.quantidade)
+        MovimentacaoLote.objects.create(transacao=transacao, lote_estoque=lote_estoque, quantidade=transacao.quantidade)
+
+
+def registrar_saida(transacao):
+    """Consome os lotes mais antigos (FIFO por data_criacao) até cobrir a quantidade da transação."""
+    restante = transacao.quantidade
+    consumo = []
+    with transaction.atomic():
+        if not _ajustar_saldo(transacao.produto, -transacao.quantidade):
+            raise ValidationError("Estoque insuficiente para completar a transação")
+
+        lotes = (LoteEstoque.objects
+                 .select_for_update()
+                 .filter(produto=transacao.produto, quantidade__gt=0)
+                 .order_by('data_criacao', 'pk')
+                 .values_list('pk', 'quantidade'))
+        for pk, quantidade in lotes:
+            usado = min(quantidade, restante)
+            consumo.append((pk, usado))
+            restante -= usado
+            if not restante:
+                break
+        if restante:
+            # Saldo do produto e lotes divergentes: reconciliar_estoque corrige.
+            raise ValidationError("Estoque insuficiente para completar a transação")
+
+        # Só o último lote consumido pode ficar com saldo; os demais zeram num único UPDATE.
+        *esgotados, (ultimo_pk, ultimo_usado) = consumo
+        if esgotados:
+            LoteEstoque.objects.filter(pk__in=[pk for pk, _ in esgotados]).update(quantidade=0)
+        LoteEstoque.objects.filter(pk=ultimo_pk).update(quantidade=F('quantidade') - ultimo_usado)
+        MovimentacaoLote.objects.bulk_create([
+            MovimentacaoLote(transacao=transacao, lote_estoque_id=pk, quantidade=usado)
+            for pk, usado in consumo
+        ])
+
+
+def _ajustar_saldo(produto, delta):
+    """Aplica delta ao saldo do produto sem deixá-lo negativo. Retorna False se não houver saldo."""
+    produtos = Produto.objects.filter(pk=produto.pk)
+    if delta < 0:
+        produtos = produtos.filter(estoque_total__gte=-delta)
+    return produtos.update(estoque_total=F('estoque_total') + delta) == 1
+
+
+# ---------- Várias transações de uma vez ----------
+
+def registrar_documento(documento, itens):
+    """Grava o documento e uma Transacao por item (produto_id, quantidade, lote) numa única transação de banco."""
+    def _executar():
+        with transaction.atomic():
+            documento.pk = None
+            documento.save()
+            transacoes = [
+                Transacao(documento_id=documento.pk, tipo_transacao=documento.tipo_transacao,
+                          usuario_id=documento.usuario_id, produto_id=produto_id, quantidade=quantidade,
+                          data=documento.data, observacoes=documento.observacoes)
+                for produto_id, quantidade, _ in itens
+            ]
+            registrar_varias(transacoes, [lote for _, _, lote in itens], {'documento': documento})
+        return documento
+    return com_retentativa(_executar)
+
+
+def registrar_varias(transacoes, lotes, cabecalho):
+    """Grava uma lista de transações e movimenta o estoque com inserções em lote.
+
+    transacoes são instâncias não salvas, todas ligadas ao mesmo cabeçalho
+    (ex.: {'importacao': importacao}), usado para reler as PKs no MySQL, que
+    não as devolve no bulk_create. lotes traz o lote de cada transação (só
+    usado nas entradas). As transações são aplicadas na ordem da lista; se
+    alguma saída ficar sem saldo, nada é gravado e SaldoInsuficiente lista
+    todas as que falharam. Deve rodar dentro de transaction.atomic.
+    """
+    produto_ids = sorted({t.produto_id for t in transacoes})
+    # Mesma ordem de travas do caminho unitário: produtos primeiro (por PK), depois lotes.
+    saldos = dict(Produto.objects.select_for_update().filter(pk__in=produto_ids)
+                  .order_by('pk').values_list('pk', 'estoque_total'))
+
+    novos = {(t.produto_id, lote or '') for t, lote in zip(transacoes, lotes) if t.tipo_transacao.entrada}
+    existentes = set(LoteEstoque.objects.filter(produto_id__in=produto_ids).values_list('produto_id', 'lote'))
+    LoteEstoque.objects.bulk_create(
+        [LoteEstoque(produto_id=produto_id, lote=lote) for produto_id, lote in novos - existentes],
+        batch_size=TAMANHO_LOTE_INSERCAO,
+    )
+    fila = defaultdict(list)  # lotes de cada produto na ordem FIFO
+    por_chave = {}
+    for lote_estoque in (LoteEstoque.objects.select_for_update().filter(produto_id__in=produto_ids)
+                         .order_by('data_criacao', 'pk').only('pk', 'produto_id', 'lote', 'quantidade', 'data_criacao')):
+        fila[lote_estoque.produto_id].append(lote_estoque)
+        por_chave[(lote_estoque.produto_id, lote_estoque.lote)] = lote_estoque
+
+    movimentos, alterados, falhas = [], {}, []
+    agora = timezone.now()
+    for indice, (transacao, lote) in enumerate(zip(transacoes, lotes)):
+        produto_id = transacao.produto_id
+        if transacao.tipo_transacao.entrada:
+            lote_estoque = por_chave[(produto_id, lote or '')]
+            if lote_estoque.quantidade == 0:
+                # Como em registrar_entrada: o lote zerado vai para o fim da fila FIFO.
+                lote_estoque.data_criacao = agora + timedelta(microseconds=indice)
+                fila[produto_id].remove(lote_estoque)
+                fila[produto_id].append(lote_estoque)
+            lote_estoque.quantidade += transacao.quantidade
+            alterados[lote_estoque.pk] = lote_estoque
+            movimentos.append((indice, lote_estoque.pk, transacao.quantidade))
+            saldos[produto_id] += transacao.quantidade
+            continue
+
+        if saldos[produto_id] < transacao.quantidade:
+            falhas.append((indice, f"Estoque insuficiente. Disponível: {saldos[produto_id]}, Requerido: {transacao.quantidade}"))
+            continue
+        saldos[produto_id] -= transacao.quantidade
+        restante = transacao.quantidade
+        for lote_estoque in fila[produto_id]:
+            usado = min(lote_estoque.quantidade, restante)
+            if not usado:
+                continue
+            lote_estoque.quantidade -= usado
+            alterados[lote_estoque.pk] = lote_estoque
+            movimentos.append((indice, lote_estoque.pk, usado))
+            restante -= usado
+            if not restante:
+                break
+        if restante:
+            # Saldo do produto e lotes divergentes: reconciliar_estoque corrige.
+            falhas.append((indice, "Estoque insuficiente nos lotes do produto"))
+    if falhas:
+        raise SaldoInsuficiente(falhas)
+
+    Transacao.objects.bulk_create(transacoes, batch_size=TAMANHO_LOTE_INSERCAO)
+    if any(t.pk is None for t in transacoes):
+        pks = Transacao.objects.filter(**cabecalho).order_by('pk').values_list('pk', flat=True)
+        for transacao, pk in zip(transacoes, pks, strict=True):
+            transacao.pk = pk
+    MovimentacaoLote.objects.bulk_create([
+        MovimentacaoLote(transacao_id=transacoes[indice].pk, lote_estoque_id=lote_pk, quantidade=quantidade)
+        for indice, lote_pk, quantidade in movimentos
+    ], batch_size=TAMANHO_LOTE_INSERCAO)
+    LoteEstoque.objects.bulk_update(alterados.values(), ['quantidade', 'data_criacao'], batch_size=TAMANHO_LOTE_INSERCAO)
+    Produto.objects.bulk_update([Produto(pk=pk, estoque_total=saldo) for pk, saldo in saldos.items()],
+                                ['estoque_total'], batch_size=TAMANHO_LOTE_INSERCAO)
+    resumo_mensal.registrar_varias_no_resumo(transacoes)
+    alertas.avaliar(produto_ids)
+    transaction.on_commit(indicadores.invalidar)
+    return transacoes
@@ -0,0 +1,89 @@
+import csv
+import tempfile
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+
+# ==================================
+# Exportação CSV/XLSX em fluxo
+# ==================================
+# As linhas são lidas em blocos de TAMANHO_LOTE e escritas na resposta conforme
+# chegam, então a memória usada não cresce com o período exportado. Os blocos
+# são paginados pela PK (WHERE pk > último ORDER BY pk) em vez de depender só
+# de .iterator(): o driver do MySQL carrega o resultado inteiro de uma
+# consulta na memória, mesmo com iterator().
+
+TAMANHO_LOTE = 2000
+FORMATOS = ('csv', 'xlsx')
+# Marca de ordem de bytes no início do CSV: sem ela o Excel não reconhece o
+# UTF-8 e troca os acentos.
+BOM = '\ufeff'
+
+
+class _Eco:
+    """Pseudo-arquivo para o csv.writer: devolve a linha em vez de guardá-la."""
+    def write(self, valor):
+        return valor
+
+
+def linhas_por_pk(queryset, campos, tamanho=TAMANHO_LOTE):
+    """Gera tuplas com os campos pedidos, lendo o queryset em blocos ordenados pela PK."""
+    ultimo = None
+    while True:
+        bloco = queryset.order_by('pk')
+        if ultimo is not None:
+            bloco = bloco.filter(pk__gt=ultimo)
+        linhas = list(bloco.values_list('pk', *campos)[:tamanho])
+        for linha in linhas:
+            yield linha[1:]
+        if len(linhas) < tamanho:
+            return
+        ultimo = linhas[-1][0]
+
+
+def exportar(formato, nome_arquivo, cabecalho, linhas):
+    """Resposta de download com as linhas no formato pedido ('csv' ou 'xlsx')."""
+    if formato == 'xlsx':
+        return _exportar_xlsx(nome_arquivo, cabecalho, linhas)
+    return _exportar_csv(nome_arquivo, cabecalho, linhas)
+
+
+def _formatar(valor):
+    if hasattr(valor, 'tzinfo') and valor.tzinfo is not None:
+        return timezone.localtime(valor).replace(tzinfo=None)
+    return valor
+
+
+def _exportar_csv(nome_arquivo, cabecalho, linhas):
+    escritor = csv.writer(_Eco(), delimiter=';')
+
+    def gerar():
+        yield BOM + escritor.writerow(cabecalho)
+        for linha in linhas:
+            yield escritor.writerow([_formatar(valor) for valor in linha])
+
+    response = StreamingHttpResponse(gerar(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}.csv"'
+    return response
+
+
+def _exportar_xlsx(nome_arquivo, cabecalho, linhas):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        return HttpResponse("Exportação XLSX indisponível: instale o pacote openpyxl.", status=501)
+
+    # Modo write_only grava as linhas em disco conforme chegam; o arquivo final
+    # é enviado em blocos pelo FileResponse.
+    planilha = Workbook(write_only=True)
+    aba = planilha.create_sheet(title=nome_arquivo[:31])
+    aba.append(cabecalho)
+    for linha in linhas:
+        aba.append([_formatar(valor) for valor in linha])
+    arquivo = tempfile.TemporaryFile()
+    planilha.save(arquivo)
+    arquivo.seek(0)
+    return FileResponse(
+        arquivo, as_attachment=True, filename=f"{nome_arquivo}.xlsx",
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
@@ -3,12 +3,75 @@ from django.forms import ValidationError
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 import calendar
+from django.urls import reverse
 from django.utils import timezone
 
+from . import agenda, estoque, referencias
+
 # LINHA DE IMPORTAÇÃO COMPLETA COM TODOS OS MODELS DO PROJETO
-from .models import (Produto, Categoria, TipoTransacao, Transacao, Item, 
+from .models import (ATIVO, Produto, Categoria, Transacao, DocumentoTransacao,
                      Sistema, Tecnico, Cliente, Agendamento, OrdemDeServico)
 
+class ReferenciaChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField que monta as opções e valida a escolha a partir de referencias, sem consultar o banco."""
+    def __init__(self, tabela, **kwargs):
+        self.tabela = tabela
+        super().__init__(queryset=referencias.modelo(tabela).objects.none(), **kwargs)
+
+    def _get_choices(self):
+        opcoes = [(obj.pk, self.label_from_instance(obj)) for obj in referencias.obter(self.tabela)]
+        if self.empty_label is not None:
+            opcoes.insert(0, ('', self.empty_label))
+        return opcoes
+
+    choices = property(_get_choices, forms.ChoiceField.choices.fset)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        for obj in referencias.obter(self.tabela):
+            if str(obj.pk) == str(value):
+                return obj
+        raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice',
+                              params={'value': value})
+
+
+def usar_referencia(form, campo, tabela, widget=None):
+    """Troca o campo de FK do formulário por um ReferenciaChoiceField com o mesmo rótulo e obrigatoriedade."""
+    original = form.fields[campo]
+    form.fields[campo] = ReferenciaChoiceField(tabela, required=original.required, label=original.label,
+                                               help_text=original.help_text, empty_label=original.empty_label,
+                                               widget=widget)
+
+class AutocompletarSelect(forms.Select):
+    """<select> que só traz a opção escolhida; as demais são buscadas em /autocompletar/<tabela>/ pelo autocompletar.js."""
+    def __init__(self, tabela, todos=False, attrs=None):
+        super().__init__(attrs)
+        self.tabela = tabela
+        self.todos = todos
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        url = reverse('autocompletar', args=[self.tabela])
+        context['widget']['attrs']['data-autocompletar'] = url + ('?todos=1' if self.todos else '')
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        escolhidos = {str(v) for v in value if str(v).isdigit()}
+        opcoes = self.choices
+        if hasattr(opcoes, 'queryset'):
+            # ModelChoiceField: consulta só a opção escolhida, não a tabela.
+            selecionadas = [opcoes.choice(obj) for obj in opcoes.queryset.filter(pk__in=escolhidos)] if escolhidos else []
+            vazia = [('', opcoes.field.empty_label)] if opcoes.field.empty_label is not None else []
+        else:
+            selecionadas = [(v, rotulo) for v, rotulo in opcoes if str(v) in escolhidos]
+            vazia = [(v, rotulo) for v, rotulo in opcoes if v in ('', None)][:1]
+        self.choices = vazia + selecionadas
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = opcoes
+
 class DateFilterForm(forms.Form):
     MONTH_CHOICES = [(m, calendar.month_name[m]) for m in range(1, 13)]
     YEAR_CHOICES = [(y, y) for y in range(2020, timezone.now().year + 2)]
@@ -32,15 +95,31 @@ class CadastroUsuarioForm(UserCreationForm):
 class ProdutoForm(forms.ModelForm):
     class Meta:
         model = Produto
-        fields = ['nome', 'descricao', 'categoria']
+        fields = ['nome', 'descricao', 'categoria', 'valor_unitario', 'estoque_minimo', 'ponto_reposicao']
         widgets = {
             'descricao': forms.Textarea(attrs={'rows': 3}),
         }
+    CAMPOS_ZERO_SE_VAZIO = ('valor_unitario', 'estoque_minimo', 'ponto_reposicao')
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        usar_referencia(self, 'categoria', 'categorias')
+        # Em branco = 0 (sem valor / sem alerta).
+        for campo in self.CAMPOS_ZERO_SE_VAZIO:
+            self.fields[campo].required = False
         for field in self.fields:
             self.fields[field].widget.attrs.update({'class': 'form-control'})
-        self.fields['categoria'].queryset = Categoria.objects.all()
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for campo in self.CAMPOS_ZERO_SE_VAZIO:
+            if campo not in self.errors and cleaned_data.get(campo) is None:
+                cleaned_data[campo] = 0
+        minimo = cleaned_data.get('estoque_minimo')
+        reposicao = cleaned_data.get('ponto_reposicao')
+        if minimo and reposicao and reposicao < minimo:
+            self.add_error('ponto_reposicao', "O ponto de reposição não pode ser menor que o estoque mínimo.")
+        return cleaned_data
 
 class CategoriaForm(forms.ModelForm):
     class Meta:
@@ -53,7 +132,8 @@ class CategoriaForm(forms.ModelForm):
             self.fields[field].widget.attrs.update({'class': 'form-control'})
 
 class TransacaoForm(forms.ModelForm):
-    produto = forms.ModelChoiceField(queryset=Produto.objects.all(), label="Produto")
+    produto = forms.ModelChoiceField(queryset=Produto.objects.filter(ativo=ATIVO), label="Produto",
+                                     widget=AutocompletarSelect('produtos'))
     lote = forms.CharField(required=False, label="Número do Lote", help_text="Obrigatório para entradas de estoque")
     
     class Meta:
@@ -64,9 +144,9 @@ class TransacaoForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         self.user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
+        usar_referencia(self, 'tipo_transacao', 'tipos_transacao')
         for field in self.fields:
             self.fields[field].widget.attrs.update({'class': 'form-control'})
-        self.fields['tipo_transacao'].queryset = TipoTransacao.objects.all()
     
     def clean(self):
         cleaned_data = super().clean()
@@ -75,6 +155,9 @@ class TransacaoForm(forms.ModelForm):
         quantidade = cleaned_data.get('quantidade')
         lote = cleaned_data.get('lote')
         
+        if quantidade is not None and quantidade <= 0:
+            raise ValidationError({'quantidade': "A quantidade deve ser maior que zero"})
+        
         if tipo_transacao and tipo_transacao.entrada:
             if not lote:
                 raise ValidationError({'lote': "Informe o número do lote para entrada de estoque"})
@@ -90,26 +173,87 @@ class TransacaoForm(forms.ModelForm):
         transacao.usuario = self.user
         transacao.produto = self.cleaned_data['produto']
         if commit:
-            transacao.save()
-            self.processar_itens(transacao)
+            # O saldo é conferido de novo sob trava: outra saída pode ter passado
+            # pelo clean() ao mesmo tempo.
+            estoque.registrar_transacao(transacao, self.cleaned_data.get('lote'))
         return transacao
-    
-    def processar_itens(self, transacao):
-        lote = self.cleaned_data.get('lote')
-        produto = self.cleaned_data.get('produto')
-        quantidade = self.cleaned_data['quantidade']
-        
-        if transacao.tipo_transacao.entrada:
-            itens = [ Item(produto=produto, transacao=transacao, lote=lote, disponivel=True) for _ in range(quantidade) ]
-            Item.objects.bulk_create(itens)
-        else:
-            itens = Item.objects.filter(produto=produto, disponivel=True).order_by('data_criacao')[:quantidade]
-            if itens.count() < quantidade:
-                raise ValidationError("Estoque insuficiente para completar a transação")
-            for item in itens:
-                item.disponivel = False
-                item.transacao = transacao
-                item.save()
+
+class DocumentoTransacaoForm(forms.ModelForm):
+    class Meta:
+        model = DocumentoTransacao
+        fields = ['tipo_transacao', 'numero', 'observacoes']
+        widgets = { 'observacoes': forms.Textarea(attrs={'rows': 2}), }
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        usar_referencia(self, 'tipo_transacao', 'tipos_transacao')
+        for field in self.fields:
+            self.fields[field].widget.attrs.update({'class': 'form-control'})
+
+class ItemDocumentoForm(forms.Form):
+    # As opções são preenchidas pelo formset, com uma única consulta para todas as linhas.
+    produto = forms.TypedChoiceField(coerce=int, label="Produto", widget=AutocompletarSelect('produtos'))
+    quantidade = forms.IntegerField(min_value=1, label="Quantidade")
+    lote = forms.CharField(required=False, max_length=100, label="Lote")
+
+class BaseItensDocumentoFormSet(forms.BaseFormSet):
+    def __init__(self, *args, tipo_transacao=None, **kwargs):
+        self.tipo_transacao = tipo_transacao
+        super().__init__(*args, **kwargs)
+        # Só os produtos enviados nas linhas (o navegador busca os demais por
+        # autocompletar): uma consulta, qualquer que seja o tamanho do catálogo.
+        enviados = {valor for chave, valor in self.data.items()
+                    if chave.startswith(f'{self.prefix}-') and chave.endswith('-produto') and str(valor).isdigit()}
+        self.opcoes_produto = [('', '---------')]
+        if enviados:
+            self.opcoes_produto += Produto.objects.filter(ativo=ATIVO, pk__in=enviados).values_list('pk', 'nome')
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        form.fields['produto'].choices = self.opcoes_produto
+        for field in form.fields.values():
+            field.widget.attrs.update({'class': 'form-control'})
+
+    def itens(self):
+        """Lista de (produto_id, quantidade, lote) das linhas preenchidas."""
+        return [(dados['produto'], dados['quantidade'], dados.get('lote', '')) for dados in self._linhas()]
+
+    def _linhas(self):
+        return [form.cleaned_data for form in self.forms if form.cleaned_data and not form.cleaned_data.get('DELETE')]
+
+    def clean(self):
+        if any(self.errors):
+            return
+        linhas = self._linhas()
+        if not linhas:
+            raise ValidationError("Informe pelo menos um item.")
+        if self.tipo_transacao is None:
+            return
+        if self.tipo_transacao.entrada:
+            for form in self.forms:
+                if form.cleaned_data and not form.cleaned_data.get('lote'):
+                    form.add_error('lote', "Informe o lote para entrada de estoque")
+            return
+
+        # Saída: uma única consulta de saldo para todos os produtos do documento.
+        requerido = {}
+        for dados in linhas:
+            requerido[dados['produto']] = requerido.get(dados['produto'], 0) + dados['quantidade']
+        disponivel = dict(Produto.objects.filter(pk__in=requerido).values_list('pk', 'estoque_total'))
+        nomes = dict(self.opcoes_produto[1:])
+        faltas = [
+            f"{nomes[pk]}: disponível {disponivel.get(pk, 0)}, requerido {quantidade}"
+            for pk, quantidade in requerido.items() if disponivel.get(pk, 0) < quantidade
+        ]
+        if faltas:
+            raise ValidationError(["Estoque insuficiente."] + faltas)
+
+ItensDocumentoFormSet = forms.formset_factory(ItemDocumentoForm, formset=BaseItensDocumentoFormSet, extra=3)
+
+class ImportacaoTransacaoForm(forms.Form):
+    arquivo = forms.FileField(label="Arquivo CSV", help_text="Colunas: produto; tipo; quantidade; lote; observacoes")
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['arquivo'].widget.attrs.update({'class': 'form-control', 'accept': '.csv,text/csv'})
 
 # ### FORMS DO MÓDULO DE CLIENTES ###
 
@@ -142,6 +286,7 @@ class ClienteForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        usar_referencia(self, 'sistema', 'sistemas')
         for name, field in self.fields.items():
             if name in ['sistema', 'tipo_contrato']:
                 field.widget.attrs.update({'class': 'form-select'})
@@ -151,16 +296,40 @@ class ClienteForm(forms.ModelForm):
 class AgendamentoForm(forms.ModelForm):
     class Meta:
         model = Agendamento
-        fields = ['tecnico', 'descricao', 'data_agendamento', 'hora_agendamento']
+        fields = ['tecnico', 'descricao', 'data_agendamento', 'hora_agendamento', 'duracao_minutos']
         widgets = {
             'data_agendamento': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
             'hora_agendamento': forms.TimeInput(attrs={'type': 'time', 'class': 'form-control'}),
+            'duracao_minutos': forms.NumberInput(attrs={'class': 'form-control', 'step': 15}),
             'descricao': forms.Textarea(attrs={'rows': 3, 'class': 'form-control'}),
         }
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        usar_referencia(self, 'tecnico', 'tecnicos', widget=AutocompletarSelect('tecnicos'))
         self.fields['tecnico'].widget.attrs.update({'class': 'form-select'})
 
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.errors:
+            return cleaned_data
+        # O self.instance só recebe os valores do formulário depois do clean
+        # (_post_clean): monta um agendamento provisório com os campos do horário.
+        provisorio = Agendamento(
+            pk=self.instance.pk,
+            tecnico=cleaned_data.get('tecnico'),
+            data_agendamento=cleaned_data['data_agendamento'],
+            hora_agendamento=cleaned_data['hora_agendamento'],
+            duracao_minutos=cleaned_data['duracao_minutos'],
+        )
+        sobrepostos = agenda.conflitos(provisorio)
+        if sobrepostos:
+            ocupado = ', '.join(
+                f"{outro.hora_agendamento:%H:%M} ({outro.duracao_minutos} min, {outro.cliente.fantasia or outro.cliente.razao_social})"
+                for outro in sobrepostos
+            )
+            raise ValidationError(f"{provisorio.tecnico} já tem agendamento nesse horário: {ocupado}.")
+        return cleaned_data
+
 class FinalizarAgendamentoForm(forms.ModelForm):
     class Meta:
         model = Agendamento
@@ -170,6 +339,7 @@ class FinalizarAgendamentoForm(forms.ModelForm):
         }
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        usar_referencia(self, 'atendido_por', 'tecnicos', widget=AutocompletarSelect('tecnicos'))
         self.fields['atendido_por'].widget.attrs.update({'class': 'form-select'})
         self.fields['situacao'].widget.attrs.update({'class': 'form-select'})
         self.fields['situacao'].choices = [('CONCLUIDO', 'Concluído'), ('CANCELADO', 'Cancelado')]
@@ -183,6 +353,7 @@ class OrdemDeServicoAberturaForm(forms.ModelForm):
         }
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        usar_referencia(self, 'tecnico_responsavel', 'tecnicos', widget=AutocompletarSelect('tecnicos'))
         self.fields['tecnico_responsavel'].widget.attrs.update({'class': 'form-select'})
         self.fields['tecnico_responsavel'].label = "Técnico Responsável"
         self.fields['problema_relatado'].label = "Problema Relatado"
@@ -199,4 +370,33 @@ class OrdemDeServicoFechamentoForm(forms.ModelForm):
         self.fields['status'].widget.attrs.update({'class': 'form-select'})
         self.fields['valor'].widget.attrs.update({'class': 'form-control'})
         self.fields['solucao_aplicada'].label = "Solução Aplicada / Laudo Técnico"
-        self.fields['status'].choices = [('CONCLUIDA', 'Concluída'), ('CANCELADA', 'Cancelada')]
\ No newline at end of file
+        self.fields['status'].choices = [('CONCLUIDA', 'Concluída'), ('CANCELADA', 'Cancelada')]
+
+class ImpressaoOrdensServicoForm(forms.Form):
+    data_inicio = forms.DateField(label="Abertas de", required=False,
+                                  widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    data_fim = forms.DateField(label="Até", required=False,
+                               widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    cliente = forms.ModelChoiceField(queryset=Cliente.objects.all(), required=False,
+                                     widget=AutocompletarSelect('clientes', attrs={'class': 'form-select'}))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        inicio, fim = cleaned_data.get('data_inicio'), cleaned_data.get('data_fim')
+        if not cleaned_data.get('cliente') and not (inicio and fim):
+            raise ValidationError("Informe o cliente ou o período (início e fim).")
+        if inicio and fim and fim < inicio:
+            raise ValidationError("A data final não pode ser anterior à inicial.")
+        return cleaned_data
+
+    def parametros(self):
+        """Parâmetros da tarefa 'ordens_servico_lote' (relatorios.ordens_do_lote)."""
+        dados = self.cleaned_data
+        parametros = {}
+        if dados['cliente']:
+            parametros['cliente'] = dados['cliente'].pk
+        if dados['data_inicio']:
+            parametros['inicio'] = dados['data_inicio'].isoformat()
+        if dados['data_fim']:
+            parametros['fim'] = dados['data_fim'].isoformat()
+        return parametros
@@ -0,0 +1,103 @@
+import base64
+import hashlib
+import io
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+# ==================================
+# Gráficos dos relatórios
+# ==================================
+# Cada gráfico é desenhado com a API orientada a objetos (Figure), sem o
+# estado global do pyplot, então pode ser gerado em várias threads ao mesmo
+# tempo. O resultado fica num cache LRU em memória, indexado por um hash do
+# conteúdo (dados, título e formato): relatórios com os mesmos dados reutilizam
+# a imagem já gerada.
+#
+# O formato padrão vem de settings.GRAFICOS_FORMATO. 'svg' é vetorial e sai
+# menor e mais nítido no PDF; 'png' não depende do svglib no xhtml2pdf.
+
+TIPOS_MIME = {'png': 'image/png', 'svg': 'image/svg+xml'}
+TAMANHO_CACHE = 128
+
+
+class _CacheLRU:
+    def __init__(self, tamanho):
+        self.tamanho = tamanho
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave):
+        with self._trava:
+            valor = self._itens.get(chave)
+            if valor is not None:
+                self._itens.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave, valor):
+        with self._trava:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+
+    def __len__(self):
+        return len(self._itens)
+
+
+cache = _CacheLRU(TAMANHO_CACHE)
+
+
+def formato_padrao():
+    return getattr(settings, 'GRAFICOS_FORMATO', 'png')
+
+
+def grafico_pizza(data, title, formato=None):
+    """Bytes do gráfico de pizza (PNG ou SVG) para uma lista de {'produto__nome', 'total_quantidade'}."""
+    if not data:
+        return None
+    formato = formato or formato_padrao()
+    if formato not in TIPOS_MIME:
+        raise ValueError(f"Formato de gráfico inválido: {formato}")
+
+    labels = [str(item['produto__nome']) for item in data]
+    sizes = [item['total_quantidade'] for item in data]
+    chave = hashlib.sha256(json.dumps(['pizza', labels, sizes, title, formato]).encode('utf-8')).hexdigest()
+    imagem = cache.obter(chave)
+    if imagem is None:
+        imagem = _desenhar_pizza(labels, sizes, title, formato)
+        cache.guardar(chave, imagem)
+    return imagem
+
+
+def grafico_pizza_data_uri(data, title, formato=None):
+    """Mesmo gráfico como data URI, pronto para o <img src> do template do PDF."""
+    formato = formato or formato_padrao()
+    imagem = grafico_pizza(data, title, formato)
+    if imagem is None:
+        return None
+    return f"data:{TIPOS_MIME[formato]};base64,{base64.b64encode(imagem).decode('ascii')}"
+
+
+def _desenhar_pizza(labels, sizes, title, formato):
+    # Importado aqui: o matplotlib leva centenas de ms para carregar e só é
+    # necessário quando um gráfico que não está no cache é desenhado.
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(6, 4))  # Tamanho ajustado para PDF
+    ax = fig.subplots()
+    ax.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90, textprops={'fontsize': 8})
+    ax.axis('equal')  # Garante que o gráfico seja um círculo.
+    ax.set_title(title, fontsize=12)
+
+    buf = io.BytesIO()
+    # Sem data no metadado: o mesmo gráfico gera sempre os mesmos bytes.
+    metadata = {'Date': None} if formato == 'svg' else None
+    fig.savefig(buf, format=formato, bbox_inches='tight', metadata=metadata)
+    return buf.getvalue()
@@ -0,0 +1,131 @@
+import csv
+from collections import namedtuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import estoque
+from .models import ATIVO, ImportacaoTransacao, Produto, TipoTransacao, Transacao
+
+# ==================================
+# Importação de transações por CSV
+# ==================================
+# Todas as linhas são validadas antes de gravar qualquer coisa: produtos e
+# tipos de transação são resolvidos com uma consulta para o arquivo inteiro
+# (não uma por linha) e, se alguma linha tiver erro, nada é importado e a
+# lista de erros volta com o número de cada linha. Sem erros, as transações
+# são gravadas por estoque.registrar_varias numa única transação de banco.
+#
+# Colunas (a primeira linha é o cabeçalho; separador ';' ou ','):
+#   produto      ID ou nome exato do produto
+#   tipo         ID ou nome exato do tipo de transação
+#   quantidade   inteiro maior que zero
+#   lote         obrigatório nas entradas
+#   observacoes  opcional
+
+COLUNAS_OBRIGATORIAS = ('produto', 'tipo', 'quantidade')
+COLUNAS_OPCIONAIS = ('lote', 'observacoes')
+
+ErroImportacao = namedtuple('ErroImportacao', ['linha', 'mensagem'])
+ResultadoImportacao = namedtuple('ResultadoImportacao', ['importacao', 'erros', 'linhas'])
+
+
+def importar_csv(arquivo, usuario, nome_arquivo=''):
+    """Importa as transações de um arquivo CSV em modo texto. Retorna um ResultadoImportacao.
+
+    Com erros, importacao é None e nada foi gravado.
+    """
+    linhas, erros = _ler(arquivo)
+    if erros or not linhas:
+        return ResultadoImportacao(None, erros or [ErroImportacao(1, "O arquivo não tem linhas de dados.")], len(linhas))
+
+    produtos = _resolver(Produto.objects.all(), {linha['produto'] for linha in linhas}, extra=('ativo',))
+    tipos = _resolver(TipoTransacao.objects.all(), {linha['tipo'] for linha in linhas}, extra=('entrada',))
+
+    transacoes, lotes, numeros = [], [], []
+    agora = timezone.now()  # todas as linhas do arquivo entram com o mesmo horário
+    for linha in linhas:
+        produto, erro_produto = produtos.get(linha['produto'], (None, "Produto não encontrado"))
+        tipo, erro_tipo = tipos.get(linha['tipo'], (None, "Tipo de transação não encontrado"))
+        mensagens = [m for m in (erro_produto, erro_tipo) if m]
+        if produto and produto.ativo != ATIVO:
+            mensagens.append("Produto inativo")
+        try:
+            quantidade = int(linha['quantidade'])
+            if quantidade <= 0:
+                raise ValueError
+        except ValueError:
+            mensagens.append("A quantidade deve ser um número inteiro maior que zero")
+        if tipo and tipo.entrada and not linha['lote']:
+            mensagens.append("Informe o lote para entradas de estoque")
+        if mensagens:
+            erros.append(ErroImportacao(linha['numero'], "; ".join(mensagens)))
+            continue
+        # FKs por ID: atribuir instâncias custa caro com 100 mil linhas.
+        transacoes.append(Transacao(tipo_transacao=tipo, produto_id=produto.pk, usuario_id=usuario.pk, data=agora,
+                                    quantidade=quantidade, observacoes=linha['observacoes'] or None))
+        lotes.append(linha['lote'])
+        numeros.append(linha['numero'])
+    if erros:
+        return ResultadoImportacao(None, erros, len(linhas))
+
+    def _gravar():
+        with transaction.atomic():
+            importacao = ImportacaoTransacao.objects.create(usuario=usuario, nome_arquivo=nome_arquivo[:255],
+                                                            linhas=len(transacoes))
+            for item in transacoes:
+                item.pk = None  # nova tentativa depois de um deadlock
+                item.importacao_id = importacao.pk
+            estoque.registrar_varias(transacoes, lotes, {'importacao': importacao})
+            return importacao
+
+    try:
+        importacao = estoque.com_retentativa(_gravar)
+    except estoque.SaldoInsuficiente as e:
+        return ResultadoImportacao(None, [ErroImportacao(numeros[i], m) for i, m in e.falhas], len(linhas))
+    return ResultadoImportacao(importacao, [], len(linhas))
+
+
+def _ler(arquivo):
+    """Lê e normaliza as linhas do CSV. Retorna (linhas, erros de estrutura)."""
+    primeira = arquivo.readline()
+    separador = ';' if primeira.count(';') >= primeira.count(',') else ','
+    cabecalho = [coluna.strip().lower() for coluna in next(csv.reader([primeira], delimiter=separador), [])]
+    faltando = [coluna for coluna in COLUNAS_OBRIGATORIAS if coluna not in cabecalho]
+    if faltando:
+        return [], [ErroImportacao(1, f"Colunas obrigatórias ausentes no cabeçalho: {', '.join(faltando)}")]
+
+    posicoes = {coluna: cabecalho.index(coluna) for coluna in COLUNAS_OBRIGATORIAS + COLUNAS_OPCIONAIS if coluna in cabecalho}
+    linhas = []
+    for numero, valores in enumerate(csv.reader(arquivo, delimiter=separador), start=2):
+        if not any(valor.strip() for valor in valores):
+            continue
+        linha = {coluna: (valores[i].strip() if i < len(valores) else '') for coluna, i in posicoes.items()}
+        linha.setdefault('lote', '')
+        linha.setdefault('observacoes', '')
+        linha['numero'] = numero
+        linhas.append(linha)
+    return linhas, []
+
+
+def _resolver(queryset, referencias, extra=()):
+    """Mapeia cada referência (ID ou nome) para (objeto, mensagem de erro) com duas consultas no total."""
+    ids = {}
+    for ref in referencias:
+        if ref.isdigit():
+            ids.setdefault(int(ref), []).append(ref)  # '7' e '007' apontam para o mesmo ID
+    nomes = {ref for ref in referencias if not ref.isdigit()}
+    campos = ('pk', 'nome', *extra)
+    resolvidos = {}
+    for obj in queryset.filter(pk__in=ids).only(*campos):
+        for ref in ids[obj.pk]:
+            resolvidos[ref] = (obj, None)
+    por_nome = {}
+    for obj in queryset.filter(nome__in=nomes).only(*campos):
+        por_nome.setdefault(obj.nome, []).append(obj)
+    for nome, encontrados in por_nome.items():
+        if len(encontrados) == 1:
+            resolvidos[nome] = (encontrados[0], None)
+        else:
+            resolvidos[nome] = (None, f"Nome ambíguo ({len(encontrados)} cadastros com o nome \"{nome}\"); use o ID")
+    return resolvidos
@@ -0,0 +1,74 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, F, Sum
+from django.utils import timezone
+
+from .models import Agendamento, OrdemDeServico, Produto, Transacao
+
+# ==================================
+# Indicadores do painel da navegação
+# ==================================
+# Cada indicador é uma única consulta agregada (SUM/COUNT com GROUP BY) e o
+# conjunto fica em cache por até INDICADORES_CACHE_TIMEOUT segundos: a página
+# de entrada lê o cache e só volta ao banco depois que ele expira ou é
+# descartado. Gravar transações, produtos, OS ou agendamentos descarta o
+# cache após o commit (signals.py e, nas movimentações em lote, estoque.py).
+# Com cache em memória por processo, os outros workers ainda podem mostrar
+# números atrasados até o tempo de validade.
+#
+# - Estoque: soma do saldo desnormalizado (Produto.estoque_total), sem lotes.
+# - Mais movimentados: transações dos últimos DIAS_MOVIMENTO dias pelo índice
+#   de data.
+# - OS em aberto por status e agendamentos do dia: contagens pelos índices
+#   de status e de data.
+
+CHAVE = 'indicadores:1'
+DIAS_MOVIMENTO = 30
+MAIS_MOVIMENTADOS = 5
+STATUS_EM_ABERTO = ('ABERTA', 'EM_ANDAMENTO')
+
+
+def calcular(agora=None):
+    """Calcula os indicadores no banco (sem cache)."""
+    agora = agora or timezone.now()
+    estoque = Produto.objects.aggregate(
+        quantidade=Sum('estoque_total', default=0),
+        valor=Sum(F('estoque_total') * F('valor_unitario'), default=Decimal('0'),
+                  output_field=DecimalField(max_digits=18, decimal_places=2)),
+    )
+
+    movimento = list(Transacao.objects.filter(data__gte=agora - timedelta(days=DIAS_MOVIMENTO))
+                     .values('produto_id').annotate(total=Sum('quantidade')).order_by('-total', 'produto_id')
+                     .values_list('produto_id', 'total')[:MAIS_MOVIMENTADOS])
+    nomes = dict(Produto.objects.filter(pk__in=[pk for pk, _ in movimento]).values_list('pk', 'nome'))
+
+    por_status = dict(OrdemDeServico.objects.filter(status__in=STATUS_EM_ABERTO)
+                      .values('status').annotate(total=Count('pk')).order_by().values_list('status', 'total'))
+    rotulos = dict(OrdemDeServico.STATUS_CHOICES)
+
+    return {
+        'estoque_quantidade': estoque['quantidade'],
+        'estoque_valor': estoque['valor'],
+        'mais_movimentados': [{'produto_id': pk, 'nome': nomes.get(pk, ''), 'quantidade': total}
+                              for pk, total in movimento],
+        'ordens_em_aberto': [{'status': status, 'rotulo': rotulos[status], 'total': por_status.get(status, 0)}
+                             for status in STATUS_EM_ABERTO],
+        'agendamentos_hoje': Agendamento.objects.filter(data_agendamento=timezone.localdate(agora)).count(),
+        'atualizado_em': agora,
+    }
+
+
+def obter():
+    """Indicadores do cache; recalcula quando expirados."""
+    indicadores = cache.get(CHAVE)
+    if indicadores is None:
+        indicadores = calcular()
+        cache.set(CHAVE, indicadores, getattr(settings, 'INDICADORES_CACHE_TIMEOUT', 60))
+    return indicadores
+
+
+def invalidar():
+    cache.delete(CHAVE)
@@ -0,0 +1,167 @@
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from inventario import escalonamento, relatorios
+from inventario.management.commands.gerar_dados import CIDADES
+from inventario.models import Agendamento, Cliente, OrdemDeServico, Produto, TipoTransacao, Transacao
+
+# Escalonamento sobre dados sintéticos em memória: VISITAS_SINTETICAS visitas
+# sem técnico, de 8h às 18h, nos bairros de CIDADES, para TECNICOS_SINTETICOS técnicos.
+VISITAS_SINTETICAS = 500
+TECNICOS_SINTETICOS = 30
+
+
+class _Desfazer(Exception):
+    """Usada para desfazer, no fim do benchmark, tudo o que as views gravaram."""
+
+
+class Command(BaseCommand):
+    help = ("Mede tempo e número de consultas SQL das principais views e grava o resultado em JSON. "
+            "Rode depois de gerar_dados; tudo o que as views gravarem é desfeito no fim.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=10, help="Execuções de cada cenário (a primeira é descartada).")
+        parser.add_argument('--saida', default='benchmark.json', help="Arquivo JSON de resultado.")
+        parser.add_argument('--comparar', help="JSON de uma execução anterior para mostrar a variação.")
+
+    def handle(self, *args, **options):
+        if options['repeticoes'] < 1:
+            raise CommandError("--repeticoes deve ser pelo menos 1.")
+        produto = Produto.objects.filter(ativo=0).order_by('-estoque_total').first()
+        entrada = TipoTransacao.objects.filter(entrada=True).first()
+        saida = TipoTransacao.objects.filter(entrada=False).first()
+        if not (produto and entrada and saida and produto.estoque_total):
+            raise CommandError("Sem dados para medir: rode gerar_dados antes.")
+
+        resultados = {}
+        try:
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=['testserver']):
+                cliente_http = Client()
+                cliente_http.force_login(self._usuario())
+                for nome, executar in self._cenarios(cliente_http, produto, entrada, saida):
+                    resultados[nome] = self._medir(executar, options['repeticoes'])
+                    self.stdout.write(f"{nome}: {resultados[nome]['mediana_ms']}ms, {resultados[nome]['consultas']} consultas")
+                raise _Desfazer
+        except _Desfazer:
+            pass
+
+        relatorio = {
+            'data': timezone.now().isoformat(),
+            'commit': self._commit(),
+            'banco': connection.vendor,
+            'python': platform.python_version(),
+            'volumes': {
+                'produtos': Produto.objects.count(),
+                'transacoes': Transacao.objects.count(),
+                'clientes': Cliente.objects.count(),
+                'ordens_servico': OrdemDeServico.objects.count(),
+            },
+            'repeticoes': options['repeticoes'],
+            'resultados': resultados,
+        }
+        with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f"Resultado gravado em {options['saida']}."))
+
+        if options['comparar']:
+            self._comparar(options['comparar'], resultados)
+
+    def _usuario(self):
+        usuario, _ = User.objects.get_or_create(username='benchmark', defaults={'is_staff': True})
+        return usuario
+
+    def _cenarios(self, cliente_http, produto, entrada, saida):
+        def transacao(tipo):
+            dados = {'produto': produto.pk, 'tipo_transacao': tipo.pk, 'quantidade': 1, 'lote': 'BENCH'}
+            return lambda: cliente_http.post(reverse('criar_transacao'), dados)
+
+        agora = timezone.localtime()
+        periodo = {'month': agora.month, 'year': agora.year}
+        # Dia com mais visitas pendentes (os dados de gerar_dados vão até 30 dias à frente).
+        dia_cheio = (Agendamento.objects.filter(situacao='AGENDADO').values('data_agendamento')
+                     .annotate(total=Count('pk')).order_by('-total').values_list('data_agendamento', flat=True).first()
+                     or agora.date())
+        visitas = self._visitas_sinteticas()
+        tecnicos = list(range(1, TECNICOS_SINTETICOS + 1))
+        return [
+            ('listar_produtos', lambda: cliente_http.get(reverse('listar_produtos'))),
+            ('listar_produtos (busca)', lambda: cliente_http.get(reverse('listar_produtos'), {'busca': produto.nome[:4]})),
+            ('listar_transacao', lambda: cliente_http.get(reverse('listar_transacao'))),
+            ('listar_transacao (produto)', lambda: cliente_http.get(reverse('listar_transacao'), {'produto': produto.pk})),
+            ('criar_transacao (formulário)', lambda: cliente_http.get(reverse('criar_transacao'))),
+            ('autocompletar (produtos)', lambda: cliente_http.get(reverse('autocompletar', args=['produtos']),
+                                                                  {'q': produto.nome[:4]})),
+            ('criar_transacao (entrada)', transacao(entrada)),
+            ('criar_transacao (saída)', transacao(saida)),
+            ('transacao_pdf_view', lambda: cliente_http.post(reverse('relatorio_transacoes'), periodo)),
+            ('relatorio mensal (worker)', lambda: relatorios.TIPOS['transacoes_mensal'].gerar(
+                {'ano': agora.year, 'mes': agora.month})),
+            ('listar_clientes', lambda: cliente_http.get(reverse('listar_clientes'))),
+            ('listar_clientes (busca)', lambda: cliente_http.get(reverse('listar_clientes'), {'busca': 'Mercado'})),
+            (f'escalonamento ({VISITAS_SINTETICAS} visitas sintéticas)',
+             lambda: escalonamento.escalonar(visitas, tecnicos)),
+            ('escalonar_agendamentos', lambda: cliente_http.get(reverse('escalonar_agendamentos'),
+                                                                {'data': dia_cheio.isoformat(), 'reatribuir': '1'})),
+        ]
+
+    def _visitas_sinteticas(self):
+        aleatorio = random.Random(42)
+        regioes = [(cidade, bairro) for cidade, bairros in CIDADES.items() for bairro in bairros]
+        visitas = []
+        for pk in range(1, VISITAS_SINTETICAS + 1):
+            inicio = aleatorio.randrange(8 * 60, 18 * 60, 30)
+            cidade, bairro = aleatorio.choice(regioes)
+            visitas.append(escalonamento.Visita(pk, inicio, inicio + aleatorio.choice([30, 60, 90, 120]), cidade, bairro, None))
+        return visitas
+
+    def _medir(self, executar, repeticoes):
+        tempos, consultas = [], []
+        # A primeira execução aquece caches (templates, conexões) e é descartada.
+        for _ in range(repeticoes + 1):
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                resposta = executar()
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            consultas.append(len(capturadas))
+            status = getattr(resposta, 'status_code', 200)
+            if status >= 400:
+                raise CommandError(f"Cenário respondeu com status {status}.")
+        tempos, consultas = tempos[1:], consultas[1:]
+        return {
+            'mediana_ms': round(statistics.median(tempos), 2),
+            'minimo_ms': round(min(tempos), 2),
+            'maximo_ms': round(max(tempos), 2),
+            'consultas': max(consultas),
+        }
+
+    def _commit(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def _comparar(self, caminho, resultados):
+        with open(caminho, encoding='utf-8') as arquivo:
+            anterior = json.load(arquivo)['resultados']
+        self.stdout.write(f"\nComparação com {caminho}:")
+        for nome, atual in resultados.items():
+            if nome not in anterior:
+                continue
+            antes = anterior[nome]
+            variacao = (atual['mediana_ms'] / antes['mediana_ms'] - 1) * 100 if antes['mediana_ms'] else 0
+            self.stdout.write(f"  {nome}: {antes['mediana_ms']} -> {atual['mediana_ms']}ms ({variacao:+.0f}%), "
+                              f"consultas {antes['consultas']} -> {atual['consultas']}")
@@ -0,0 +1,48 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from inventario import escalonamento, referencias
+
+
+class Command(BaseCommand):
+    help = ("Distribui os agendamentos pendentes de um dia (padrão: amanhã) entre os técnicos, "
+            "agrupando as visitas por cidade/bairro. Sem --aplicar, só mostra a proposta.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dia', type=date.fromisoformat, help="Dia (AAAA-MM-DD) a escalonar.")
+        parser.add_argument('--tecnicos', help="IDs dos técnicos disponíveis, separados por vírgula (padrão: todos).")
+        parser.add_argument('--reatribuir', action='store_true',
+                            help="Redistribui também as visitas que já têm técnico.")
+        parser.add_argument('--aplicar', action='store_true', help="Grava a escala nos agendamentos.")
+
+    def handle(self, *args, **options):
+        dia = options['dia'] or timezone.localdate() + timedelta(days=1)
+        nomes = {tecnico.pk: tecnico.nome for tecnico in referencias.tecnicos()}
+        tecnico_ids = None
+        if options['tecnicos']:
+            try:
+                tecnico_ids = [int(pk) for pk in options['tecnicos'].split(',')]
+            except ValueError:
+                raise CommandError("--tecnicos deve ser uma lista de IDs separados por vírgula.")
+            desconhecidos = set(tecnico_ids) - set(nomes)
+            if desconhecidos:
+                raise CommandError(f"Técnico(s) inexistente(s): {', '.join(map(str, sorted(desconhecidos)))}.")
+
+        if options['aplicar']:
+            escala, alterados = escalonamento.aplicar(dia, tecnico_ids, options['reatribuir'])
+        else:
+            _, escala = escalonamento.propor(dia, tecnico_ids, options['reatribuir'])
+
+        for tecnico_id, minutos in sorted(escala.carga.items(), key=lambda item: -item[1]):
+            visitas = sum(1 for atribuido in escala.atribuicoes.values() if atribuido == tecnico_id)
+            self.stdout.write(f"{nomes.get(tecnico_id, tecnico_id)}: {visitas} visita(s), {minutos} min")
+        if escala.sem_tecnico:
+            self.stdout.write(self.style.WARNING(
+                f"{len(escala.sem_tecnico)} visita(s) sem técnico livre no horário: "
+                f"{', '.join(map(str, escala.sem_tecnico))}"))
+        if options['aplicar']:
+            self.stdout.write(self.style.SUCCESS(f"{len(alterados)} agendamento(s) atualizado(s)."))
+        else:
+            self.stdout.write("Nada foi gravado (use --aplicar).")
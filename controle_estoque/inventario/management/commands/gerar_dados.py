@@ -0,0 +1,198 @@
+import random
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from inventario import resumo_mensal
+from inventario.models import (Agendamento, Categoria, Cliente, LoteEstoque, MovimentacaoLote, OrdemDeServico,
+                               Produto, Sistema, Tecnico, TipoTransacao, Transacao)
+
+# Volumes com --escala 1. Tudo é multiplicado pela escala.
+VOLUMES = {
+    'categorias': 20,
+    'produtos': 500,
+    'transacoes': 20000,
+    'clientes': 1000,
+    'tecnicos': 15,
+    'agendamentos': 3000,
+    'ordens_servico': 5000,
+}
+LOTE_INSERCAO = 1000
+# Marca nas observações das transações geradas, usada para ligá-las aos lotes.
+MARCA = '[gerar_dados]'
+
+PRODUTOS = ['Cabo de Rede', 'Conector RJ45', 'Roteador', 'Switch', 'Impressora Térmica', 'Leitor de Código',
+            'Teclado', 'Mouse', 'Monitor', 'Nobreak', 'Fonte ATX', 'Memória RAM', 'SSD', 'HD Externo', 'Gaveta']
+CATEGORIAS = ['Redes', 'Periféricos', 'Automação Comercial', 'Informática', 'Energia', 'Armazenamento']
+EMPRESAS = ['Mercado', 'Farmácia', 'Padaria', 'Auto Peças', 'Papelaria', 'Restaurante', 'Loja', 'Distribuidora']
+SOBRENOMES = ['Silva', 'Souza', 'Oliveira', 'Santos', 'Pereira', 'Costa', 'Almeida', 'Ferreira', 'Rodrigues']
+CIDADES = {
+    'Ponta Grossa': ['Centro', 'Uvaranas', 'Oficinas', 'Nova Rússia', 'Contorno'],
+    'Curitiba': ['Centro', 'Batel', 'Água Verde', 'Portão', 'Boqueirão'],
+    'Castro': ['Centro', 'Vila Rio Branco', 'Jardim Arapongas'],
+}
+PROBLEMAS = ['Impressora não liga', 'Sistema lento', 'Erro ao emitir nota', 'Sem conexão com a internet',
+             'Leitor não reconhece código', 'Backup não concluído', 'Atualização do sistema']
+
+
+class Command(BaseCommand):
+    help = ("Gera dados sintéticos (categorias, produtos, transações, clientes, agendamentos e OS) "
+            "para medir desempenho. Não use no banco de produção.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', type=float, default=1.0,
+                            help=f"Fator multiplicado pelos volumes base {VOLUMES}.")
+        parser.add_argument('--semente', type=int, default=42, help="Semente do gerador aleatório (dados reprodutíveis).")
+        parser.add_argument('--forcar', action='store_true', help="Permite rodar com DEBUG = False.")
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['forcar']:
+            raise CommandError("DEBUG está desligado: isto parece produção. Use --forcar se tiver certeza.")
+        if options['escala'] <= 0:
+            raise CommandError("--escala deve ser maior que zero.")
+
+        self.aleatorio = random.Random(options['semente'])
+        self.agora = timezone.now()
+        volumes = {nome: max(1, round(base * options['escala'])) for nome, base in VOLUMES.items()}
+
+        with transaction.atomic():
+            self.usuario = self._usuario()
+            produtos = self._produtos(volumes['categorias'], volumes['produtos'])
+            meses = self._transacoes(produtos, volumes['transacoes'])
+            clientes = self._clientes(volumes['clientes'])
+            tecnicos = self._tecnicos(volumes['tecnicos'])
+            self._agendamentos(clientes, tecnicos, volumes['agendamentos'])
+            self._ordens_servico(clientes, tecnicos, volumes['ordens_servico'])
+            for ano, mes in sorted(meses):
+                resumo_mensal.recalcular(ano, mes)
+
+        for nome, quantidade in volumes.items():
+            self.stdout.write(f"{nome}: {quantidade}")
+        self.stdout.write(self.style.SUCCESS("Dados sintéticos gerados."))
+
+    # ---------- Estoque ----------
+
+    def _usuario(self):
+        usuario, criado = User.objects.get_or_create(username='gerar_dados', defaults={'is_active': False})
+        if criado:
+            usuario.set_unusable_password()
+            usuario.save()
+        return usuario
+
+    def _data_aleatoria(self, dias=365):
+        return self.agora - timedelta(seconds=self.aleatorio.randrange(dias * 24 * 3600))
+
+    def _produtos(self, n_categorias, n_produtos):
+        Categoria.objects.bulk_create([
+            Categoria(nome=f"{self.aleatorio.choice(CATEGORIAS)} {i + 1}") for i in range(n_categorias)
+        ], batch_size=LOTE_INSERCAO)
+        categorias = list(Categoria.objects.order_by('-pk')[:n_categorias])
+        inicio = Produto.objects.count()
+        Produto.objects.bulk_create([
+            Produto(nome=f"{self.aleatorio.choice(PRODUTOS)} {inicio + i + 1}",
+                    categoria=self.aleatorio.choice(categorias), usuario_responsavel=self.usuario)
+            for i in range(n_produtos)
+        ], batch_size=LOTE_INSERCAO)
+        # O MySQL não devolve as PKs do bulk_create: relê os produtos recém-criados.
+        return list(Produto.objects.order_by('-pk')[:n_produtos])
+
+    def _transacoes(self, produtos, quantidade):
+        """Transações com saldo sempre válido, gravadas direto no livro de lotes.
+
+        Em vez de passar por estoque.registrar_transacao uma a uma, monta a
+        sequência de cada produto em memória e grava tudo em lotes: um lote de
+        estoque por produto, com o saldo final e uma movimentação por transação.
+        """
+        compra = TipoTransacao.objects.filter(entrada=True).first() or TipoTransacao.objects.create(nome='Compra', entrada=True)
+        venda = TipoTransacao.objects.filter(entrada=False).first() or TipoTransacao.objects.create(nome='Venda', entrada=False)
+        datas = sorted(self._data_aleatoria() for _ in range(quantidade))
+        saldos = {produto.pk: 0 for produto in produtos}
+        transacoes, meses = [], set()
+        for data in datas:
+            produto = self.aleatorio.choice(produtos)
+            saldo = saldos[produto.pk]
+            if saldo and self.aleatorio.random() < 0.6:
+                tipo, quantidade_transacao = venda, self.aleatorio.randint(1, min(saldo, 20))
+                saldos[produto.pk] -= quantidade_transacao
+            else:
+                tipo, quantidade_transacao = compra, self.aleatorio.randint(5, 50)
+                saldos[produto.pk] += quantidade_transacao
+            transacoes.append(Transacao(tipo_transacao=tipo, usuario=self.usuario, produto=produto, data=data,
+                                        quantidade=quantidade_transacao, observacoes=MARCA))
+            local = timezone.localtime(data)
+            meses.add((local.year, local.month))
+        Transacao.objects.bulk_create(transacoes, batch_size=LOTE_INSERCAO)
+
+        for produto in produtos:
+            LoteEstoque.objects.create(produto=produto, lote=f'SINT-{produto.pk}', quantidade=saldos[produto.pk])
+            Produto.objects.filter(pk=produto.pk).update(estoque_total=saldos[produto.pk])
+        lotes = dict(LoteEstoque.objects.filter(produto__in=produtos).values_list('produto_id', 'pk'))
+        geradas = (Transacao.objects.filter(produto__in=produtos, observacoes=MARCA, movimentacoes__isnull=True)
+                   .values_list('pk', 'produto_id', 'quantidade'))
+        MovimentacaoLote.objects.bulk_create([
+            MovimentacaoLote(transacao_id=pk, lote_estoque_id=lotes[produto_id], quantidade=quantidade_transacao)
+            for pk, produto_id, quantidade_transacao in geradas.iterator(chunk_size=LOTE_INSERCAO)
+        ], batch_size=LOTE_INSERCAO)
+        return meses
+
+    # ---------- Clientes ----------
+
+    def _clientes(self, quantidade):
+        inicio = Cliente.objects.count()
+        sistemas = [Sistema.objects.get_or_create(nome=nome)[0] for nome in ('Gestão Comercial', 'PDV', 'Fiscal')]
+        clientes = []
+        for i in range(inicio, inicio + quantidade):
+            # bulk_create não chama Cliente.save(): cnpj_digitos é preenchido aqui.
+            digitos = f"{90000000 + i:08d}0001{i % 100:02d}"
+            cidade = self.aleatorio.choice(list(CIDADES))
+            clientes.append(Cliente(
+                razao_social=f"{self.aleatorio.choice(EMPRESAS)} {self.aleatorio.choice(SOBRENOMES)} {i + 1} Ltda",
+                fantasia=f"{self.aleatorio.choice(EMPRESAS)} {self.aleatorio.choice(SOBRENOMES)}",
+                cnpj=f"{digitos[:2]}.{digitos[2:5]}.{digitos[5:8]}/{digitos[8:12]}-{digitos[12:]}",
+                cnpj_digitos=digitos,
+                cidade=cidade, bairro=self.aleatorio.choice(CIDADES[cidade]), estado='PR',
+                contato=self.aleatorio.choice(SOBRENOMES),
+                sistema=self.aleatorio.choice(sistemas),
+                tipo_contrato=self.aleatorio.choice(Cliente.TIPO_CONTRATO_CHOICES)[0],
+            ))
+        Cliente.objects.bulk_create(clientes, batch_size=LOTE_INSERCAO)
+        return list(Cliente.objects.order_by('-pk')[:quantidade])
+
+    def _tecnicos(self, quantidade):
+        inicio = Tecnico.objects.count()
+        Tecnico.objects.bulk_create([Tecnico(nome=f"Técnico {inicio + i + 1}") for i in range(quantidade)])
+        return list(Tecnico.objects.order_by('-pk')[:quantidade])
+
+    def _agendamentos(self, clientes, tecnicos, quantidade):
+        agendamentos = []
+        for _ in range(quantidade):
+            data = timezone.localdate(self.agora) + timedelta(days=self.aleatorio.randint(-180, 30))
+            situacao = 'AGENDADO' if data >= timezone.localdate(self.agora) else self.aleatorio.choice(['CONCLUIDO', 'CANCELADO'])
+            agendamentos.append(Agendamento(
+                cliente=self.aleatorio.choice(clientes), tecnico=self.aleatorio.choice(tecnicos),
+                descricao=self.aleatorio.choice(PROBLEMAS), data_agendamento=data,
+                hora_agendamento=time(self.aleatorio.randint(8, 17), self.aleatorio.choice([0, 30])),
+                situacao=situacao,
+            ))
+        Agendamento.objects.bulk_create(agendamentos, batch_size=LOTE_INSERCAO)
+
+    def _ordens_servico(self, clientes, tecnicos, quantidade):
+        ordens = []
+        for _ in range(quantidade):
+            abertura = self._data_aleatoria()
+            status = self.aleatorio.choices(['ABERTA', 'EM_ANDAMENTO', 'CONCLUIDA', 'CANCELADA'], weights=[1, 1, 6, 1])[0]
+            fechamento = None
+            if status == 'CONCLUIDA':
+                fechamento = min(self.agora, abertura + timedelta(hours=self.aleatorio.randint(1, 240)))
+            ordens.append(OrdemDeServico(
+                cliente=self.aleatorio.choice(clientes), tecnico_responsavel=self.aleatorio.choice(tecnicos),
+                status=status, problema_relatado=self.aleatorio.choice(PROBLEMAS),
+                solucao_aplicada='Atendimento realizado.' if fechamento else None,
+                valor=Decimal(self.aleatorio.randint(50, 1500)), data_abertura=abertura, data_fechamento=fechamento,
+            ))
+        OrdemDeServico.objects.bulk_create(ordens, batch_size=LOTE_INSERCAO)
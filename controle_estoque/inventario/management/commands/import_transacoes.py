@@ -0,0 +1,34 @@
+import os
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario import importacao
+
+
+class Command(BaseCommand):
+    help = "Importa transações de um arquivo CSV (mesmo formato da tela de importação). Com qualquer erro, nada é gravado."
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help="Caminho do arquivo CSV, em UTF-8.")
+        parser.add_argument('--usuario', required=True, help="Username registrado como responsável pelas transações.")
+
+    def handle(self, *args, **options):
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f"Usuário \"{options['usuario']}\" não encontrado.")
+
+        try:
+            with open(options['arquivo'], encoding='utf-8-sig', newline='') as arquivo:
+                resultado = importacao.importar_csv(arquivo, usuario, os.path.basename(options['arquivo']))
+        except (OSError, UnicodeDecodeError) as e:
+            raise CommandError(f"Não foi possível ler o arquivo: {e}")
+
+        if resultado.erros:
+            for erro in resultado.erros:
+                self.stderr.write(f"Linha {erro.linha}: {erro.mensagem}")
+            raise CommandError(f"{len(resultado.erros)} linha(s) com erro; nenhuma transação foi importada.")
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado.linhas} transação(ões) importada(s) (importação #{resultado.importacao.pk})."
+        ))
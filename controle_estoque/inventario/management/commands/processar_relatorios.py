@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from inventario import relatorios
+
+
+class Command(BaseCommand):
+    help = "Worker da fila de relatórios: gera os PDFs pendentes fora das requisições web."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uma-vez', action='store_true',
+                            help="Processa o que estiver na fila e termina, em vez de ficar aguardando novas tarefas.")
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help="Segundos de espera entre consultas quando a fila está vazia (padrão: 2).")
+        parser.add_argument('--liberar-a-cada', type=float, default=60.0,
+                            help="Segundos entre as verificações de tarefas abandonadas por outro worker (padrão: 60).")
+
+    def handle(self, *args, **options):
+        # Repete a liberação enquanto roda: um worker que cai deixa a tarefa em
+        # PROCESSANDO, e os demais precisam devolvê-la à fila sem reiniciar.
+        proxima_liberacao = 0
+        while True:
+            if time.monotonic() >= proxima_liberacao:
+                liberadas = relatorios.liberar_tarefas_abandonadas()
+                if liberadas:
+                    self.stdout.write(f"{liberadas} tarefa(s) abandonada(s) devolvida(s) à fila.")
+                proxima_liberacao = time.monotonic() + options['liberar_a_cada']
+
+            tarefa = relatorios.processar_proxima()
+            if tarefa is not None:
+                self.stdout.write(f"Tarefa #{tarefa.pk} ({tarefa.tipo}): {tarefa.get_status_display()}")
+                continue
+            if options['uma_vez']:
+                break
+            time.sleep(options['intervalo'])
+            # Processo de longa duração: descarta conexões que o banco já encerrou.
+            close_old_connections()
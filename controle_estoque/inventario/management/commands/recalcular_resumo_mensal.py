@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario import resumo_mensal
+
+
+class Command(BaseCommand):
+    help = "Reconstrói o resumo mensal de movimentações a partir das transações (todos os meses ou um mês específico)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ano', type=int, help="Ano a recalcular (exige --mes).")
+        parser.add_argument('--mes', type=int, help="Mês a recalcular, de 1 a 12 (exige --ano).")
+
+    def handle(self, *args, **options):
+        ano, mes = options['ano'], options['mes']
+        if (ano is None) != (mes is None):
+            raise CommandError("Informe --ano e --mes juntos, ou nenhum dos dois para recalcular tudo.")
+        if mes is not None and not 1 <= mes <= 12:
+            raise CommandError("--mes deve estar entre 1 e 12.")
+
+        meses = [(ano, mes)] if ano is not None else resumo_mensal.meses_com_transacoes()
+        for ano, mes in meses:
+            resumo_mensal.recalcular(ano, mes)
+            self.stdout.write(f"{mes:02d}/{ano} recalculado.")
+        self.stdout.write(self.style.SUCCESS(f"{len(meses)} mês(es) processado(s)."))
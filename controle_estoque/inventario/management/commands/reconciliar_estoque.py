@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from inventario import alertas, indicadores
+from inventario.models import LoteEstoque, Produto
+
+
+class Command(BaseCommand):
+    help = "Confere Produto.estoque_total com a soma dos saldos por lote e corrige as divergências."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verificar', action='store_true',
+                            help="Apenas lista as divergências, sem corrigir (sai com erro se houver alguma).")
+
+    def handle(self, *args, **options):
+        saldo_lotes = (LoteEstoque.objects.filter(produto=OuterRef('pk'))
+                       .values('produto').annotate(total=Sum('quantidade')).values('total'))
+        with transaction.atomic():
+            produtos = (Produto.objects.select_for_update()
+                        .annotate(saldo_lotes=Coalesce(Subquery(saldo_lotes), Value(0)))
+                        .values_list('pk', 'nome', 'estoque_total', 'saldo_lotes'))
+            divergentes = [(pk, nome, atual, correto) for pk, nome, atual, correto in produtos if atual != correto]
+
+            for pk, nome, atual, correto in divergentes:
+                self.stdout.write(f"Produto #{pk} {nome}: estoque_total={atual}, lotes={correto}")
+
+            if not divergentes:
+                self.stdout.write(self.style.SUCCESS("Nenhuma divergência encontrada."))
+                return
+            if options['verificar']:
+                raise CommandError(f"{len(divergentes)} produto(s) com estoque divergente.")
+
+            for pk, _, _, correto in divergentes:
+                Produto.objects.filter(pk=pk).update(estoque_total=correto)
+            alertas.avaliar([pk for pk, _, _, _ in divergentes])
+            transaction.on_commit(indicadores.invalidar)
+        self.stdout.write(self.style.SUCCESS(f"{len(divergentes)} produto(s) corrigido(s)."))
@@ -0,0 +1,24 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from inventario import posicao_estoque
+
+
+class Command(BaseCommand):
+    help = ("Grava o snapshot do estoque por lote no fim de um dia (padrão: ontem). "
+            "Agende para rodar toda noite, alguns minutos depois da meia-noite.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dia', type=date.fromisoformat, help="Dia (AAAA-MM-DD) cujo fechamento será gravado.")
+
+    def handle(self, *args, **options):
+        dia = options['dia'] or timezone.localdate() - timedelta(days=1)
+        instante = posicao_estoque.fim_do_dia(dia)
+        if instante > timezone.now():
+            raise CommandError(f"O dia {dia:%d/%m/%Y} ainda não terminou.")
+
+        snapshot = posicao_estoque.gerar_snapshot(instante)
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot de {dia:%d/%m/%Y} gravado: {snapshot.lotes.count()} lote(s) com saldo."))
@@ -0,0 +1,197 @@
+import logging
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger('inventario.desempenho')
+
+# ==================================
+# Métricas de desempenho por rota
+# ==================================
+# Com MEDIR_DESEMPENHO = True no settings, o MetricasMiddleware mede cada
+# requisição: número de consultas SQL, tempo gasto no banco, tempo de
+# renderização de templates e tempo total. Os valores são somados em
+# histogramas por nome de rota (urls.py), mantidos na memória do processo;
+# cada worker do servidor tem os seus. A view metricas_desempenho mostra os
+# histogramas para usuários staff. Requisições acima de
+# MEDIR_DESEMPENHO_LENTO_MS milissegundos são registradas no log
+# 'inventario.desempenho'.
+
+# Limites superiores das faixas de cada histograma; a última faixa é aberta.
+FAIXAS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+FAIXAS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+METRICAS = {
+    'consultas': FAIXAS_CONSULTAS,
+    'sql_ms': FAIXAS_MS,
+    'template_ms': FAIXAS_MS,
+    'total_ms': FAIXAS_MS,
+}
+
+# Medição da requisição em andamento (None fora do middleware).
+_medicao_atual = ContextVar('medicao_desempenho', default=None)
+
+
+class Histograma:
+    def __init__(self, faixas):
+        self.faixas = faixas
+        self.contagens = [0] * (len(faixas) + 1)
+        self.total = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def registrar(self, valor):
+        indice = next((i for i, limite in enumerate(self.faixas) if valor <= limite), len(self.faixas))
+        self.contagens[indice] += 1
+        self.total += 1
+        self.soma += valor
+        self.maximo = max(self.maximo, valor)
+
+    def percentil(self, p):
+        """Limite superior da faixa que contém o percentil p (0-100)."""
+        if not self.total:
+            return None
+        alvo = self.total * p / 100
+        acumulado = 0
+        for indice, contagem in enumerate(self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return self.faixas[indice] if indice < len(self.faixas) else self.maximo
+        return self.maximo
+
+    def resumo(self):
+        rotulos = [f'<={limite}' for limite in self.faixas] + [f'>{self.faixas[-1]}']
+        return {
+            'media': round(self.soma / self.total, 2) if self.total else None,
+            'p50': self.percentil(50),
+            'p95': self.percentil(95),
+            'maximo': round(self.maximo, 2),
+            'faixas': dict(zip(rotulos, self.contagens)),
+        }
+
+
+class _Registro:
+    """Histogramas por rota, compartilhados pelas threads do processo."""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._rotas = {}
+
+    def registrar(self, rota, valores):
+        with self._trava:
+            histogramas = self._rotas.get(rota)
+            if histogramas is None:
+                histogramas = self._rotas[rota] = {nome: Histograma(faixas) for nome, faixas in METRICAS.items()}
+            for nome, valor in valores.items():
+                histogramas[nome].registrar(valor)
+
+    def resumo(self):
+        with self._trava:
+            return {
+                rota: {'requisicoes': histogramas['total_ms'].total,
+                       **{nome: histograma.resumo() for nome, histograma in histogramas.items()}}
+                for rota, histogramas in sorted(self._rotas.items())
+            }
+
+    def limpar(self):
+        with self._trava:
+            self._rotas.clear()
+
+
+registro = _Registro()
+
+
+class _Medicao:
+    def __init__(self):
+        self.consultas = 0
+        self.sql = 0.0
+        self.template = 0.0
+        self._profundidade_template = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas += 1
+            self.sql += time.perf_counter() - inicio
+
+
+class MetricasMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'MEDIR_DESEMPENHO', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.limite_lento_ms = getattr(settings, 'MEDIR_DESEMPENHO_LENTO_MS', None)
+
+    def __call__(self, request):
+        medicao = _Medicao()
+        token = _medicao_atual.set(medicao)
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as pilha:
+                for conexao in connections.all():
+                    pilha.enter_context(conexao.execute_wrapper(medicao))
+                response = self.get_response(request)
+        finally:
+            _medicao_atual.reset(token)
+        total_ms = (time.perf_counter() - inicio) * 1000
+
+        match = request.resolver_match
+        rota = (match.view_name or f'{match.func.__module__}.{match.func.__qualname__}') if match else '(sem rota)'
+        valores = {
+            'consultas': medicao.consultas,
+            'sql_ms': medicao.sql * 1000,
+            'template_ms': medicao.template * 1000,
+            'total_ms': total_ms,
+        }
+        registro.registrar(rota, valores)
+        if self.limite_lento_ms is not None and total_ms >= self.limite_lento_ms:
+            logger.warning(
+                "Requisição lenta: %s %s (%s) %.0fms, %d consultas (%.0fms SQL), %.0fms em templates",
+                request.method, request.path, rota, total_ms, medicao.consultas, valores['sql_ms'], valores['template_ms'],
+            )
+        return response
+
+
+# ---------- Tempo de renderização de templates ----------
+
+class _TemplateMedido:
+    """Envolve o template do backend Django somando o tempo de render() à medição atual."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, nome):
+        return getattr(self.template, nome)
+
+    def render(self, context=None, request=None):
+        medicao = _medicao_atual.get()
+        if medicao is None:
+            return self.template.render(context, request)
+        # Templates renderizados dentro de outro (render_to_string num filtro, por
+        # exemplo) já estão contados no tempo do template de fora.
+        medicao._profundidade_template += 1
+        inicio = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            medicao._profundidade_template -= 1
+            if not medicao._profundidade_template:
+                medicao.template += time.perf_counter() - inicio
+
+
+class DjangoTemplatesMedidos(DjangoTemplates):
+    """Backend de templates padrão, com medição de tempo para o MetricasMiddleware."""
+
+    def from_string(self, template_code):
+        return _TemplateMedido(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TemplateMedido(super().get_template(template_name))
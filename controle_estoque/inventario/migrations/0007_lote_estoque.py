@@ -0,0 +1,109 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:43
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, Min, Q
+
+
+def migrar_itens_para_lotes(apps, schema_editor):
+    """Agrupa os Itens (um por unidade) em saldos por produto/lote e movimentações por transação."""
+    Item = apps.get_model('inventario', 'Item')
+    LoteEstoque = apps.get_model('inventario', 'LoteEstoque')
+    MovimentacaoLote = apps.get_model('inventario', 'MovimentacaoLote')
+
+    saldos = {}
+    grupos = (Item.objects.values('produto_id', 'lote')
+              .annotate(disponiveis=Count('id', filter=Q(disponivel=True)),
+                        primeira=Min('data_criacao'),
+                        primeira_disponivel=Min('data_criacao', filter=Q(disponivel=True)))
+              .order_by())
+    for grupo in grupos.iterator():
+        chave = (grupo['produto_id'], grupo['lote'] or '')
+        # A posição do lote na fila FIFO é a da unidade disponível mais antiga.
+        data = grupo['primeira_disponivel'] or grupo['primeira']
+        quantidade, data_atual = saldos.get(chave, (0, data))
+        saldos[chave] = (quantidade + grupo['disponiveis'], min(data, data_atual))
+
+    LoteEstoque.objects.bulk_create(
+        [LoteEstoque(produto_id=produto_id, lote=lote, quantidade=quantidade, data_criacao=data)
+         for (produto_id, lote), (quantidade, data) in saldos.items()],
+        batch_size=1000,
+    )
+    lotes = {(l.produto_id, l.lote): l.pk for l in LoteEstoque.objects.all()}
+
+    movimentos = (Item.objects.values('transacao_id', 'produto_id', 'lote')
+                  .annotate(quantidade=Count('id'))
+                  .order_by())
+    pendentes = []
+    for movimento in movimentos.iterator():
+        pendentes.append(MovimentacaoLote(
+            transacao_id=movimento['transacao_id'],
+            lote_estoque_id=lotes[(movimento['produto_id'], movimento['lote'] or '')],
+            quantidade=movimento['quantidade'],
+        ))
+        if len(pendentes) >= 1000:
+            MovimentacaoLote.objects.bulk_create(pendentes)
+            pendentes = []
+    MovimentacaoLote.objects.bulk_create(pendentes)
+
+
+def recriar_itens(apps, schema_editor):
+    """Reverte apenas o saldo disponível: um Item por unidade, ligado à última entrada do lote."""
+    Item = apps.get_model('inventario', 'Item')
+    LoteEstoque = apps.get_model('inventario', 'LoteEstoque')
+    for lote in LoteEstoque.objects.filter(quantidade__gt=0).iterator():
+        movimento = lote.movimentacoes.filter(transacao__tipo_transacao__entrada=True).order_by('-transacao__data').first()
+        if movimento is None:
+            continue
+        Item.objects.bulk_create(
+            [Item(produto_id=lote.produto_id, lote=lote.lote, transacao_id=movimento.transacao_id,
+                  disponivel=True, data_criacao=lote.data_criacao)
+             for _ in range(lote.quantidade)],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0006_alter_agendamento_options_ordemdeservico_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoteEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lote', models.CharField(blank=True, default='', max_length=100)),
+                ('quantidade', models.PositiveIntegerField(default=0)),
+                ('data_criacao', models.DateTimeField(default=django.utils.timezone.now)),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventario.produto')),
+            ],
+            options={
+                'verbose_name': 'Lote em Estoque',
+                'verbose_name_plural': 'Lotes em Estoque',
+            },
+        ),
+        migrations.CreateModel(
+            name='MovimentacaoLote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade', models.PositiveIntegerField()),
+                ('lote_estoque', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='movimentacoes', to='inventario.loteestoque')),
+                ('transacao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimentacoes', to='inventario.transacao')),
+            ],
+            options={
+                'verbose_name': 'Movimentação de Lote',
+                'verbose_name_plural': 'Movimentações de Lote',
+            },
+        ),
+        migrations.RunPython(migrar_itens_para_lotes, recriar_itens),
+        migrations.DeleteModel(
+            name='Item',
+        ),
+        migrations.AddConstraint(
+            model_name='loteestoque',
+            constraint=models.UniqueConstraint(fields=('produto', 'lote'), name='lote_estoque_produto_lote_unico'),
+        ),
+    ]
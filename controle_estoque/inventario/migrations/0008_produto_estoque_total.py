@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:44
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def calcular_estoque_total(apps, schema_editor):
+    Produto = apps.get_model('inventario', 'Produto')
+    LoteEstoque = apps.get_model('inventario', 'LoteEstoque')
+    saldo = (LoteEstoque.objects.filter(produto=OuterRef('pk'))
+             .values('produto').annotate(total=Sum('quantidade')).values('total'))
+    Produto.objects.update(estoque_total=Coalesce(Subquery(saldo), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0007_lote_estoque'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produto',
+            name='estoque_total',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(calcular_estoque_total, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def preencher_resumo(apps, schema_editor):
+    """Carga inicial do resumo; depois disso ele é mantido a cada Transacao."""
+    Transacao = apps.get_model('inventario', 'Transacao')
+    ResumoMensalMovimento = apps.get_model('inventario', 'ResumoMensalMovimento')
+    totais = {}
+    linhas = Transacao.objects.values_list('data', 'produto_id', 'tipo_transacao__entrada', 'quantidade')
+    for data, produto_id, entrada, quantidade in linhas.iterator():
+        data = timezone.localtime(data)
+        chave = (data.year, data.month, produto_id, entrada)
+        total, numero = totais.get(chave, (0, 0))
+        totais[chave] = (total + quantidade, numero + 1)
+    ResumoMensalMovimento.objects.bulk_create(
+        [ResumoMensalMovimento(ano=ano, mes=mes, produto_id=produto_id, entrada=entrada,
+                               quantidade=total, transacoes=numero)
+         for (ano, mes, produto_id, entrada), (total, numero) in totais.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0008_produto_estoque_total'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoMensalMovimento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ano', models.PositiveSmallIntegerField()),
+                ('mes', models.PositiveSmallIntegerField()),
+                ('entrada', models.BooleanField()),
+                ('quantidade', models.IntegerField(default=0)),
+                ('transacoes', models.IntegerField(default=0)),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventario.produto')),
+            ],
+            options={
+                'verbose_name': 'Resumo Mensal de Movimentação',
+                'verbose_name_plural': 'Resumos Mensais de Movimentação',
+                'constraints': [models.UniqueConstraint(fields=('ano', 'mes', 'produto', 'entrada'), name='resumo_mensal_unico')],
+            },
+        ),
+        migrations.RunPython(preencher_resumo, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0009_resumo_mensal_movimento'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TarefaRelatorio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=50)),
+                ('parametros', models.JSONField(default=dict)),
+                ('referencia', models.CharField(db_index=True, max_length=64)),
+                ('chave', models.CharField(max_length=64, unique=True)),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('PROCESSANDO', 'Processando'), ('CONCLUIDA', 'Concluída'), ('ERRO', 'Erro')], default='PENDENTE', max_length=20)),
+                ('arquivo', models.BinaryField(null=True)),
+                ('nome_arquivo', models.CharField(blank=True, max_length=255)),
+                ('erro', models.TextField(blank=True, null=True)),
+                ('data_criacao', models.DateTimeField(default=django.utils.timezone.now)),
+                ('data_inicio', models.DateTimeField(blank=True, null=True)),
+                ('data_conclusao', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Tarefa de Relatório',
+                'verbose_name_plural': 'Tarefas de Relatório',
+                'indexes': [models.Index(fields=['status', 'data_criacao'], name='tarefa_relatorio_fila_idx')],
+            },
+        ),
+    ]
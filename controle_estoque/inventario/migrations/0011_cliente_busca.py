@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:54
+
+import re
+
+from django.db import migrations, models
+
+
+def preencher_cnpj_digitos(apps, schema_editor):
+    Cliente = apps.get_model('inventario', 'Cliente')
+    for cliente in Cliente.objects.only('pk', 'cnpj').iterator():
+        Cliente.objects.filter(pk=cliente.pk).update(cnpj_digitos=re.sub(r'\D', '', cliente.cnpj or ''))
+
+
+# O índice FULLTEXT usado por ClienteQuerySet.buscar só existe no MySQL; nos
+# demais bancos a busca cai para icontains.
+def criar_indice_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(
+            'ALTER TABLE inventario_cliente ADD FULLTEXT INDEX cliente_busca_ft (razao_social, fantasia)'
+        )
+
+
+def remover_indice_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('ALTER TABLE inventario_cliente DROP INDEX cliente_busca_ft')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0010_tarefa_relatorio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='cnpj_digitos',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=14),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['razao_social', 'id'], name='cliente_razao_social_idx'),
+        ),
+        migrations.RunPython(preencher_cnpj_digitos, migrations.RunPython.noop),
+        migrations.RunPython(criar_indice_fulltext, remover_indice_fulltext),
+    ]
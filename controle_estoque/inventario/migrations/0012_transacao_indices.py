@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0011_cliente_busca'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(fields=['data', 'id'], name='transacao_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(fields=['produto', 'data', 'id'], name='transacao_produto_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(fields=['tipo_transacao', 'data', 'id'], name='transacao_tipo_data_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0012_transacao_indices'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportacaoTransacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome_arquivo', models.CharField(blank=True, max_length=255)),
+                ('linhas', models.PositiveIntegerField(default=0)),
+                ('data', models.DateTimeField(default=django.utils.timezone.now)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Importação de Transações',
+                'verbose_name_plural': 'Importações de Transações',
+                'ordering': ['-data'],
+            },
+        ),
+        migrations.AddField(
+            model_name='transacao',
+            name='importacao',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='transacoes', to='inventario.importacaotransacao'),
+        ),
+    ]
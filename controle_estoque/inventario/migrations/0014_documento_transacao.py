@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:08
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0013_importacao_transacao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoTransacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.CharField(blank=True, max_length=50, verbose_name='Número do documento')),
+                ('data', models.DateTimeField(default=django.utils.timezone.now)),
+                ('observacoes', models.TextField(blank=True, null=True)),
+                ('tipo_transacao', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='inventario.tipotransacao')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Documento de Transação',
+                'verbose_name_plural': 'Documentos de Transação',
+                'ordering': ['-data'],
+            },
+        ),
+        migrations.AddField(
+            model_name='transacao',
+            name='documento',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='itens', to='inventario.documentotransacao'),
+        ),
+    ]
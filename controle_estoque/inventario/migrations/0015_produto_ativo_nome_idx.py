@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0014_documento_transacao'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['ativo', 'nome'], name='produto_ativo_nome_idx'),
+        ),
+    ]
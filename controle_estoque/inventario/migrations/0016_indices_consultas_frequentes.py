@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0015_produto_ativo_nome_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['situacao', 'data_agendamento'], name='agendamento_situacao_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['cliente', 'data_agendamento'], name='agendamento_cliente_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loteestoque',
+            index=models.Index(fields=['produto', 'data_criacao'], name='lote_estoque_fifo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordemdeservico',
+            index=models.Index(fields=['cliente', 'data_abertura'], name='os_cliente_abertura_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:23
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0016_indices_consultas_frequentes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateTimeField(unique=True)),
+                ('data_criacao', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Estoque',
+                'verbose_name_plural': 'Snapshots de Estoque',
+                'ordering': ['-data'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SnapshotLote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade', models.PositiveIntegerField()),
+                ('lote_estoque', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventario.loteestoque')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventario.produto')),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lotes', to='inventario.snapshotestoque')),
+            ],
+            options={
+                'verbose_name': 'Lote no Snapshot',
+                'verbose_name_plural': 'Lotes no Snapshot',
+                'indexes': [models.Index(fields=['snapshot', 'produto'], name='snapshot_lote_produto_idx')],
+                'constraints': [models.UniqueConstraint(fields=('snapshot', 'lote_estoque'), name='snapshot_lote_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:26
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0017_snapshot_estoque'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produto',
+            name='estoque_minimo',
+            field=models.PositiveIntegerField(default=0, help_text='Alerta crítico quando o saldo fica abaixo deste valor.', verbose_name='Estoque mínimo'),
+        ),
+        migrations.AddField(
+            model_name='produto',
+            name='ponto_reposicao',
+            field=models.PositiveIntegerField(default=0, help_text='Alerta de reposição quando o saldo chega a este valor.', verbose_name='Ponto de reposição'),
+        ),
+        migrations.CreateModel(
+            name='AlertaEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nivel', models.CharField(choices=[('CRITICO', 'Abaixo do mínimo'), ('REPOR', 'Repor estoque')], max_length=10)),
+                ('saldo', models.IntegerField()),
+                ('data_criacao', models.DateTimeField(default=django.utils.timezone.now)),
+                ('data_resolucao', models.DateTimeField(blank=True, null=True)),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertas', to='inventario.produto')),
+            ],
+            options={
+                'verbose_name': 'Alerta de Estoque',
+                'verbose_name_plural': 'Alertas de Estoque',
+                'indexes': [models.Index(fields=['produto', 'data_resolucao'], name='alerta_produto_idx'), models.Index(fields=['data_resolucao', 'nivel', 'saldo'], name='alerta_abertos_idx')],
+            },
+        ),
+    ]
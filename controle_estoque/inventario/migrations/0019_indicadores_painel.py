@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0018_alerta_estoque'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produto',
+            name='valor_unitario',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Valor unitário'),
+        ),
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['data_agendamento'], name='agendamento_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordemdeservico',
+            index=models.Index(fields=['status'], name='os_status_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0019_indicadores_painel'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ordemdeservico',
+            index=models.Index(fields=['data_abertura'], name='os_abertura_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:36
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0020_os_abertura_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agendamento',
+            name='duracao_minutos',
+            field=models.PositiveIntegerField(default=60, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(1440)], verbose_name='Duração (minutos)'),
+        ),
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['tecnico', 'data_agendamento', 'hora_agendamento'], name='agendamento_tecnico_data_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0021_agendamento_duracao'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='ordemdeservico',
+            name='os_status_idx',
+        ),
+        migrations.AddIndex(
+            model_name='ordemdeservico',
+            index=models.Index(fields=['status', 'data_fechamento'], name='os_status_fechamento_idx'),
+        ),
+    ]
@@ -1,5 +1,9 @@
-from django.db import models
+import re
+
+from django.db import connections, models
+from django.db.models import Q
 from django.contrib.auth.models import User
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.utils import timezone
 
 ATIVO = 0
@@ -29,14 +33,57 @@ class Produto(models.Model):
     ultima_alteracao = models.DateTimeField(default=timezone.now)
     usuario_responsavel = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     ativo = models.IntegerField(choices=ACTIVE_CHOICES, default=ATIVO)
+    # Saldo desnormalizado: mantido por estoque.py na mesma transação de banco
+    # de cada Transacao e conferido pelo comando reconciliar_estoque.
+    estoque_total = models.IntegerField(default=0, editable=False)
+    # Custo por unidade, usado no valor do estoque do painel (indicadores.py).
+    valor_unitario = models.DecimalField("Valor unitário", max_digits=10, decimal_places=2, default=0)
+    # Limites dos alertas de estoque (alertas.py); 0 desativa.
+    estoque_minimo = models.PositiveIntegerField("Estoque mínimo", default=0,
+                                                 help_text="Alerta crítico quando o saldo fica abaixo deste valor.")
+    ponto_reposicao = models.PositiveIntegerField("Ponto de reposição", default=0,
+                                                  help_text="Alerta de reposição quando o saldo chega a este valor.")
     
-    @property
-    def estoque_total(self):
-        return self.item_set.filter(disponivel=True).count()
+    def save(self, *args, **kwargs):
+        # Numa atualização o saldo não é regravado: ele só muda por update com
+        # F() em estoque.py, e gravar o valor lido no início da requisição
+        # desfaria as transações registradas nesse meio tempo.
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [campo.name for campo in self._meta.concrete_fields
+                                       if not campo.primary_key and campo.name != 'estoque_total']
+        super().save(*args, **kwargs)
+
+    def calcular_estoque(self):
+        return self.loteestoque_set.aggregate(total=models.Sum('quantidade'))['total'] or 0
     
     def __str__(self): return f"{self.nome} (Estoque: {self.estoque_total})"
     class Meta:
         verbose_name = "Produto"; verbose_name_plural = "Produtos"; ordering = ['nome']
+        indexes = [
+            # Autocompletar e listagem: produtos ativos por prefixo do nome.
+            models.Index(fields=['ativo', 'nome'], name='produto_ativo_nome_idx'),
+        ]
+
+class ImportacaoTransacao(models.Model):
+    """Arquivo CSV importado de uma vez; agrupa as transações criadas por ele."""
+    usuario = models.ForeignKey(User, on_delete=models.PROTECT)
+    nome_arquivo = models.CharField(max_length=255, blank=True)
+    linhas = models.PositiveIntegerField(default=0)
+    data = models.DateTimeField(default=timezone.now)
+    def __str__(self): return f"Importação #{self.pk} - {self.nome_arquivo} ({self.linhas} linhas)"
+    class Meta:
+        verbose_name = "Importação de Transações"; verbose_name_plural = "Importações de Transações"; ordering = ['-data']
+
+class DocumentoTransacao(models.Model):
+    """Documento com várias linhas (ex.: nota de entrega); cada linha é uma Transacao."""
+    tipo_transacao = models.ForeignKey(TipoTransacao, on_delete=models.PROTECT)
+    numero = models.CharField(max_length=50, blank=True, verbose_name="Número do documento")
+    usuario = models.ForeignKey(User, on_delete=models.PROTECT)
+    data = models.DateTimeField(default=timezone.now)
+    observacoes = models.TextField(blank=True, null=True)
+    def __str__(self): return f"Documento #{self.pk} {self.numero}".strip()
+    class Meta:
+        verbose_name = "Documento de Transação"; verbose_name_plural = "Documentos de Transação"; ordering = ['-data']
 
 class Transacao(models.Model):
     tipo_transacao = models.ForeignKey(TipoTransacao, on_delete=models.PROTECT)
@@ -45,19 +92,117 @@ class Transacao(models.Model):
     data = models.DateTimeField(default=timezone.now)
     quantidade = models.IntegerField()
     observacoes = models.TextField(blank=True, null=True)
+    importacao = models.ForeignKey(ImportacaoTransacao, on_delete=models.PROTECT, null=True, blank=True, related_name='transacoes')
+    documento = models.ForeignKey(DocumentoTransacao, on_delete=models.PROTECT, null=True, blank=True, related_name='itens')
     def __str__(self): return f"{self.tipo_transacao.nome} - {self.quantidade} itens - {self.data.strftime('%d/%m/%Y %H:%M')}"
     class Meta:
         verbose_name = "Transação"; verbose_name_plural = "Transações"; ordering = ['-data']
+        # Listagem paginada por cursor em (data, id), com e sem os filtros da tela.
+        indexes = [
+            models.Index(fields=['data', 'id'], name='transacao_data_idx'),
+            models.Index(fields=['produto', 'data', 'id'], name='transacao_produto_data_idx'),
+            models.Index(fields=['tipo_transacao', 'data', 'id'], name='transacao_tipo_data_idx'),
+        ]
+
+class LoteEstoque(models.Model):
+    """Saldo de um lote de um produto. Substitui o antigo registro de um Item por unidade."""
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE)
+    lote = models.CharField(max_length=100, blank=True, default='')
+    quantidade = models.PositiveIntegerField(default=0)
+    data_criacao = models.DateTimeField(default=timezone.now)
+    def __str__(self): return f"{self.produto.nome} - Lote: {self.lote} ({self.quantidade})"
+    class Meta:
+        verbose_name = "Lote em Estoque"; verbose_name_plural = "Lotes em Estoque"
+        constraints = [models.UniqueConstraint(fields=['produto', 'lote'], name='lote_estoque_produto_lote_unico')]
+        indexes = [
+            # Fila FIFO das saídas: lotes do produto por data de criação. O id
+            # entra implícito no fim do índice (InnoDB e SQLite) e desempata.
+            models.Index(fields=['produto', 'data_criacao'], name='lote_estoque_fifo_idx'),
+        ]
+
+class MovimentacaoLote(models.Model):
+    """Quantidade de um lote movimentada por uma transação (entrada ou consumo FIFO)."""
+    transacao = models.ForeignKey(Transacao, on_delete=models.CASCADE, related_name='movimentacoes')
+    lote_estoque = models.ForeignKey(LoteEstoque, on_delete=models.PROTECT, related_name='movimentacoes')
+    quantidade = models.PositiveIntegerField()
+    def __str__(self): return f"{self.transacao} - Lote: {self.lote_estoque.lote} ({self.quantidade})"
+    class Meta:
+        verbose_name = "Movimentação de Lote"; verbose_name_plural = "Movimentações de Lote"
 
-class Item(models.Model):
+class ResumoMensalMovimento(models.Model):
+    """Total movimentado por produto, mês e sentido. Mantido por resumo_mensal.py a cada Transacao."""
+    ano = models.PositiveSmallIntegerField()
+    mes = models.PositiveSmallIntegerField()
     produto = models.ForeignKey(Produto, on_delete=models.CASCADE)
-    lote = models.CharField(max_length=100, blank=True, null=True)
-    transacao = models.ForeignKey(Transacao, on_delete=models.CASCADE)
-    disponivel = models.BooleanField(default=True)
+    entrada = models.BooleanField()
+    quantidade = models.IntegerField(default=0)
+    transacoes = models.IntegerField(default=0)
+    def __str__(self): return f"{self.mes:02d}/{self.ano} - {self.produto.nome} ({'Entrada' if self.entrada else 'Saída'}: {self.quantidade})"
+    class Meta:
+        verbose_name = "Resumo Mensal de Movimentação"; verbose_name_plural = "Resumos Mensais de Movimentação"
+        constraints = [models.UniqueConstraint(fields=['ano', 'mes', 'produto', 'entrada'], name='resumo_mensal_unico')]
+
+class AlertaEstoque(models.Model):
+    """Produto com saldo no ponto de reposição ou abaixo do mínimo. Aberto enquanto data_resolucao for nula."""
+    NIVEL_CHOICES = [('CRITICO', 'Abaixo do mínimo'), ('REPOR', 'Repor estoque')]
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='alertas')
+    nivel = models.CharField(max_length=10, choices=NIVEL_CHOICES)
+    saldo = models.IntegerField()
     data_criacao = models.DateTimeField(default=timezone.now)
-    def __str__(self): return f"{self.produto.nome} - Lote: {self.lote}"
+    data_resolucao = models.DateTimeField(null=True, blank=True)
+    def __str__(self): return f"{self.produto.nome}: {self.get_nivel_display()} ({self.saldo})"
     class Meta:
-        verbose_name = "Item"; verbose_name_plural = "Itens"
+        verbose_name = "Alerta de Estoque"; verbose_name_plural = "Alertas de Estoque"
+        indexes = [
+            models.Index(fields=['produto', 'data_resolucao'], name='alerta_produto_idx'),
+            models.Index(fields=['data_resolucao', 'nivel', 'saldo'], name='alerta_abertos_idx'),
+        ]
+
+class SnapshotEstoque(models.Model):
+    """Posição de todos os lotes num instante (ex.: meia-noite). Gerado por posicao_estoque.py."""
+    data = models.DateTimeField(unique=True)
+    data_criacao = models.DateTimeField(default=timezone.now)
+    def __str__(self): return f"Snapshot de {timezone.localtime(self.data):%d/%m/%Y %H:%M}"
+    class Meta:
+        verbose_name = "Snapshot de Estoque"; verbose_name_plural = "Snapshots de Estoque"; ordering = ['-data']
+
+class SnapshotLote(models.Model):
+    """Saldo de um lote num snapshot. Lotes zerados não são gravados."""
+    snapshot = models.ForeignKey(SnapshotEstoque, on_delete=models.CASCADE, related_name='lotes')
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE)
+    lote_estoque = models.ForeignKey(LoteEstoque, on_delete=models.CASCADE)
+    quantidade = models.PositiveIntegerField()
+    def __str__(self): return f"{self.snapshot} - {self.lote_estoque} ({self.quantidade})"
+    class Meta:
+        verbose_name = "Lote no Snapshot"; verbose_name_plural = "Lotes no Snapshot"
+        constraints = [models.UniqueConstraint(fields=['snapshot', 'lote_estoque'], name='snapshot_lote_unico')]
+        indexes = [models.Index(fields=['snapshot', 'produto'], name='snapshot_lote_produto_idx')]
+
+class TarefaRelatorio(models.Model):
+    """Geração de relatório em segundo plano; o PDF pronto fica guardado como cache."""
+    STATUS_CHOICES = [
+        ('PENDENTE', 'Pendente'),
+        ('PROCESSANDO', 'Processando'),
+        ('CONCLUIDA', 'Concluída'),
+        ('ERRO', 'Erro'),
+    ]
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict)
+    # referencia = hash de (tipo, parametros); chave = referencia + versão dos dados.
+    referencia = models.CharField(max_length=64, db_index=True)
+    chave = models.CharField(max_length=64, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDENTE')
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    arquivo = models.BinaryField(null=True, editable=False)
+    nome_arquivo = models.CharField(max_length=255, blank=True)
+    erro = models.TextField(blank=True, null=True)
+    data_criacao = models.DateTimeField(default=timezone.now)
+    data_inicio = models.DateTimeField(null=True, blank=True)
+    data_conclusao = models.DateTimeField(null=True, blank=True)
+    def __str__(self): return f"{self.tipo} {self.parametros} ({self.get_status_display()})"
+    class Meta:
+        verbose_name = "Tarefa de Relatório"; verbose_name_plural = "Tarefas de Relatório"
+        indexes = [models.Index(fields=['status', 'data_criacao'], name='tarefa_relatorio_fila_idx')]
 
 # ### MODELS DO MÓDULO DE CLIENTES ###
 
@@ -70,6 +215,41 @@ class Tecnico(models.Model):
     nome = models.CharField(max_length=100, unique=True)
     def __str__(self): return self.nome
 
+class BuscaTextual(models.Func):
+    """MATCH ... AGAINST em modo booleano sobre um índice FULLTEXT do MySQL."""
+    output_field = models.FloatField()
+
+    def __init__(self, *campos, consulta):
+        self.consulta = consulta
+        super().__init__(*campos)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        colunas = ', '.join(compiler.compile(campo)[0] for campo in self.get_source_expressions())
+        return f"MATCH ({colunas}) AGAINST (%s IN BOOLEAN MODE)", [self.consulta]
+
+class ClienteQuerySet(models.QuerySet):
+    # Palavras menores que isso não entram no índice FULLTEXT (innodb_ft_min_token_size).
+    TAMANHO_MINIMO_PALAVRA = 3
+
+    def buscar(self, termo):
+        """Busca por CNPJ (prefixo dos dígitos) ou por razão social/fantasia, usando índices."""
+        termo = (termo or '').strip()
+        if not termo:
+            return self
+        digitos = re.sub(r'\D', '', termo)
+        if digitos and not re.sub(r'[\d./\-\s]', '', termo):
+            return self.filter(cnpj_digitos__startswith=digitos)
+
+        palavras = [p for p in re.findall(r'\w+', termo) if len(p) >= self.TAMANHO_MINIMO_PALAVRA]
+        if connections[self.db].vendor != 'mysql':
+            # SQLite (testes e desenvolvimento) não tem FULLTEXT: mantém a busca por trecho.
+            return self.filter(Q(razao_social__icontains=termo) | Q(fantasia__icontains=termo) | Q(cnpj__icontains=termo))
+        if palavras:
+            consulta = ' '.join(f'+{palavra}*' for palavra in palavras)
+            return self.alias(relevancia=BuscaTextual('razao_social', 'fantasia', consulta=consulta)).filter(relevancia__gt=0)
+        # Termo curto demais para o FULLTEXT: prefixo, que usa índice B-tree.
+        return self.filter(Q(razao_social__istartswith=termo) | Q(fantasia__istartswith=termo))
+
 class Cliente(models.Model):
     TIPO_CONTRATO_CHOICES = [
         ('CONTRATO', 'Contrato'),
@@ -80,6 +260,8 @@ class Cliente(models.Model):
     razao_social = models.CharField(max_length=255)
     fantasia = models.CharField(max_length=255, blank=True, null=True)
     cnpj = models.CharField(max_length=18, unique=True)
+    # Só os dígitos do CNPJ, para busca por prefixo com índice.
+    cnpj_digitos = models.CharField(max_length=14, db_index=True, editable=False, default='')
     inscricao_estadual = models.CharField(max_length=20, blank=True, null=True)
     endereco = models.CharField(max_length=255, blank=True, null=True)
     bairro = models.CharField(max_length=100, blank=True, null=True)
@@ -94,9 +276,18 @@ class Cliente(models.Model):
     tipo_contrato = models.CharField(max_length=20, choices=TIPO_CONTRATO_CHOICES, blank=True, null=True)
     data_cadastro = models.DateTimeField(auto_now_add=True)
 
+    objects = ClienteQuerySet.as_manager()
+
     class Meta:
         ordering = ['razao_social']
+        indexes = [models.Index(fields=['razao_social', 'id'], name='cliente_razao_social_idx')]
     def __str__(self): return self.razao_social
+    def save(self, *args, **kwargs):
+        self.cnpj_digitos = re.sub(r'\D', '', self.cnpj or '')
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'cnpj' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'cnpj_digitos'}
+        super().save(*args, **kwargs)
 
 class Agendamento(models.Model):
     SITUACAO_CHOICES = [('AGENDADO', 'Agendado'), ('CONCLUIDO', 'Concluído'), ('CANCELADO', 'Cancelado')]
@@ -105,12 +296,22 @@ class Agendamento(models.Model):
     descricao = models.TextField()
     data_agendamento = models.DateField()
     hora_agendamento = models.TimeField()
+    duracao_minutos = models.PositiveIntegerField("Duração (minutos)", default=60,
+                                                  validators=[MinValueValidator(1), MaxValueValidator(24 * 60)])
     situacao = models.CharField(max_length=10, choices=SITUACAO_CHOICES, default='AGENDADO')
     laudo_tecnico = models.TextField(blank=True, null=True)
     data_resolvido = models.DateTimeField(null=True, blank=True)
     atendido_por = models.ForeignKey(Tecnico, related_name='atendimentos_realizados', on_delete=models.SET_NULL, null=True, blank=True)
     class Meta:
         ordering = ['-data_agendamento']
+        indexes = [
+            models.Index(fields=['situacao', 'data_agendamento'], name='agendamento_situacao_data_idx'),
+            models.Index(fields=['cliente', 'data_agendamento'], name='agendamento_cliente_data_idx'),
+            # Agendamentos do dia (painel da navegação).
+            models.Index(fields=['data_agendamento'], name='agendamento_data_idx'),
+            # Conflitos de horário e agenda de um técnico (agenda.py).
+            models.Index(fields=['tecnico', 'data_agendamento', 'hora_agendamento'], name='agendamento_tecnico_data_idx'),
+        ]
     def __str__(self): return f"Agendamento para {self.cliente.fantasia}"
 
 class OrdemDeServico(models.Model):
@@ -130,5 +331,13 @@ class OrdemDeServico(models.Model):
     data_fechamento = models.DateTimeField(null=True, blank=True)
     class Meta:
         ordering = ['-data_abertura']
+        indexes = [
+            models.Index(fields=['cliente', 'data_abertura'], name='os_cliente_abertura_idx'),
+            # Impressão em lote de um período.
+            models.Index(fields=['data_abertura'], name='os_abertura_idx'),
+            # Faturamento e prazo por mês de fechamento (inventario/analise_os.py);
+            # também serve, pelo prefixo, a contagem por status do painel da navegação.
+            models.Index(fields=['status', 'data_fechamento'], name='os_status_fechamento_idx'),
+        ]
     def __str__(self):
         return f"OS #{self.id} - {self.cliente.razao_social}"
\ No newline at end of file
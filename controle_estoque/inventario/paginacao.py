@@ -0,0 +1,151 @@
+import base64
+import json
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+
+# ==================================
+# Paginação por cursor (keyset)
+# ==================================
+# Em vez de COUNT(*) + OFFSET, cada página continua a partir dos valores de
+# ordenação da última linha vista: WHERE (a, b) > (x, y) ORDER BY a, b LIMIT n.
+# Com um índice nos campos de ordenação, a página N custa o mesmo que a
+# primeira. A ordenação precisa terminar num campo único (normalmente a PK) e
+# os campos de ordenação não podem ser nulos.
+
+
+class PaginaCursor:
+    """Página de resultados com cursores para a próxima e a anterior (interface parecida com Page)."""
+
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+def paginar_por_cursor(queryset, ordenacao, cursor=None, tamanho=20):
+    """Retorna a PaginaCursor indicada por cursor (None = primeira página).
+
+    ordenacao é uma lista de campos como em order_by(), por exemplo
+    ['razao_social', 'pk'] ou ['-data', '-pk'].
+    """
+    valores, direcao = _decodificar(cursor, queryset.model, ordenacao)
+    anterior = direcao == 'anterior'
+    campos = [_inverter(campo) for campo in ordenacao] if anterior else list(ordenacao)
+
+    pagina = queryset.order_by(*campos)
+    if valores is not None:
+        pagina = pagina.filter(_depois_de(campos, valores))
+    linhas = list(pagina[:tamanho + 1])
+    ha_mais = len(linhas) > tamanho
+    linhas = linhas[:tamanho]
+    if anterior:
+        linhas.reverse()
+
+    has_next = True if anterior else ha_mais
+    has_previous = ha_mais if anterior else valores is not None
+    return PaginaCursor(
+        linhas,
+        has_next=has_next and bool(linhas),
+        has_previous=has_previous and bool(linhas),
+        next_cursor=_codificar(linhas[-1], ordenacao, 'proxima') if linhas else None,
+        previous_cursor=_codificar(linhas[0], ordenacao, 'anterior') if linhas else None,
+    )
+
+
+def _nome(campo):
+    return campo.lstrip('-')
+
+
+def _inverter(campo):
+    return _nome(campo) if campo.startswith('-') else f'-{campo}'
+
+
+def _depois_de(campos, valores):
+    """Q equivalente a (c1, c2, ...) > (v1, v2, ...) respeitando a direção de cada campo."""
+    condicoes = []
+    for i, campo in enumerate(campos):
+        iguais = {_nome(c): v for c, v in zip(campos[:i], valores[:i])}
+        operador = 'lt' if campo.startswith('-') else 'gt'
+        condicoes.append(Q(**iguais, **{f'{_nome(campo)}__{operador}': valores[i]}))
+    return reduce(lambda a, b: a | b, condicoes)
+
+
+def _valor(objeto, campo):
+    valor = objeto
+    for parte in _nome(campo).split('__'):
+        valor = getattr(valor, parte)
+    return valor
+
+
+def _codificar(objeto, ordenacao, direcao):
+    dados = {'v': [_valor(objeto, campo) for campo in ordenacao], 'd': direcao}
+    texto = json.dumps(dados, default=_serializar)
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii')
+
+
+def _serializar(valor):
+    # isoformat() completo: o DjangoJSONEncoder corta os microssegundos, e o
+    # cursor precisa do valor exato para não pular nem repetir linhas.
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _decodificar(cursor, modelo, ordenacao):
+    if not cursor:
+        return None, 'proxima'
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        valores = [_campo_do_modelo(modelo, campo).to_python(valor)
+                   for campo, valor in zip(ordenacao, dados['v'], strict=True)]
+        direcao = dados['d'] if dados['d'] in ('proxima', 'anterior') else 'proxima'
+    except (ValueError, KeyError, TypeError, UnicodeError, ValidationError):
+        # Cursor adulterado ou de outra ordenação: volta para a primeira página.
+        return None, 'proxima'
+    return valores, direcao
+
+
+def _campo_do_modelo(modelo, campo):
+    nome = _nome(campo)
+    if nome == 'pk':
+        return modelo._meta.pk
+    partes = nome.split('__')
+    for parte in partes[:-1]:
+        modelo = modelo._meta.get_field(parte).related_model
+    return modelo._meta.get_field(partes[-1])
+
+
+def estimar_total(queryset):
+    """Número aproximado de linhas de uma tabela sem filtros, lido das estatísticas do MySQL.
+
+    Retorna None quando não há estimativa barata (queryset filtrado ou outro banco).
+    """
+    if queryset.query.where or connections[queryset.db].vendor != 'mysql':
+        return None
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            [queryset.model._meta.db_table],
+        )
+        linha = cursor.fetchone()
+    return linha[0] if linha else None
@@ -0,0 +1,119 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import LoteEstoque, MovimentacaoLote, Produto, SnapshotEstoque, SnapshotLote, Transacao
+
+# ==================================
+# Posição de estoque numa data
+# ==================================
+# "Qual era o estoque do produto X no dia D" sem somar todo o histórico:
+# o comando snapshot_estoque grava, toda noite, o saldo de cada lote à
+# meia-noite (SnapshotEstoque/SnapshotLote). Uma consulta parte do snapshot
+# mais próximo antes da data e soma só as transações do intervalo, ou seja,
+# no máximo um dia de movimento (índices por produto/data da Transacao).
+#
+# Sem snapshot anterior à data, parte do snapshot seguinte ou do saldo
+# atual e desconta as transações depois da data.
+#
+# Um snapshot de um instante só é confiável depois que todas as transações
+# com data anterior foram gravadas: rode o comando alguns minutos depois da
+# meia-noite, nunca com o instante igual a "agora".
+
+LOTE_INSERCAO = 1000
+
+
+def fim_do_dia(dia):
+    """Meia-noite (fuso local) que encerra o dia: o instante do snapshot daquele dia."""
+    return timezone.make_aware(datetime.combine(dia + timedelta(days=1), time.min))
+
+
+def saldo_em(produto, instante):
+    """Estoque do produto no instante."""
+    return saldos_em(instante, [produto.pk])[produto.pk]
+
+
+def saldos_em(instante, produto_ids=None):
+    """Estoque de cada produto no instante: {produto_id: saldo}. Sem produto_ids, todos os produtos."""
+    produtos = Produto.objects.all() if produto_ids is None else Produto.objects.filter(pk__in=produto_ids)
+    filtro = Q() if produto_ids is None else Q(produto_id__in=produto_ids)
+
+    def no_snapshot(snapshot):
+        return (snapshot.lotes.filter(filtro).values('produto_id').annotate(total=Sum('quantidade'))
+                .order_by().values_list('produto_id', 'total'))
+
+    def movimento(inicio, fim):
+        transacoes = Transacao.objects.filter(filtro, data__gt=inicio)
+        if fim is not None:
+            transacoes = transacoes.filter(data__lte=fim)
+        return _entradas_menos_saidas(transacoes, 'produto_id', 'tipo_transacao__entrada')
+
+    return _calcular(instante, produtos.values_list('pk', 'estoque_total'), no_snapshot, movimento)
+
+
+def saldos_lotes_em(instante, lote_ids=None):
+    """Saldo de cada lote no instante: {lote_estoque_id: saldo}. Sem lote_ids, todos os lotes."""
+    lotes = LoteEstoque.objects.all() if lote_ids is None else LoteEstoque.objects.filter(pk__in=lote_ids)
+    filtro = Q() if lote_ids is None else Q(lote_estoque_id__in=lote_ids)
+
+    def no_snapshot(snapshot):
+        return snapshot.lotes.filter(filtro).values_list('lote_estoque_id', 'quantidade')
+
+    def movimento(inicio, fim):
+        movimentos = MovimentacaoLote.objects.filter(filtro, transacao__data__gt=inicio)
+        if fim is not None:
+            movimentos = movimentos.filter(transacao__data__lte=fim)
+        return _entradas_menos_saidas(movimentos, 'lote_estoque_id', 'transacao__tipo_transacao__entrada')
+
+    return _calcular(instante, lotes.values_list('pk', 'quantidade'), no_snapshot, movimento)
+
+
+def _calcular(instante, atuais, no_snapshot, movimento):
+    """Parte do snapshot mais próximo (ou do saldo atual) e soma/desconta o movimento até o instante."""
+    atuais = dict(atuais)
+    anterior = SnapshotEstoque.objects.filter(data__lte=instante).order_by('-data').first()
+    if anterior:
+        # Snapshot + o que entrou e saiu entre ele e o instante.
+        saldos = dict.fromkeys(atuais, 0)
+        saldos.update(no_snapshot(anterior))
+        for chave, delta in movimento(anterior.data, instante):
+            saldos[chave] += delta
+        return saldos
+
+    # Snapshot seguinte (ou saldo atual) - o que entrou e saiu depois do instante.
+    seguinte = SnapshotEstoque.objects.filter(data__gt=instante).order_by('data').first()
+    if seguinte:
+        saldos = dict.fromkeys(atuais, 0)
+        saldos.update(no_snapshot(seguinte))
+    else:
+        saldos = atuais
+    for chave, delta in movimento(instante, seguinte.data if seguinte else None):
+        saldos[chave] -= delta
+    return saldos
+
+
+def _entradas_menos_saidas(queryset, chave, entrada):
+    """[(chave, entradas - saídas)] do queryset agrupado pela chave."""
+    linhas = (queryset.values(chave)
+              .annotate(entradas=Sum('quantidade', filter=Q(**{entrada: True}), default=0),
+                        saidas=Sum('quantidade', filter=Q(**{entrada: False}), default=0))
+              .order_by()
+              .values_list(chave, 'entradas', 'saidas'))
+    return [(valor, entradas - saidas) for valor, entradas, saidas in linhas if valor is not None]
+
+
+def gerar_snapshot(instante):
+    """Grava (ou refaz) o snapshot de todos os lotes no instante. Retorna o SnapshotEstoque."""
+    with transaction.atomic():
+        # Refazendo: o cálculo não pode partir do próprio snapshot.
+        SnapshotEstoque.objects.filter(data=instante).delete()
+        saldos = saldos_lotes_em(instante)
+        snapshot = SnapshotEstoque.objects.create(data=instante)
+        produtos = dict(LoteEstoque.objects.values_list('pk', 'produto_id'))
+        SnapshotLote.objects.bulk_create([
+            SnapshotLote(snapshot=snapshot, produto_id=produtos[lote_id], lote_estoque_id=lote_id, quantidade=saldo)
+            for lote_id, saldo in saldos.items() if saldo > 0
+        ], batch_size=LOTE_INSERCAO)
+    return snapshot
@@ -0,0 +1,93 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Categoria, Sistema, Tecnico, TipoTransacao
+
+# ==================================
+# Cache de dados de referência
+# ==================================
+# Tabelas pequenas que quase não mudam (categorias, tipos de transação,
+# sistemas e técnicos) são lidas do cache do Django em vez de consultadas a
+# cada página. Há dois níveis:
+#   - durante uma requisição, cada lista é lida do cache uma vez só;
+#   - entre requisições, fica no cache configurado em CACHES.
+# signals.py apaga a lista quando um registro é salvo ou excluído. Com o
+# cache em memória local (padrão), isso vale só para o processo que fez a
+# alteração; os demais workers veem a mudança quando a entrada expira
+# (REFERENCIAS_CACHE_TIMEOUT). Com um cache compartilhado (Redis, Memcached)
+# a invalidação vale para todos na hora.
+
+VERSAO = 1
+
+TABELAS = {
+    'categorias': lambda: Categoria.objects.order_by('nome'),
+    'tipos_transacao': lambda: TipoTransacao.objects.order_by('nome'),
+    'sistemas': lambda: Sistema.objects.order_by('nome'),
+    'tecnicos': lambda: Tecnico.objects.order_by('nome'),
+}
+
+MODELOS = {
+    Categoria: 'categorias',
+    TipoTransacao: 'tipos_transacao',
+    Sistema: 'sistemas',
+    Tecnico: 'tecnicos',
+}
+
+_requisicao = threading.local()
+
+
+def obter(tabela):
+    """Lista (em cache) dos registros da tabela de referência."""
+    memoria = getattr(_requisicao, 'memoria', None)
+    if memoria is not None and tabela in memoria:
+        return memoria[tabela]
+    registros = cache.get(_chave(tabela))
+    if registros is None:
+        registros = list(TABELAS[tabela]())
+        cache.set(_chave(tabela), registros, getattr(settings, 'REFERENCIAS_CACHE_TIMEOUT', 300))
+    if memoria is not None:
+        memoria[tabela] = registros
+    return registros
+
+
+def modelo(tabela):
+    return next(modelo for modelo, nome in MODELOS.items() if nome == tabela)
+
+
+def invalidar(tabela):
+    cache.delete(_chave(tabela))
+    memoria = getattr(_requisicao, 'memoria', None)
+    if memoria is not None:
+        memoria.pop(tabela, None)
+
+
+def iniciar_requisicao(**kwargs):
+    _requisicao.memoria = {}
+
+
+def encerrar_requisicao(**kwargs):
+    # Fora de requisições (comandos, worker de relatórios) não há memória
+    # local: cada chamada vai ao cache, que respeita a invalidação.
+    _requisicao.memoria = None
+
+
+def _chave(tabela):
+    return f'referencias:{VERSAO}:{tabela}'
+
+
+def categorias():
+    return obter('categorias')
+
+
+def tipos_transacao():
+    return obter('tipos_transacao')
+
+
+def sistemas():
+    return obter('sistemas')
+
+
+def tecnicos():
+    return obter('tecnicos')
@@ -0,0 +1,281 @@
+import calendar
+import hashlib
+import json
+import logging
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time, timedelta
+from io import BytesIO
+from os import cpu_count
+
+import django
+from django.conf import settings
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import graficos, resumo_mensal
+from .models import OrdemDeServico, TarefaRelatorio, Transacao
+from .utils import html_to_pdf_bytes, render_to_pdf_bytes
+
+logger = logging.getLogger(__name__)
+
+# ==================================
+# Relatórios em segundo plano
+# ==================================
+# As views só registram uma TarefaRelatorio; o comando processar_relatorios
+# gera o PDF fora da requisição. A chave da tarefa inclui a versão dos dados,
+# então um pedido repetido para dados que não mudaram (um mês já fechado, uma
+# OS concluída) é atendido direto do PDF guardado.
+
+# Tarefas em PROCESSANDO há mais tempo que isso são consideradas abandonadas
+# (worker interrompido) e voltam para a fila.
+TEMPO_MAXIMO_PROCESSAMENTO = timedelta(minutes=10)
+
+TipoRelatorio = namedtuple('TipoRelatorio', ['versao', 'gerar', 'nome_arquivo', 'disposicao'])
+
+
+# ---------- Relatório mensal de transações ----------
+
+def _versao_transacoes_mensal(parametros):
+    # Transações não são editadas nem excluídas: quantidade + maior id identificam o conteúdo do mês.
+    inicio, fim = resumo_mensal.periodo_do_mes(parametros['ano'], parametros['mes'])
+    dados = Transacao.objects.filter(data__gte=inicio, data__lt=fim).aggregate(total=Count('id'), ultimo=Max('id'))
+    return f"{dados['total']}:{dados['ultimo']}"
+
+
+def _gerar_transacoes_mensal(parametros):
+    month, year = parametros['mes'], parametros['ano']
+    start_date, end_date = resumo_mensal.periodo_do_mes(year, month)
+    transacoes = (Transacao.objects.filter(data__gte=start_date, data__lt=end_date)
+                  .select_related('tipo_transacao', 'produto', 'usuario')
+                  .order_by('data'))
+
+    # Totais e gráficos vêm do resumo mensal, sem agregar as transações do mês.
+    entradas_data = resumo_mensal.totais_do_mes(year, month, entrada=True)
+    saidas_data = resumo_mensal.totais_do_mes(year, month, entrada=False)
+
+    context = {
+        'transacoes': transacoes,
+        'month_name': calendar.month_name[month],
+        'year': year,
+        'total_entradas': sum(item['total_quantidade'] for item in entradas_data),
+        'total_saidas': sum(item['total_quantidade'] for item in saidas_data),
+        'total_transacoes': resumo_mensal.total_de_transacoes(year, month),
+        'data_geracao': timezone.now(),
+        'chart_entradas_b64': graficos.grafico_pizza_data_uri(entradas_data, f"Entradas de Produtos - {month}/{year}"),
+        'chart_saidas_b64': graficos.grafico_pizza_data_uri(saidas_data, f"Saídas de Produtos - {month}/{year}"),
+    }
+    return render_to_pdf_bytes('pdf_template.html', context)
+
+
+# ---------- Ordem de serviço ----------
+
+def _dados_ordem_servico(pk):
+    return OrdemDeServico.objects.select_related('cliente', 'tecnico_responsavel').get(pk=pk)
+
+
+def _versao_da_ordem(os):
+    conteudo = [os.status, os.problema_relatado, os.solucao_aplicada, str(os.valor),
+                str(os.data_abertura), str(os.data_fechamento), os.cliente.razao_social, os.cliente.cnpj]
+    return hashlib.sha256(json.dumps(conteudo).encode('utf-8')).hexdigest()[:16]
+
+
+def _nome_arquivo_da_ordem(os):
+    return f"OS_{os.id}_{os.cliente.razao_social}.pdf"
+
+
+def _versao_ordem_servico(parametros):
+    return _versao_da_ordem(_dados_ordem_servico(parametros['pk']))
+
+
+def _gerar_ordem_servico(parametros):
+    return render_to_pdf_bytes('cliente/pdf_os.html', {'os': _dados_ordem_servico(parametros['pk'])})
+
+
+def _nome_arquivo_ordem_servico(parametros):
+    return _nome_arquivo_da_ordem(_dados_ordem_servico(parametros['pk']))
+
+
+# ---------- Ordens de serviço em lote ----------
+# Um único PDF com as OS de um período e/ou de um cliente. Cada OS reaproveita
+# o PDF individual já guardado (tarefa 'ordem_servico' na versão atual da OS);
+# só as que faltam são convertidas, em paralelo, e viram tarefas individuais
+# concluídas. Uma OS concluída ou cancelada não muda mais: depois da primeira
+# impressão, sozinha ou num lote, o PDF dela nunca é gerado de novo.
+
+# Acima disso o lote é recusado (PDF grande demais para uma requisição de download).
+LIMITE_ORDENS_LOTE = 500
+
+
+def ordens_do_lote(parametros):
+    """OS do lote: {'cliente': pk, 'inicio': 'AAAA-MM-DD', 'fim': 'AAAA-MM-DD'}, todos opcionais."""
+    ordens = OrdemDeServico.objects.select_related('cliente', 'tecnico_responsavel')
+    if parametros.get('cliente'):
+        ordens = ordens.filter(cliente_id=parametros['cliente'])
+    if parametros.get('inicio'):
+        ordens = ordens.filter(data_abertura__gte=_inicio_do_dia(date.fromisoformat(parametros['inicio'])))
+    if parametros.get('fim'):
+        ordens = ordens.filter(data_abertura__lt=_inicio_do_dia(date.fromisoformat(parametros['fim']) + timedelta(days=1)))
+    return ordens.order_by('data_abertura', 'pk')
+
+
+def _inicio_do_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def _versao_ordens_lote(parametros):
+    versoes = [[os.pk, _versao_da_ordem(os)] for os in ordens_do_lote(parametros)]
+    return hashlib.sha256(json.dumps(versoes).encode('utf-8')).hexdigest()[:16]
+
+
+def _gerar_ordens_lote(parametros):
+    from pypdf import PdfWriter
+
+    ordens = list(ordens_do_lote(parametros))
+    if not ordens:
+        raise ValueError("Nenhuma ordem de serviço no período.")
+    pdfs = pdfs_das_ordens(ordens)
+    escritor = PdfWriter()
+    for os in ordens:
+        escritor.append(BytesIO(pdfs[os.pk]))
+    saida = BytesIO()
+    escritor.write(saida)
+    return saida.getvalue()
+
+
+def _nome_arquivo_ordens_lote(parametros):
+    partes = ['OS']
+    if parametros.get('cliente'):
+        partes.append(f"cliente_{parametros['cliente']}")
+    partes += [parametros[campo] for campo in ('inicio', 'fim') if parametros.get(campo)]
+    return '_'.join(partes) + '.pdf'
+
+
+def pdfs_das_ordens(ordens):
+    """{pk: PDF} das OS, lidos das tarefas guardadas; os que faltam são gerados e guardados."""
+    referencias = {os.pk: _hash('ordem_servico', {'pk': os.pk}) for os in ordens}
+    chaves = {os.pk: _hash(referencias[os.pk], _versao_da_ordem(os)) for os in ordens}
+    guardados = dict(TarefaRelatorio.objects.filter(chave__in=chaves.values(), status='CONCLUIDA')
+                     .values_list('chave', 'arquivo'))
+    pdfs = {pk: bytes(guardados[chave]) for pk, chave in chaves.items() if chave in guardados}
+
+    faltando = [os for os in ordens if os.pk not in pdfs]
+    htmls = [render_to_string('cliente/pdf_os.html', {'os': os}) for os in faltando]
+    agora = timezone.now()
+    novas = []
+    for os, pdf in zip(faltando, converter_em_paralelo(htmls)):
+        if pdf is None:
+            raise RuntimeError(f"Erro ao gerar o PDF da OS #{os.pk}.")
+        pdfs[os.pk] = pdf
+        novas.append(TarefaRelatorio(
+            tipo='ordem_servico', parametros={'pk': os.pk}, referencia=referencias[os.pk], chave=chaves[os.pk],
+            status='CONCLUIDA', arquivo=pdf, nome_arquivo=_nome_arquivo_da_ordem(os),
+            data_inicio=agora, data_conclusao=agora,
+        ))
+    # Poucas por INSERT: cada linha leva um PDF inteiro.
+    TarefaRelatorio.objects.bulk_create(novas, batch_size=20, ignore_conflicts=True)
+    # Como em solicitar(): PDFs de versões anteriores dessas OS não serão mais servidos.
+    (TarefaRelatorio.objects.filter(referencia__in=[tarefa.referencia for tarefa in novas])
+     .exclude(chave__in=[tarefa.chave for tarefa in novas]).exclude(status='PROCESSANDO').delete())
+    return pdfs
+
+
+def converter_em_paralelo(htmls):
+    """PDFs dos HTMLs, na mesma ordem; a conversão (xhtml2pdf, só CPU) roda em RELATORIOS_PROCESSOS processos."""
+    processos = min(getattr(settings, 'RELATORIOS_PROCESSOS', None) or cpu_count() or 1, len(htmls))
+    if processos <= 1:
+        return [html_to_pdf_bytes(html) for html in htmls]
+    # django.setup: com spawn (macOS/Windows) o processo novo não tem o Django
+    # configurado; o link_callback da conversão lê os settings.
+    with ProcessPoolExecutor(max_workers=processos, initializer=django.setup) as executor:
+        return list(executor.map(html_to_pdf_bytes, htmls))
+
+
+TIPOS = {
+    'transacoes_mensal': TipoRelatorio(
+        versao=_versao_transacoes_mensal,
+        gerar=_gerar_transacoes_mensal,
+        nome_arquivo=lambda p: f"relatorio_{p['mes']}_{p['ano']}.pdf",
+        disposicao='attachment',
+    ),
+    'ordem_servico': TipoRelatorio(
+        versao=_versao_ordem_servico,
+        gerar=_gerar_ordem_servico,
+        nome_arquivo=_nome_arquivo_ordem_servico,
+        disposicao='inline',
+    ),
+    'ordens_servico_lote': TipoRelatorio(
+        versao=_versao_ordens_lote,
+        gerar=_gerar_ordens_lote,
+        nome_arquivo=_nome_arquivo_ordens_lote,
+        disposicao='attachment',
+    ),
+}
+
+
+# ---------- Fila ----------
+
+def _hash(*partes):
+    return hashlib.sha256(json.dumps(partes, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def solicitar(tipo, parametros, usuario=None):
+    """Retorna a tarefa para (tipo, parametros, versão atual dos dados), criando-a na fila se ainda não existir."""
+    referencia = _hash(tipo, parametros)
+    chave = _hash(referencia, TIPOS[tipo].versao(parametros))
+    tarefa, criada = TarefaRelatorio.objects.defer('arquivo').get_or_create(
+        chave=chave,
+        defaults={'tipo': tipo, 'parametros': parametros, 'referencia': referencia, 'usuario': usuario},
+    )
+    if criada:
+        # PDFs de versões anteriores dos mesmos dados não serão mais servidos.
+        (TarefaRelatorio.objects.filter(referencia=referencia).exclude(pk=tarefa.pk)
+         .exclude(status='PROCESSANDO').delete())
+    elif tarefa.status == 'ERRO':
+        TarefaRelatorio.objects.filter(pk=tarefa.pk, status='ERRO').update(status='PENDENTE', erro=None)
+        tarefa.status = 'PENDENTE'
+    return tarefa
+
+
+def processar_proxima():
+    """Reserva a tarefa pendente mais antiga e gera o PDF. Retorna a tarefa, ou None se a fila estiver vazia."""
+    pendentes = TarefaRelatorio.objects.filter(status='PENDENTE').order_by('data_criacao').values_list('pk', flat=True)
+    for pk in pendentes[:10]:
+        # UPDATE condicional: se outro worker pegou a tarefa antes, passa para a próxima.
+        if TarefaRelatorio.objects.filter(pk=pk, status='PENDENTE').update(status='PROCESSANDO', data_inicio=timezone.now()):
+            tarefa = TarefaRelatorio.objects.get(pk=pk)
+            _executar(tarefa)
+            return tarefa
+    return None
+
+
+def resposta_pdf(tarefa):
+    """HttpResponse com o PDF guardado na tarefa concluída."""
+    response = HttpResponse(tarefa.arquivo, content_type='application/pdf')
+    disposicao = TIPOS[tarefa.tipo].disposicao
+    response['Content-Disposition'] = f'{disposicao}; filename="{tarefa.nome_arquivo}"'
+    return response
+
+
+def liberar_tarefas_abandonadas():
+    limite = timezone.now() - TEMPO_MAXIMO_PROCESSAMENTO
+    return TarefaRelatorio.objects.filter(status='PROCESSANDO', data_inicio__lt=limite).update(status='PENDENTE')
+
+
+def _executar(tarefa):
+    tipo = TIPOS[tarefa.tipo]
+    try:
+        pdf = tipo.gerar(tarefa.parametros)
+        if pdf is None:
+            raise RuntimeError("Erro ao gerar o PDF.")
+        tarefa.arquivo = pdf
+        tarefa.nome_arquivo = tipo.nome_arquivo(tarefa.parametros)
+        tarefa.status = 'CONCLUIDA'
+    except Exception as e:
+        logger.exception("Falha ao gerar relatório %s", tarefa.pk)
+        tarefa.status = 'ERRO'
+        tarefa.erro = str(e)
+    tarefa.data_conclusao = timezone.now()
+    tarefa.save(update_fields=['arquivo', 'nome_arquivo', 'status', 'erro', 'data_conclusao'])
@@ -0,0 +1,101 @@
+from collections import defaultdict
+from datetime import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.utils import timezone
+
+from .models import ResumoMensalMovimento, Transacao
+
+# ==================================
+# Resumo mensal de movimentações
+# ==================================
+# Relatórios e painéis leem ResumoMensalMovimento em vez de agregar
+# Transacao: o custo passa a depender do número de produtos do mês, não do
+# número de transações. O resumo é incrementado na mesma transação de banco
+# que grava cada Transacao; recalcular_resumo_mensal reconstrói meses inteiros.
+
+
+def periodo_do_mes(ano, mes):
+    """Início do mês e início do mês seguinte, no fuso local (intervalo semiaberto)."""
+    inicio = timezone.make_aware(datetime(ano, mes, 1))
+    fim = timezone.make_aware(datetime(ano + 1, 1, 1) if mes == 12 else datetime(ano, mes + 1, 1))
+    return inicio, fim
+
+
+def registrar_no_resumo(transacao):
+    """Soma a transação ao resumo do seu mês. Deve rodar dentro da transação de banco que a gravou."""
+    registrar_varias_no_resumo([transacao])
+
+
+def registrar_varias_no_resumo(transacoes):
+    """Soma um conjunto de transações ao resumo, com um upsert por (mês, produto, sentido)."""
+    totais = defaultdict(lambda: [0, 0])
+    meses = {}
+    for transacao in transacoes:
+        if transacao.data not in meses:
+            data = timezone.localtime(transacao.data)
+            meses[transacao.data] = (data.year, data.month)
+        total = totais[(*meses[transacao.data], transacao.produto_id, transacao.tipo_transacao.entrada)]
+        total[0] += transacao.quantidade
+        total[1] += 1
+    for (ano, mes, produto_id, entrada), (quantidade, numero) in totais.items():
+        _somar(ano=ano, mes=mes, produto_id=produto_id, entrada=entrada, quantidade=quantidade, transacoes=numero)
+
+
+def _somar(quantidade, transacoes, **chave):
+    resumos = ResumoMensalMovimento.objects.filter(**chave)
+    incremento = {'quantidade': F('quantidade') + quantidade, 'transacoes': F('transacoes') + transacoes}
+    if resumos.update(**incremento):
+        return
+    try:
+        with transaction.atomic():
+            ResumoMensalMovimento.objects.create(quantidade=quantidade, transacoes=transacoes, **chave)
+    except IntegrityError:
+        # Outra transação criou a linha do mês ao mesmo tempo.
+        resumos.update(**incremento)
+
+
+def totais_do_mes(ano, mes, entrada):
+    """Lista de {'produto__nome', 'total_quantidade'} do mês, maior quantidade primeiro."""
+    return list(ResumoMensalMovimento.objects
+                .filter(ano=ano, mes=mes, entrada=entrada, quantidade__gt=0)
+                .annotate(total_quantidade=F('quantidade'))
+                .values('produto__nome', 'total_quantidade')
+                .order_by('-total_quantidade'))
+
+
+def total_de_transacoes(ano, mes):
+    return ResumoMensalMovimento.objects.filter(ano=ano, mes=mes).aggregate(total=Sum('transacoes'))['total'] or 0
+
+
+def recalcular(ano, mes):
+    """Reconstrói o resumo de um mês a partir das transações."""
+    inicio, fim = periodo_do_mes(ano, mes)
+    totais = (Transacao.objects.filter(data__gte=inicio, data__lt=fim)
+              .values('produto_id', 'tipo_transacao__entrada')
+              .annotate(total=Sum('quantidade'), numero=Count('id'))
+              .order_by())
+    with transaction.atomic():
+        ResumoMensalMovimento.objects.filter(ano=ano, mes=mes).delete()
+        ResumoMensalMovimento.objects.bulk_create([
+            ResumoMensalMovimento(ano=ano, mes=mes, produto_id=linha['produto_id'],
+                                  entrada=linha['tipo_transacao__entrada'],
+                                  quantidade=linha['total'], transacoes=linha['numero'])
+            for linha in totais
+        ])
+
+
+def meses_com_transacoes():
+    """Todos os (ano, mes) entre a primeira e a última transação registrada."""
+    limites = Transacao.objects.aggregate(primeira=Min('data'), ultima=Max('data'))
+    if limites['primeira'] is None:
+        return []
+    atual = timezone.localtime(limites['primeira'])
+    ultima = timezone.localtime(limites['ultima'])
+    ano, mes = atual.year, atual.month
+    meses = []
+    while (ano, mes) <= (ultima.year, ultima.month):
+        meses.append((ano, mes))
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+    return meses
@@ -0,0 +1,63 @@
+from django.core.signals import request_finished, request_started
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import alertas, analise_os, indicadores, referencias
+from .models import Agendamento, OrdemDeServico, Produto, Transacao
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidar_referencias(sender, **kwargs):
+    tabela = referencias.MODELOS.get(sender)
+    if tabela:
+        # Agora, para a própria requisição ver a mudança, e de novo depois do
+        # commit: outra requisição pode ter relido a lista antiga nesse meio tempo.
+        referencias.invalidar(tabela)
+        transaction.on_commit(lambda: referencias.invalidar(tabela))
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidar_indicadores(sender, **kwargs):
+    # Movimentações em lote (bulk_create) não disparam sinais: estoque.py
+    # invalida os indicadores por conta própria.
+    if sender in (Produto, Transacao, OrdemDeServico, Agendamento):
+        indicadores.invalidar()
+        transaction.on_commit(indicadores.invalidar)
+
+
+@receiver(post_save, sender=Produto)
+def reavaliar_alerta_do_produto(sender, instance, **kwargs):
+    # Limites alterados ou produto inativado pelo formulário. As movimentações
+    # de estoque não passam por aqui (usam update) e chamam alertas.avaliar direto.
+    alertas.avaliar([instance.pk])
+
+
+@receiver(pre_save, sender=OrdemDeServico)
+def guardar_fechamento_anterior(sender, instance, **kwargs):
+    # Fechar de novo (ou cancelar) uma OS troca data_fechamento: o mês antigo também muda.
+    instance._fechamento_anterior = None
+    if instance.pk:
+        instance._fechamento_anterior = (OrdemDeServico.objects.filter(pk=instance.pk)
+                                         .values_list('data_fechamento', flat=True).first())
+
+
+@receiver(post_save, sender=OrdemDeServico)
+@receiver(post_delete, sender=OrdemDeServico)
+def invalidar_analise_da_os(sender, instance, **kwargs):
+    # Só os meses de fechamento da OS (o atual e o anterior) mudam; os demais
+    # meses encerrados seguem no cache. De novo depois do commit, como nas referências.
+    datas = (instance.data_fechamento, getattr(instance, '_fechamento_anterior', None))
+
+    def invalidar():
+        for data in datas:
+            analise_os.invalidar(data)
+
+    invalidar()
+    transaction.on_commit(invalidar)
+
+
+request_started.connect(referencias.iniciar_requisicao, dispatch_uid='referencias_iniciar_requisicao')
+request_finished.connect(referencias.encerrar_requisicao, dispatch_uid='referencias_encerrar_requisicao')
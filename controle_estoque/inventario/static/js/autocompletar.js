@@ -0,0 +1,57 @@
+// Campos com autocompletar (forms.AutocompletarSelect): o <select> vem só com
+// a opção escolhida; um campo de busca acima dele consulta a URL em
+// data-autocompletar e troca as opções pelos resultados.
+function ativarAutocompletar(raiz) {
+    raiz.querySelectorAll('select[data-autocompletar]').forEach(function (select) {
+        if (select.dataset.autocompletarAtivo) {
+            return;
+        }
+        select.dataset.autocompletarAtivo = '1';
+
+        const busca = document.createElement('input');
+        busca.type = 'search';
+        busca.className = 'form-control form-control-sm mb-1';
+        busca.placeholder = 'Digite para buscar...';
+        busca.autocomplete = 'off';
+        select.parentNode.insertBefore(busca, select);
+
+        const url = new URL(select.dataset.autocompletar, window.location.origin);
+        let espera = null;
+        let pendente = null;
+        busca.addEventListener('input', function () {
+            clearTimeout(espera);
+            espera = setTimeout(function () {
+                const termo = busca.value.trim();
+                if (!termo) {
+                    return;
+                }
+                if (pendente) {
+                    pendente.abort();
+                }
+                pendente = new AbortController();
+                url.searchParams.set('q', termo);
+                fetch(url, {signal: pendente.signal, headers: {'Accept': 'application/json'}})
+                    .then(function (resposta) { return resposta.json(); })
+                    .then(function (dados) {
+                        const vazia = select.querySelector('option[value=""]');
+                        select.replaceChildren(...(vazia ? [vazia] : []));
+                        dados.resultados.forEach(function (item) {
+                            select.add(new Option(item.texto, item.id));
+                        });
+                        if (dados.resultados.length) {
+                            select.selectedIndex = vazia ? 1 : 0;
+                            select.dispatchEvent(new Event('change'));
+                        }
+                    })
+                    .catch(function () {
+                        // Busca cancelada por uma digitação mais nova (ou falha de rede):
+                        // as opções atuais continuam valendo.
+                    });
+            }, 250);
+        });
+    });
+}
+
+document.addEventListener('DOMContentLoaded', function () {
+    ativarAutocompletar(document);
+});
@@ -1,3 +1,1093 @@
-from django.test import TestCase
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time as time_module
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection
+from django.db.models import Count, Sum
+from django.forms import ValidationError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import agenda, alertas, analise_os, autocompletar, escalonamento, estoque, exportacao, graficos, importacao, indicadores, metricas, posicao_estoque, referencias, relatorios, resumo_mensal, views_cliente
+from .forms import AgendamentoForm, ProdutoForm, TransacaoForm
+from .models import (INATIVO, Agendamento, AlertaEstoque, Categoria, Cliente, DocumentoTransacao, LoteEstoque, MovimentacaoLote, OrdemDeServico, Produto, ResumoMensalMovimento,
+                     Sistema, SnapshotLote, TarefaRelatorio, Tecnico, TipoTransacao, Transacao)
+
+
+class EstoqueTestMixin:
+    def setUp(self):
+        self.usuario = User.objects.create_user('estoquista', password='senha-de-teste', is_staff=True)
+        self.produto = Produto.objects.create(nome='Cabo de Rede')
+        self.entrada = TipoTransacao.objects.create(nome='Compra', entrada=True)
+        self.saida = TipoTransacao.objects.create(nome='Venda', entrada=False)
+
+    def registrar(self, tipo, quantidade, lote=''):
+        form = TransacaoForm({
+            'produto': self.produto.pk,
+            'tipo_transacao': tipo.pk,
+            'quantidade': quantidade,
+            'lote': lote,
+        }, user=self.usuario)
+        self.assertTrue(form.is_valid(), form.errors)
+        return form.save()
+
+
+class LivroEstoqueTests(EstoqueTestMixin, TestCase):
+    def test_entrada_grava_uma_linha_por_lote(self):
+        self.registrar(self.entrada, 10000, lote='L1')
+        self.registrar(self.entrada, 5, lote='L1')
+        self.assertEqual(LoteEstoque.objects.count(), 1)
+        self.assertEqual(LoteEstoque.objects.get().quantidade, 10005)
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.estoque_total, 10005)
+
+    def test_saida_consome_lotes_mais_antigos_primeiro(self):
+        self.registrar(self.entrada, 3, lote='L1')
+        self.registrar(self.entrada, 4, lote='L2')
+        self.registrar(self.entrada, 5, lote='L3')
+        saida = self.registrar(self.saida, 8)
+
+        saldos = dict(LoteEstoque.objects.values_list('lote', 'quantidade'))
+        self.assertEqual(saldos, {'L1': 0, 'L2': 0, 'L3': 4})
+        consumo = dict(MovimentacaoLote.objects.filter(transacao=saida).values_list('lote_estoque__lote', 'quantidade'))
+        self.assertEqual(consumo, {'L1': 3, 'L2': 4, 'L3': 1})
+
+    def test_saida_com_poucas_consultas(self):
+        for lote in ('L1', 'L2', 'L3', 'L4'):
+            self.registrar(self.entrada, 1000, lote=lote)
+        form = TransacaoForm({'produto': self.produto.pk, 'tipo_transacao': self.saida.pk, 'quantidade': 3500}, user=self.usuario)
+        self.assertTrue(form.is_valid(), form.errors)
+        with CaptureQueriesContext(connection) as consultas:
+            form.save()
+        updates = [q['sql'] for q in consultas if q['sql'].startswith('UPDATE') and 'inventario_loteestoque' in q['sql'].split('SET')[0]]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(self.produto.calcular_estoque(), 500)
+
+    def test_lote_zerado_volta_para_o_fim_da_fila(self):
+        self.registrar(self.entrada, 2, lote='L1')
+        self.registrar(self.entrada, 2, lote='L2')
+        self.registrar(self.saida, 2)
+        self.registrar(self.entrada, 2, lote='L1')
+        self.registrar(self.saida, 1)
+        saldos = dict(LoteEstoque.objects.values_list('lote', 'quantidade'))
+        self.assertEqual(saldos, {'L1': 2, 'L2': 1})
+
+    def test_saida_maior_que_estoque_e_rejeitada(self):
+        self.registrar(self.entrada, 2, lote='L1')
+        form = TransacaoForm({'produto': self.produto.pk, 'tipo_transacao': self.saida.pk, 'quantidade': 3}, user=self.usuario)
+        self.assertFalse(form.is_valid())
+
+
+class SaldoProdutoTests(EstoqueTestMixin, TestCase):
+    def test_saldo_acompanha_entradas_e_saidas(self):
+        self.registrar(self.entrada, 7, lote='L1')
+        self.registrar(self.saida, 3)
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.estoque_total, 4)
+        self.assertEqual(self.produto.estoque_total, self.produto.calcular_estoque())
+
+    def test_salvar_produto_desatualizado_nao_desfaz_o_saldo(self):
+        desatualizado = Produto.objects.get(pk=self.produto.pk)
+        self.registrar(self.entrada, 10, lote='L1')
+        desatualizado.nome = 'Cabo de Rede Cat6'
+        desatualizado.save()
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.nome, 'Cabo de Rede Cat6')
+        self.assertEqual(self.produto.estoque_total, self.produto.calcular_estoque())
+        self.assertEqual(self.produto.estoque_total, 10)
+
+    def test_listagem_nao_consulta_saldo_por_produto(self):
+        for i in range(20):
+            Produto.objects.create(nome=f'Produto {i}')
+        self.client.force_login(self.usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('listar_produtos'))
+        self.assertFalse([q for q in consultas if 'inventario_loteestoque' in q['sql']])
+
+    def test_reconciliacao_corrige_divergencias(self):
+        self.registrar(self.entrada, 5, lote='L1')
+        Produto.objects.filter(pk=self.produto.pk).update(estoque_total=99)
+
+        with self.assertRaises(CommandError):
+            call_command('reconciliar_estoque', '--verificar', stdout=StringIO())
+        call_command('reconciliar_estoque', stdout=StringIO())
+
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.estoque_total, 5)
+
+
+class ConcorrenciaEstoqueTests(EstoqueTestMixin, TransactionTestCase):
+    SAIDAS_PARALELAS = 12
+
+    def test_saidas_paralelas_nao_vendem_alem_do_estoque(self):
+        for lote in ('L1', 'L2', 'L3'):
+            self.registrar(self.entrada, 5, lote=lote)
+        barreira = threading.Barrier(self.SAIDAS_PARALELAS)
+        resultados = []
+
+        def sair():
+            try:
+                barreira.wait()
+                transacao = Transacao(tipo_transacao=self.saida, usuario=self.usuario, produto=self.produto, quantidade=2)
+                estoque.registrar_transacao(transacao)
+                resultados.append('ok')
+            except ValidationError:
+                resultados.append('sem estoque')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=sair) for _ in range(self.SAIDAS_PARALELAS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.produto.refresh_from_db()
+        self.assertEqual(resultados.count('ok'), 7)
+        self.assertEqual(resultados.count('sem estoque'), self.SAIDAS_PARALELAS - 7)
+        self.assertEqual(self.produto.estoque_total, 1)
+        self.assertEqual(self.produto.calcular_estoque(), 1)
+        self.assertFalse(LoteEstoque.objects.filter(quantidade__lt=0).exists())
+        # Cada unidade de cada lote saiu no máximo uma vez.
+        for lote in LoteEstoque.objects.all():
+            saidas = (lote.movimentacoes.filter(transacao__tipo_transacao__entrada=False)
+                      .aggregate(total=Sum('quantidade'))['total'] or 0)
+            self.assertEqual(saidas + lote.quantidade, 5)
+
+    def test_deadlock_e_repetido_com_espera(self):
+        tentativas = []
+
+        def funcao():
+            tentativas.append(1)
+            if len(tentativas) < 3:
+                raise OperationalError(1213, 'Deadlock found when trying to get lock')
+            return 'ok'
+
+        self.assertEqual(estoque.com_retentativa(funcao, espera_base=0), 'ok')
+        self.assertEqual(len(tentativas), 3)
+
+    def test_retentativas_sao_limitadas(self):
+        def funcao():
+            raise OperationalError(1213, 'Deadlock found when trying to get lock')
+
+        with self.assertRaises(OperationalError):
+            estoque.com_retentativa(funcao, tentativas=2, espera_base=0)
+
+
+class ResumoMensalTests(EstoqueTestMixin, TestCase):
+    def test_resumo_incrementado_a_cada_transacao(self):
+        self.registrar(self.entrada, 10, lote='L1')
+        self.registrar(self.entrada, 5, lote='L2')
+        self.registrar(self.saida, 4)
+        hoje = timezone.localtime()
+
+        entradas = resumo_mensal.totais_do_mes(hoje.year, hoje.month, entrada=True)
+        saidas = resumo_mensal.totais_do_mes(hoje.year, hoje.month, entrada=False)
+        self.assertEqual(entradas, [{'produto__nome': 'Cabo de Rede', 'total_quantidade': 15}])
+        self.assertEqual(saidas, [{'produto__nome': 'Cabo de Rede', 'total_quantidade': 4}])
+        self.assertEqual(resumo_mensal.total_de_transacoes(hoje.year, hoje.month), 3)
+
+    def test_comando_reconstroi_o_resumo(self):
+        self.registrar(self.entrada, 10, lote='L1')
+        self.registrar(self.saida, 3)
+        esperado = set(ResumoMensalMovimento.objects.values_list('ano', 'mes', 'produto', 'entrada', 'quantidade', 'transacoes'))
+        ResumoMensalMovimento.objects.all().delete()
+
+        call_command('recalcular_resumo_mensal', stdout=StringIO())
+
+        obtido = set(ResumoMensalMovimento.objects.values_list('ano', 'mes', 'produto', 'entrada', 'quantidade', 'transacoes'))
+        self.assertEqual(obtido, esperado)
+
+
+class TarefaRelatorioTests(EstoqueTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+        self.registrar(self.entrada, 10, lote='L1')
+        hoje = timezone.localtime()
+        self.periodo = {'month': hoje.month, 'year': hoje.year}
+
+    def test_relatorio_mensal_e_gerado_pelo_worker_e_reaproveitado(self):
+        resposta = self.client.post(reverse('relatorio_transacoes'), self.periodo)
+        tarefa = TarefaRelatorio.objects.get()
+        self.assertRedirects(resposta, reverse('acompanhar_relatorio', args=[tarefa.pk]))
+        self.assertEqual(self.client.get(reverse('status_relatorio', args=[tarefa.pk])).json()['status'], 'PENDENTE')
+
+        call_command('processar_relatorios', '--uma-vez', stdout=StringIO())
+
+        status = self.client.get(reverse('status_relatorio', args=[tarefa.pk])).json()
+        self.assertEqual(status['status'], 'CONCLUIDA')
+        resposta = self.client.get(status['download_url'])
+        self.assertEqual(resposta['Content-Type'], 'application/pdf')
+        self.assertTrue(resposta.content.startswith(b'%PDF'))
+
+        # Mesmo mês, mesmos dados: servido do cache sem nova tarefa.
+        resposta = self.client.post(reverse('relatorio_transacoes'), self.periodo)
+        self.assertRedirects(resposta, reverse('baixar_relatorio', args=[tarefa.pk]), fetch_redirect_response=False)
+        self.assertEqual(TarefaRelatorio.objects.count(), 1)
+
+    def test_nova_transacao_invalida_o_pdf_do_mes(self):
+        self.client.post(reverse('relatorio_transacoes'), self.periodo)
+        call_command('processar_relatorios', '--uma-vez', stdout=StringIO())
+        self.registrar(self.saida, 1)
+
+        self.client.post(reverse('relatorio_transacoes'), self.periodo)
+        tarefa = TarefaRelatorio.objects.get()
+        self.assertEqual(tarefa.status, 'PENDENTE')
+
+    def test_worker_devolve_a_fila_tarefa_abandonada_durante_a_execucao(self):
+        self.client.post(reverse('relatorio_transacoes'), self.periodo)
+        tarefa = TarefaRelatorio.objects.get()
+        esperas = []
+
+        def esperar(segundos):
+            esperas.append(segundos)
+            if len(esperas) > 1:
+                raise KeyboardInterrupt
+            # Com o worker já rodando, outro worker cai e deixa a tarefa presa em PROCESSANDO.
+            TarefaRelatorio.objects.filter(pk=tarefa.pk).update(
+                status='PROCESSANDO', data_inicio=timezone.now() - relatorios.TEMPO_MAXIMO_PROCESSAMENTO * 2)
+
+        comando = 'inventario.management.commands.processar_relatorios'
+        with mock.patch(f'{comando}.time.sleep', side_effect=esperar), mock.patch(f'{comando}.close_old_connections'), \
+                self.assertRaises(KeyboardInterrupt):
+            call_command('processar_relatorios', '--liberar-a-cada', '0', stdout=StringIO())
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, 'CONCLUIDA')
+
+    def test_impressao_de_os_passa_pela_fila(self):
+        cliente = Cliente.objects.create(razao_social='Cliente Teste', cnpj='00.000.000/0001-00')
+        os = OrdemDeServico.objects.create(cliente=cliente, problema_relatado='Impressora não liga')
+        self.client.get(reverse('imprimir_os', args=[os.pk]))
+        call_command('processar_relatorios', '--uma-vez', stdout=StringIO())
+
+        resposta = self.client.get(reverse('imprimir_os', args=[os.pk]), follow=True)
+        self.assertEqual(resposta['Content-Type'], 'application/pdf')
+
+    def criar_ordens(self, quantidade):
+        cliente = Cliente.objects.create(razao_social='Cliente Teste', cnpj='00.000.000/0001-00')
+        return cliente, [OrdemDeServico.objects.create(cliente=cliente, problema_relatado=f'Problema {n}')
+                         for n in range(quantidade)]
+
+    @override_settings(RELATORIOS_PROCESSOS=2)
+    def test_lote_de_os_em_um_pdf(self):
+        from pypdf import PdfReader
+
+        cliente, ordens = self.criar_ordens(3)
+        resposta = self.client.get(reverse('imprimir_os_lote'), {'cliente': cliente.pk})
+        self.assertRedirects(resposta, reverse('acompanhar_relatorio', args=[TarefaRelatorio.objects.get().pk]))
+        call_command('processar_relatorios', '--uma-vez', stdout=StringIO())
+
+        lote = TarefaRelatorio.objects.get(tipo='ordens_servico_lote')
+        self.assertEqual(lote.status, 'CONCLUIDA', lote.erro)
+        paginas = len(PdfReader(BytesIO(bytes(lote.arquivo))).pages)
+        self.assertGreaterEqual(paginas, len(ordens))
+        # Os PDFs individuais ficaram guardados: imprimir uma OS não volta à fila.
+        self.assertEqual(relatorios.solicitar('ordem_servico', {'pk': ordens[0].pk}).status, 'CONCLUIDA')
+
+    @override_settings(RELATORIOS_PROCESSOS=1)
+    def test_lote_so_gera_as_os_alteradas(self):
+        _, ordens = self.criar_ordens(3)
+        with mock.patch.object(relatorios, 'html_to_pdf_bytes', wraps=relatorios.html_to_pdf_bytes) as conversao:
+            relatorios.pdfs_das_ordens(list(relatorios.ordens_do_lote({})))
+            self.assertEqual(conversao.call_count, 3)
+            OrdemDeServico.objects.filter(pk=ordens[1].pk).update(status='CONCLUIDA', solucao_aplicada='Cabo trocado')
+            relatorios.pdfs_das_ordens(list(relatorios.ordens_do_lote({})))
+            self.assertEqual(conversao.call_count, 4)
+        self.assertEqual(TarefaRelatorio.objects.filter(tipo='ordem_servico').count(), 3)
+
+    def test_lote_exige_cliente_ou_periodo(self):
+        resposta = self.client.get(reverse('imprimir_os_lote'), {'data_inicio': '2025-01-01'})
+        self.assertContains(resposta, 'Informe o cliente ou o período')
+        self.assertFalse(TarefaRelatorio.objects.exists())
+
+
+class ExportacaoTests(EstoqueTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+
+    def test_csv_de_transacoes_respeita_filtros_da_listagem(self):
+        self.registrar(self.entrada, 10, lote='L1')
+        self.registrar(self.saida, 3)
+        resposta = self.client.get(reverse('exportar_transacoes'), {'formato': 'csv', 'tipo': self.saida.pk})
+        self.assertTrue(resposta.streaming)
+        conteudo = b''.join(resposta.streaming_content).decode('utf-8')
+        self.assertTrue(conteudo.startswith(exportacao.BOM))
+        linhas = conteudo[len(exportacao.BOM):].splitlines()
+        self.assertEqual(len(linhas), 2)
+        self.assertIn('Venda;Saída;Cabo de Rede;3', linhas[1])
+
+    def test_leitura_em_blocos_percorre_todas_as_linhas(self):
+        for i in range(5):
+            self.registrar(self.entrada, 1, lote=f'L{i}')
+        linhas = list(exportacao.linhas_por_pk(LoteEstoque.objects.all(), ['lote'], tamanho=2))
+        self.assertEqual(linhas, [(f'L{i}',) for i in range(5)])
+
+    def test_exportacao_de_clientes_e_estoque(self):
+        Cliente.objects.create(razao_social='ACME Ltda', cnpj='11.111.111/0001-11', tipo_contrato='CONTRATO')
+        self.registrar(self.entrada, 4, lote='L9')
+        resposta = self.client.get(reverse('exportar_clientes'), {'formato': 'csv', 'busca': 'ACME'})
+        self.assertIn('ACME Ltda', b''.join(resposta.streaming_content).decode('utf-8-sig'))
+        resposta = self.client.get(reverse('exportar_estoque'), {'formato': 'csv'})
+        self.assertIn('Cabo de Rede;;L9;4', b''.join(resposta.streaming_content).decode('utf-8-sig'))
+
+
+class PosicaoEstoqueTests(EstoqueTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        hoje = timezone.localdate()
+        self.dias = [hoje - timedelta(days=n) for n in (5, 4, 3)]
+        # Entrada de 10 no 1º dia, saída de 3 no 2º e entrada de 5 (outro lote) no 3º.
+        for dia, (tipo, quantidade, lote) in zip(self.dias, [(self.entrada, 10, 'L1'), (self.saida, 3, ''),
+                                                             (self.entrada, 5, 'L2')]):
+            transacao = self.registrar(tipo, quantidade, lote=lote)
+            Transacao.objects.filter(pk=transacao.pk).update(
+                data=timezone.make_aware(datetime.combine(dia, time(10))))
+        self.lote1, self.lote2 = LoteEstoque.objects.order_by('lote')
+
+    def conferir(self):
+        fins = [posicao_estoque.fim_do_dia(dia) for dia in self.dias]
+        self.assertEqual([posicao_estoque.saldo_em(self.produto, fim) for fim in fins], [10, 7, 12])
+        self.assertEqual(posicao_estoque.saldo_em(self.produto, fins[0] - timedelta(days=1)), 0)
+        self.assertEqual(posicao_estoque.saldos_lotes_em(fins[1]), {self.lote1.pk: 7, self.lote2.pk: 0})
+
+    def test_sem_snapshot_parte_do_saldo_atual(self):
+        self.conferir()
+
+    def test_snapshot_mais_movimento_do_dia(self):
+        saida = StringIO()
+        call_command('snapshot_estoque', '--dia', self.dias[1].isoformat(), stdout=saida)
+        self.assertIn('1 lote(s)', saida.getvalue())
+        self.assertEqual(list(SnapshotLote.objects.values_list('lote_estoque__lote', 'quantidade')), [('L1', 7)])
+        posicao_estoque.gerar_snapshot(posicao_estoque.fim_do_dia(self.dias[0]))
+        self.conferir()
+        # Snapshot + um dia de transações: o número de consultas não depende do histórico.
+        with self.assertNumQueries(4):
+            posicao_estoque.saldo_em(self.produto, posicao_estoque.fim_do_dia(self.dias[2]))
+
+    def test_exportacao_da_posicao_em_uma_data(self):
+        self.client.force_login(self.usuario)
+        resposta = self.client.get(reverse('exportar_estoque'), {'formato': 'csv', 'data': self.dias[1].isoformat()})
+        conteudo = b''.join(resposta.streaming_content).decode('utf-8')
+        self.assertTrue(conteudo.startswith(exportacao.BOM))
+        linhas = conteudo[len(exportacao.BOM):].splitlines()
+        self.assertEqual(len(linhas), 2)
+        self.assertIn('Cabo de Rede;;L1;7', linhas[1])
+
+
+class AlertasEstoqueTests(EstoqueTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        Produto.objects.filter(pk=self.produto.pk).update(estoque_minimo=5, ponto_reposicao=10)
+        self.registrar(self.entrada, 20, lote='L1')
+
+    def test_alerta_abre_atualiza_e_encerra(self):
+        self.assertFalse(AlertaEstoque.objects.exists())
+        self.registrar(self.saida, 12)
+        self.registrar(self.saida, 5)
+        alerta = AlertaEstoque.objects.get()
+        self.assertEqual((alerta.nivel, alerta.saldo), ('CRITICO', 3))
+        self.registrar(self.entrada, 4, lote='L1')
+        alerta.refresh_from_db()
+        self.assertEqual((alerta.nivel, alerta.saldo), ('REPOR', 7))
+        self.registrar(self.entrada, 10, lote='L1')
+        alerta.refresh_from_db()
+        self.assertIsNotNone(alerta.data_resolucao)
+        self.assertFalse(alertas.abertos().exists())
+
+    def test_avaliacao_nao_depende_do_catalogo(self):
+        Produto.objects.bulk_create([Produto(nome=f'Item {n}', estoque_minimo=5) for n in range(200)])
+        self.registrar(self.saida, 18)
+        # Só o produto movimentado é avaliado; sem mudança, duas consultas e nenhuma escrita.
+        self.assertEqual(AlertaEstoque.objects.count(), 1)
+        with self.assertNumQueries(2):
+            alertas.avaliar([self.produto.pk])
+
+    def test_limites_no_formulario_e_painel(self):
+        form = ProdutoForm({'nome': 'Cabo de Rede', 'estoque_minimo': 30, 'ponto_reposicao': 10},
+                           instance=self.produto)
+        self.assertIn('ponto_reposicao', form.errors)
+        form = ProdutoForm({'nome': 'Cabo de Rede', 'estoque_minimo': 30, 'ponto_reposicao': 40},
+                           instance=self.produto)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.client.force_login(self.usuario)
+        resposta = self.client.get(reverse('navegacao'))
+        self.assertContains(resposta, 'Estoque baixo (1)')
+        self.assertContains(resposta, 'Cabo de Rede')
+
+
+class IndicadoresTests(EstoqueTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        Produto.objects.filter(pk=self.produto.pk).update(valor_unitario='2.50')
+        self.registrar(self.entrada, 10, lote='L1')
+        self.registrar(self.saida, 4)
+        cliente = Cliente.objects.create(razao_social='Mercado Silva', cnpj='12.345.678/0001-90')
+        for status in ('ABERTA', 'ABERTA', 'CONCLUIDA'):
+            OrdemDeServico.objects.create(cliente=cliente, problema_relatado='Sem rede', status=status)
+        Agendamento.objects.create(cliente=cliente, descricao='Visita', data_agendamento=timezone.localdate(),
+                                   hora_agendamento=time(9))
+
+    def test_indicadores(self):
+        dados = indicadores.calcular()
+        self.assertEqual((dados['estoque_quantidade'], dados['estoque_valor']), (6, Decimal('15.00')))
+        self.assertEqual(dados['mais_movimentados'], [{'produto_id': self.produto.pk, 'nome': 'Cabo de Rede', 'quantidade': 14}])
+        self.assertEqual([(item['status'], item['total']) for item in dados['ordens_em_aberto']],
+                         [('ABERTA', 2), ('EM_ANDAMENTO', 0)])
+        self.assertEqual(dados['agendamentos_hoje'], 1)
+
+    def test_painel_le_do_cache(self):
+        self.client.force_login(self.usuario)
+        self.assertContains(self.client.get(reverse('navegacao')), 'Agendamentos hoje')
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('navegacao'))
+        self.assertFalse([c for c in consultas.captured_queries if 'inventario_transacao' in c['sql']])
+
+    def test_gravacoes_descartam_o_cache(self):
+        self.assertEqual(indicadores.obter()['estoque_quantidade'], 6)
+        with self.captureOnCommitCallbacks(execute=True):
+            estoque.registrar_documento(
+                DocumentoTransacao(tipo_transacao=self.entrada, usuario=self.usuario, numero='NF 1'),
+                [(self.produto.pk, 5, 'L2')])
+        self.assertEqual(indicadores.obter()['estoque_quantidade'], 11)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            OrdemDeServico.objects.create(cliente=Cliente.objects.get(), problema_relatado='Sem rede')
+        self.assertEqual(indicadores.obter()['ordens_em_aberto'][0]['total'], 3)
+
+
+class AnaliseOSTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ana = Tecnico.objects.create(nome='Ana')
+        self.erp = Sistema.objects.create(nome='ERP')
+        self.cliente = Cliente.objects.create(razao_social='Mercado Silva', cnpj='12.345.678/0001-90', sistema=self.erp)
+        outro = Cliente.objects.create(razao_social='Padaria Sol', cnpj='98.765.432/0001-10')
+        # Dez OS concluídas no mês passado, com prazos de 1 a 10 horas.
+        hoje = timezone.localdate()
+        self.mes_passado = analise_os.meses_ate(hoje.year, hoje.month, 2)[0]
+        inicio, _ = resumo_mensal.periodo_do_mes(*self.mes_passado)
+        for horas in range(1, 11):
+            fechamento = inicio + timedelta(days=5)
+            OrdemDeServico.objects.create(
+                cliente=self.cliente if horas <= 6 else outro, tecnico_responsavel=self.ana if horas % 2 else None,
+                problema_relatado='Sem rede', status='CONCLUIDA', valor=Decimal('100.00'),
+                data_abertura=fechamento - timedelta(hours=horas), data_fechamento=fechamento)
+        OrdemDeServico.objects.create(cliente=self.cliente, problema_relatado='Sem rede', status='CANCELADA',
+                                      valor=Decimal('50.00'), data_fechamento=inicio + timedelta(days=1))
+
+    def test_faturamento_e_prazo_do_mes(self):
+        resultado = analise_os.calcular_mes(*self.mes_passado)
+        self.assertEqual((resultado['ordens'], resultado['receita']), (10, Decimal('1000.00')))
+        self.assertAlmostEqual(resultado['media_horas'], 5.5)
+        self.assertAlmostEqual(resultado['p90_horas'], 9.1)
+        self.assertEqual(resultado['por_sistema'][self.erp.pk], {'receita': Decimal('600.00'), 'ordens': 6})
+        self.assertEqual(resultado['por_tecnico'][self.ana.pk]['ordens'], 5)
+        # Sem NumPy, o percentil em Python dá o mesmo resultado.
+        with mock.patch.dict(sys.modules, {'numpy': None}):
+            self.assertAlmostEqual(analise_os.percentil(float(h) for h in range(1, 11)), 9.1)
+        self.assertIsNone(analise_os.percentil([]))
+
+    def test_meses_encerrados_vem_do_cache(self):
+        usuario = User.objects.create_user('gerente', password='senha-de-teste')
+        self.client.force_login(usuario)
+        resposta = self.client.get(reverse('analise_os'), {'meses': 3})
+        self.assertEqual(len(resposta.context['por_mes']), 3)
+        self.assertEqual(resposta.context['por_sistema'][0]['nome'], 'ERP')
+        with self.assertNumQueries(0):
+            analise_os.obter_mes(*self.mes_passado)
+
+        # Uma OS alterada invalida o mês do seu fechamento.
+        os = OrdemDeServico.objects.filter(status='CONCLUIDA').first()
+        os.valor = Decimal('400.00')
+        os.save()
+        self.assertEqual(analise_os.obter_mes(*self.mes_passado)['receita'], Decimal('1300.00'))
+
+    def test_fechar_de_novo_invalida_o_mes_anterior(self):
+        usuario = User.objects.create_user('gerente', password='senha-de-teste')
+        self.client.force_login(usuario)
+        self.assertEqual(analise_os.obter_mes(*self.mes_passado)['receita'], Decimal('1000.00'))
+
+        # A OS do mês passado é fechada de novo como cancelada: sai do faturamento daquele mês.
+        os = OrdemDeServico.objects.filter(status='CONCLUIDA').first()
+        self.client.post(reverse('fechar_os', args=[os.pk]),
+                         {'solucao_aplicada': 'Sem conserto', 'status': 'CANCELADA', 'valor': '100.00'})
+        self.assertEqual(OrdemDeServico.objects.get(pk=os.pk).status, 'CANCELADA')
+        self.assertEqual(analise_os.obter_mes(*self.mes_passado)['receita'], Decimal('900.00'))
+        self.assertEqual(analise_os.obter_mes(*self.mes_passado)['ordens'], 9)
+
+
+class ListagemClientesTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user('atendente', password='senha-de-teste', is_staff=True)
+        self.client.force_login(self.usuario)
+        for i in range(30):
+            Cliente.objects.create(razao_social=f'Cliente {i:02d}', cnpj=f'{i:02d}.345.678/0001-90')
+
+    def test_paginacao_por_cursor_percorre_todos_os_clientes(self):
+        vistos, params = [], {}
+        while True:
+            pagina = self.client.get(reverse('listar_clientes'), params).context['page_obj']
+            vistos += [cliente.razao_social for cliente in pagina]
+            if not pagina.has_next():
+                break
+            params = {'cursor': pagina.next_cursor}
+        self.assertEqual(vistos, [f'Cliente {i:02d}' for i in range(30)])
+
+        anterior = self.client.get(reverse('listar_clientes'), {'cursor': pagina.previous_cursor}).context['page_obj']
+        self.assertEqual(list(anterior)[0].razao_social, 'Cliente 00')
+
+    def test_busca_por_cnpj_usa_prefixo_dos_digitos(self):
+        self.assertEqual(Cliente.objects.get(razao_social='Cliente 07').cnpj_digitos, '07345678000190')
+        encontrados = Cliente.objects.buscar('07.345')
+        self.assertEqual([c.razao_social for c in encontrados], ['Cliente 07'])
+        self.assertEqual(Cliente.objects.buscar('cliente 1').count(), 10)
+
+
+class HistoricoClienteTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user('atendente', password='senha-de-teste')
+        self.client.force_login(self.usuario)
+        self.cliente = Cliente.objects.create(razao_social='Mercado Silva', cnpj='12.345.678/0001-90')
+        self.tecnico = Tecnico.objects.create(nome='Ana')
+
+    def criar_historico(self, quantidade):
+        for n in range(quantidade):
+            OrdemDeServico.objects.create(cliente=self.cliente, tecnico_responsavel=self.tecnico, problema_relatado=f'OS {n}')
+            Agendamento.objects.create(cliente=self.cliente, tecnico=self.tecnico, descricao=f'Visita {n}',
+                                       data_agendamento=timezone.localdate() - timedelta(days=n), hora_agendamento=time(9))
+
+    def consultas_do_detalhe(self):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse('detalhe_cliente', args=[self.cliente.pk]))
+        self.assertEqual(resposta.status_code, 200)
+        return len(consultas), resposta
+
+    def test_detalhe_tem_custo_constante(self):
+        self.criar_historico(3)
+        poucas, _ = self.consultas_do_detalhe()
+        self.criar_historico(30)
+        muitas, resposta = self.consultas_do_detalhe()
+        self.assertEqual(poucas, muitas)
+        self.assertEqual(len(resposta.context['ordens_servico']), views_cliente.HISTORICO_POR_PAGINA)
+        self.assertEqual(resposta.context['resumo_os'], {'total': 33, 'em_aberto': 33})
+        self.assertContains(resposta, 'class="carregar-mais"', count=2)
+
+    def test_paginas_do_historico(self):
+        self.criar_historico(25)
+        url = reverse('historico_cliente', args=[self.cliente.pk, 'os'])
+        vistas, cursor = [], ''
+        while True:
+            resposta = self.client.get(url, {'formato': 'json', 'cursor': cursor})
+            dados = resposta.json()
+            vistas += [os['id'] for os in dados['resultados']]
+            self.assertTrue(all(os['tecnico'] == 'Ana' for os in dados['resultados']))
+            if not dados['proximo']:
+                break
+            cursor = dados['proximo']
+        self.assertEqual(sorted(vistas), sorted(OrdemDeServico.objects.values_list('pk', flat=True)))
+
+        resposta = self.client.get(reverse('historico_cliente', args=[self.cliente.pk, 'agendamentos']))
+        self.assertContains(resposta, '<tr>', count=views_cliente.HISTORICO_POR_PAGINA)
+        self.assertContains(resposta, 'Carregar mais')
+        self.assertEqual(self.client.get(reverse('historico_cliente', args=[self.cliente.pk, 'x'])).status_code, 404)
+
+
+class AgendaTecnicosTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user('atendente', password='senha-de-teste')
+        self.cliente = Cliente.objects.create(razao_social='Mercado Silva', cnpj='12.345.678/0001-90')
+        self.tecnico = Tecnico.objects.create(nome='Ana')
+        self.dia = timezone.localdate()
+        Agendamento.objects.create(cliente=self.cliente, tecnico=self.tecnico, descricao='Instalação',
+                                   data_agendamento=self.dia, hora_agendamento=time(9), duracao_minutos=90)
+
+    def formulario(self, hora, duracao=60, dia=None, instance=None):
+        return AgendamentoForm({'tecnico': self.tecnico.pk, 'descricao': 'Visita', 'data_agendamento': dia or self.dia,
+                                'hora_agendamento': hora, 'duracao_minutos': duracao}, instance=instance)
+
+    def test_conflito_de_horario(self):
+        self.assertIn('já tem agendamento', str(self.formulario('10:00').errors))
+        self.assertIn('já tem agendamento', str(self.formulario('08:30').errors))
+        self.assertTrue(self.formulario('10:30').is_valid())
+        self.assertTrue(self.formulario('08:00').is_valid())
+        # Editar o próprio agendamento não conflita com ele mesmo.
+        self.assertTrue(self.formulario('09:15', instance=Agendamento.objects.get()).is_valid())
+
+    def test_conflito_que_atravessa_a_meia_noite(self):
+        Agendamento.objects.create(cliente=self.cliente, tecnico=self.tecnico, descricao='Plantão',
+                                   data_agendamento=self.dia, hora_agendamento=time(23), duracao_minutos=180)
+        self.assertFalse(self.formulario('01:00', dia=self.dia + timedelta(days=1)).is_valid())
+        self.assertTrue(self.formulario('02:00', dia=self.dia + timedelta(days=1)).is_valid())
+
+    def test_agenda_do_mes_em_uma_consulta(self):
+        self.client.force_login(self.usuario)
+        url = reverse('agenda_tecnicos')
+        self.client.get(url, {'visao': 'mes'})
+        tecnicos = Tecnico.objects.bulk_create([Tecnico(nome=f'Técnico {n}') for n in range(50)])
+        Agendamento.objects.bulk_create([
+            Agendamento(cliente=self.cliente, tecnico=tecnico, descricao='Preventiva',
+                        data_agendamento=self.dia.replace(day=1) + timedelta(days=n % 28), hora_agendamento=time(8 + n % 9))
+            for n, tecnico in enumerate(tecnicos * 4)
+        ])
+        referencias.invalidar('tecnicos')
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url, {'visao': 'mes'})
+        self.assertEqual(len([c for c in consultas.captured_queries if 'inventario_agendamento' in c['sql']]), 1)
+        self.assertEqual(len(resposta.context['linhas']), 51)
+        self.assertEqual(sum(len(celula) for linha in resposta.context['linhas'] for celula in linha['dias']), 201)
+
+
+class EscalonamentoTests(TestCase):
+    def assertSemSobreposicao(self, visitas, escala):
+        por_tecnico = {}
+        for visita in visitas:
+            if visita.pk in escala.atribuicoes:
+                por_tecnico.setdefault(escala.atribuicoes[visita.pk], []).append((visita.inicio, visita.fim))
+        for intervalos in por_tecnico.values():
+            intervalos.sort()
+            for (_, fim), (inicio, _) in zip(intervalos, intervalos[1:]):
+                self.assertLessEqual(fim, inicio)
+
+    def test_agrupa_por_regiao_e_equilibra(self):
+        Visita = escalonamento.Visita
+        visitas = [
+            Visita(1, 8 * 60, 9 * 60, 'Castro', 'Centro', None),
+            Visita(2, 10 * 60, 11 * 60, 'castro', ' centro', None),
+            Visita(3, 8 * 60, 9 * 60, 'Curitiba', 'Batel', None),
+            Visita(4, 10 * 60, 11 * 60, 'Curitiba', 'Batel', None),
+            Visita(5, 8 * 60 + 30, 9 * 60, 'Curitiba', 'Portão', None),
+        ]
+        escala = escalonamento.escalonar(visitas, [10, 20, 30])
+        self.assertEqual(escala.atribuicoes[1], escala.atribuicoes[2])
+        self.assertEqual(escala.atribuicoes[3], escala.atribuicoes[4])
+        self.assertNotEqual(escala.atribuicoes[1], escala.atribuicoes[3])
+        self.assertEqual(sorted(escala.carga.values()), [30, 120, 120])
+        # Um técnico só: as visitas sobrepostas ficam sem técnico.
+        escala = escalonamento.escalonar(visitas, [10])
+        self.assertEqual(sorted(escala.sem_tecnico), [3, 4, 5])
+        self.assertSemSobreposicao(visitas, escala)
+
+    def test_centenas_de_visitas(self):
+        aleatorio = random.Random(7)
+        visitas = []
+        for pk in range(200):
+            inicio = aleatorio.randrange(8 * 60, 18 * 60, 30)
+            visitas.append(escalonamento.Visita(pk, inicio, inicio + aleatorio.choice([30, 60, 90]),
+                                                'Ponta Grossa', aleatorio.choice(['Centro', 'Uvaranas', 'Oficinas']), None))
+        inicio = time_module.perf_counter()
+        escala = escalonamento.escalonar(visitas, list(range(30)))
+        self.assertLess(time_module.perf_counter() - inicio, 1)
+        self.assertFalse(escala.sem_tecnico)
+        self.assertSemSobreposicao(visitas, escala)
+        # Ninguém passa da meta (média de minutos por técnico) mais que uma visita.
+        meta = sum(visita.fim - visita.inicio for visita in visitas) / 30
+        self.assertLessEqual(max(escala.carga.values()), meta + 90)
+
+    def test_view_e_comando_gravam_a_escala(self):
+        usuario = User.objects.create_user('despacho', password='senha-de-teste')
+        ana, bruno = Tecnico.objects.create(nome='Ana'), Tecnico.objects.create(nome='Bruno')
+        dia = timezone.localdate() + timedelta(days=1)
+        for n, bairro in enumerate(['Centro', 'Centro', 'Batel']):
+            cliente = Cliente.objects.create(razao_social=f'Cliente {n}', cnpj=f'00.000.000/000{n}-00',
+                                             cidade='Curitiba', bairro=bairro)
+            Agendamento.objects.create(cliente=cliente, descricao='Visita', data_agendamento=dia,
+                                       hora_agendamento=time(9 + 2 * n), tecnico=ana if n == 2 else None)
+
+        self.client.force_login(usuario)
+        resposta = self.client.get(reverse('escalonar_agendamentos'), {'data': dia.isoformat()})
+        self.assertEqual(resposta.context['alteracoes'], 2)
+        self.client.post(reverse('escalonar_agendamentos'), {'data': dia.isoformat(), 'tecnicos': [ana.pk, bruno.pk]})
+        self.assertFalse(Agendamento.objects.filter(tecnico__isnull=True).exists())
+        self.assertEqual(Agendamento.objects.filter(tecnico=ana).count(), 2)
+
+        saida = StringIO()
+        call_command('escalonar_agendamentos', '--dia', dia.isoformat(), '--tecnicos', str(bruno.pk),
+                     '--reatribuir', '--aplicar', stdout=saida)
+        self.assertIn('2 agendamento(s) atualizado(s)', saida.getvalue())
+        self.assertEqual(Agendamento.objects.filter(tecnico=bruno).count(), 3)
+
+        # Técnicos que não existem mais: erro, sem distribuir entre todos nem gravar.
+        url = reverse('escalonar_agendamentos')
+        resposta = self.client.get(url, {'data': dia.isoformat(), 'tecnicos': 9999})
+        self.assertRedirects(resposta, f"{url}?data={dia.isoformat()}")
+        resposta = self.client.post(url, {'data': dia.isoformat(), 'tecnicos': 9999, 'reatribuir': '1'}, follow=True)
+        self.assertContains(resposta, 'Técnico(s) inexistente(s): 9999.')
+        self.assertEqual(Agendamento.objects.filter(tecnico=bruno).count(), 3)
+
+
+class ListagemTransacoesTests(EstoqueTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+        inicio = timezone.now() - timedelta(days=1)
+        Transacao.objects.bulk_create([
+            # Várias transações no mesmo instante: o desempate é pelo id.
+            Transacao(tipo_transacao=self.entrada, usuario=self.usuario, produto=self.produto,
+                      data=inicio + timedelta(minutes=i // 3), quantidade=i + 1)
+            for i in range(40)
+        ])
+
+    def test_cursor_percorre_o_historico_sem_repetir_nem_pular(self):
+        quantidades, params = [], {}
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('listar_transacao'))
+        self.assertFalse(any('COUNT(' in q['sql'].upper() for q in consultas.captured_queries))
+        while True:
+            pagina = self.client.get(reverse('listar_transacao'), params).context['page_obj']
+            quantidades += [t.quantidade for t in pagina]
+            if not pagina.has_next():
+                break
+            params = {'cursor': pagina.next_cursor}
+        self.assertEqual(quantidades, list(range(40, 0, -1)))
+
+    def test_contagem_exata_sob_demanda_e_respeita_filtro(self):
+        resposta = self.client.get(reverse('listar_transacao'), {'tipo': self.saida.pk, 'contar': 1})
+        self.assertEqual(resposta.context['total'], 0)
+        self.assertContains(resposta, 'Nenhuma transação encontrada')
+
+
+class ReferenciasTests(EstoqueTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        self.client.force_login(self.usuario)
+
+    def test_listas_de_referencia_vem_do_cache_na_segunda_requisicao(self):
+        self.client.get(reverse('listar_transacao'))
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse('listar_transacao'))
+        self.assertFalse(any('FROM "inventario_tipotransacao"' in q['sql'] for q in consultas.captured_queries))
+        self.assertEqual([t.nome for t in resposta.context['tipos_transacao']], ['Compra', 'Venda'])
+
+    def test_salvar_invalida_a_lista(self):
+        self.assertEqual(referencias.categorias(), [])
+        categoria = Categoria.objects.create(nome='Redes')
+        self.assertEqual(referencias.categorias(), [categoria])
+        categoria.delete()
+        self.assertEqual(referencias.categorias(), [])
+
+    def test_formulario_valida_pela_lista_em_cache(self):
+        categoria = Categoria.objects.create(nome='Redes')
+        referencias.categorias()
+        with self.assertNumQueries(0):
+            self.assertIn('Redes', str(ProdutoForm()['categoria']))
+        form = ProdutoForm({'nome': 'Switch', 'categoria': categoria.pk})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['categoria'], categoria)
+        self.assertFalse(ProdutoForm({'nome': 'Switch', 'categoria': categoria.pk + 100}).is_valid())
+
+
+class AutocompletarTests(EstoqueTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        self.client.force_login(self.usuario)
+        Produto.objects.bulk_create([Produto(nome=f'Cabo USB {i:02d}') for i in range(30)])
+        self.inativo = Produto.objects.create(nome='Cabo Serial', ativo=INATIVO)
+
+    def opcoes(self, tabela, **params):
+        return self.client.get(reverse('autocompletar', args=[tabela]), params).json()['resultados']
+
+    def test_busca_por_prefixo_com_limite_e_sem_inativos(self):
+        resultados = self.opcoes('produtos', q='cabo')
+        self.assertEqual(len(resultados), autocompletar.LIMITE)
+        self.assertTrue(all(r['texto'].startswith('Cabo ') for r in resultados))
+        self.assertNotIn(self.inativo.pk, [r['id'] for r in self.opcoes('produtos', q='cabo s')])
+        self.assertEqual(self.opcoes('produtos', q='cabo s', todos=1),
+                         [{'id': self.inativo.pk, 'texto': 'Cabo Serial (inativo)'}])
+        self.assertEqual(self.opcoes('produtos', q='rede'), [])
+
+    def test_busca_repetida_vem_do_cache(self):
+        self.opcoes('produtos', q='Cabo U')
+        with CaptureQueriesContext(connection) as consultas:
+            self.opcoes('produtos', q='cabo u')
+        self.assertFalse(any('FROM "inventario_produto"' in q['sql'] for q in consultas.captured_queries))
+
+    def test_formulario_traz_so_o_produto_escolhido(self):
+        html = str(TransacaoForm({'produto': self.produto.pk}, user=self.usuario)['produto'])
+        self.assertIn('Cabo de Rede', html)
+        self.assertNotIn('Cabo USB', html)
+        self.assertIn(reverse('autocompletar', args=['produtos']), html)
+        form = TransacaoForm({'produto': self.inativo.pk, 'tipo_transacao': self.entrada.pk, 'quantidade': 1,
+                              'lote': 'L1'}, user=self.usuario)
+        self.assertIn('produto', form.errors)
+
+
+@skipUnless(connection.vendor == 'sqlite', "O otimizador do MySQL varre tabelas pequenas; no SQLite o plano depende só do esquema.")
+class IndicesTests(EstoqueTestMixin, TestCase):
+    """Confere com EXPLAIN QUERY PLAN que as consultas das telas mais usadas não varrem as tabelas grandes."""
+    TABELAS = ('inventario_transacao', 'inventario_loteestoque', 'inventario_produto', 'inventario_cliente',
+               'inventario_agendamento', 'inventario_ordemdeservico')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+        self.registrar(self.entrada, 5, lote='L1')
+        self.cliente = Cliente.objects.create(razao_social='Mercado Silva', cnpj='12.345.678/0001-90')
+
+    def assertSemVarredura(self, consultas):
+        varredura = re.compile(rf"^SCAN (TABLE )?({'|'.join(self.TABELAS)})\b(?! USING)")
+        verificadas = 0
+        for consulta in consultas.captured_queries:
+            sql = consulta['sql']
+            if not sql.startswith('SELECT') or not any(f'"{tabela}"' in sql for tabela in self.TABELAS):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plano = [linha[-1] for linha in cursor.fetchall()]
+            for detalhe in plano:
+                self.assertNotRegex(detalhe, varredura, sql)
+                self.assertNotIn('TEMP B-TREE FOR ORDER BY', detalhe, sql)
+            verificadas += 1
+        self.assertTrue(verificadas)
+
+    def test_telas_usam_indices(self):
+        telas = [
+            (reverse('listar_transacao'), {}),
+            (reverse('listar_transacao'), {'produto': self.produto.pk}),
+            (reverse('listar_transacao'), {'tipo': self.saida.pk}),
+            (reverse('listar_produtos'), {}),
+            (reverse('listar_clientes'), {}),
+            (reverse('listar_agendamentos'), {}),
+            (reverse('agenda_tecnicos'), {'visao': 'mes'}),
+            (reverse('detalhe_cliente', args=[self.cliente.pk]), {}),
+            (reverse('analise_os'), {'meses': 2}),
+        ]
+        for url, params in telas:
+            with self.subTest(url=url, params=params), CaptureQueriesContext(connection) as consultas:
+                self.client.get(url, params)
+            self.assertSemVarredura(consultas)
+
+    def test_saida_fifo_relatorio_e_agenda_do_cliente_usam_indices(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.registrar(self.saida, 2)
+            agora = timezone.now()
+            list(Transacao.objects.filter(data__gte=agora - timedelta(days=30), data__lt=agora))
+            list(Agendamento.objects.filter(cliente=self.cliente).order_by('-data_agendamento'))
+            # Contagens do painel (o estoque soma o catálogo, que é pequeno).
+            list(OrdemDeServico.objects.filter(status__in=indicadores.STATUS_EM_ABERTO)
+                 .values('status').annotate(total=Count('pk')).order_by())
+            Agendamento.objects.filter(data_agendamento=agora.date()).count()
+            agenda.conflitos(Agendamento(tecnico=Tecnico.objects.create(nome='Ana'), data_agendamento=agora.date(),
+                                         hora_agendamento=time(9)))
+        self.assertSemVarredura(consultas)
+
+
+@override_settings(MEDIR_DESEMPENHO=True, MEDIR_DESEMPENHO_LENTO_MS=None)
+class MetricasDesempenhoTests(EstoqueTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        metricas.registro.limpar()
+        self.client.force_login(self.usuario)
+
+    @override_settings(MEDIR_DESEMPENHO_LENTO_MS=0)
+    def test_registra_consultas_e_tempos_por_rota(self):
+        with self.assertLogs('inventario.desempenho', 'WARNING') as logs:
+            self.client.get(reverse('listar_produtos'))
+            self.client.get(reverse('listar_produtos'))
+            rota = self.client.get(reverse('metricas_desempenho')).json()['rotas']['listar_produtos']
+        self.assertIn('listar_produtos', logs.output[0])
+
+        self.assertEqual(rota['requisicoes'], 2)
+        self.assertGreater(rota['consultas']['media'], 0)
+        self.assertGreater(rota['template_ms']['maximo'], 0)
+
+    def test_endpoint_restrito_a_staff(self):
+        comum = User.objects.create_user('visitante', password='senha-de-teste')
+        self.client.force_login(comum)
+        self.assertEqual(self.client.get(reverse('metricas_desempenho')).status_code, 302)
+
+    def test_histograma_estima_percentis_pelas_faixas(self):
+        histograma = metricas.Histograma((10, 100))
+        for valor in (1, 2, 3, 50, 500):
+            histograma.registrar(valor)
+        self.assertEqual(histograma.percentil(50), 10)
+        self.assertEqual(histograma.percentil(80), 100)
+        self.assertEqual(histograma.percentil(100), 500)
+
+
+class BenchmarkTests(TestCase):
+    def test_dados_sinteticos_consistentes_e_benchmark_em_json(self):
+        call_command('gerar_dados', '--escala', '0.01', '--forcar', stdout=StringIO())
+        self.assertEqual(Transacao.objects.count(), 200)
+        self.assertEqual(MovimentacaoLote.objects.count(), 200)
+        call_command('reconciliar_estoque', '--verificar', stdout=StringIO())
+        self.assertEqual(ResumoMensalMovimento.objects.aggregate(total=Sum('transacoes'))['total'], 200)
+
+        with tempfile.TemporaryDirectory() as pasta:
+            saida = os.path.join(pasta, 'benchmark.json')
+            call_command('benchmark', '--repeticoes', '1', '--saida', saida, stdout=StringIO())
+            with open(saida, encoding='utf-8') as arquivo:
+                resultado = json.load(arquivo)
+        self.assertIn('listar_transacao', resultado['resultados'])
+        self.assertIn('escalonamento (500 visitas sintéticas)', resultado['resultados'])
+        self.assertGreater(resultado['resultados']['criar_transacao (saída)']['consultas'], 0)
+        # O que as views gravaram durante o benchmark foi desfeito.
+        self.assertEqual(Transacao.objects.count(), 200)
+
+
+class GraficosTests(TestCase):
+    dados = [{'produto__nome': 'Cabo de Rede', 'total_quantidade': 7}, {'produto__nome': 'Mouse', 'total_quantidade': 3}]
+
+    def setUp(self):
+        graficos.cache.limpar()
+
+    def test_mesmos_dados_reutilizam_a_imagem_do_cache(self):
+        png = graficos.grafico_pizza(self.dados, 'Entradas', 'png')
+        self.assertTrue(png.startswith(b'\x89PNG'))
+        self.assertIs(graficos.grafico_pizza(list(self.dados), 'Entradas', 'png'), png)
+        self.assertEqual(len(graficos.cache), 1)
+
+        graficos.grafico_pizza(self.dados, 'Saídas', 'png')
+        self.assertEqual(len(graficos.cache), 2)
+
+    def test_saida_svg_em_data_uri(self):
+        uri = graficos.grafico_pizza_data_uri(self.dados, 'Entradas', 'svg')
+        self.assertTrue(uri.startswith('data:image/svg+xml;base64,'))
+        self.assertIsNone(graficos.grafico_pizza_data_uri([], 'Vazio', 'svg'))
+
+
+class TempoDeImportacaoTests(TestCase):
+    # Orçamento folgado para a importação do URLconf (todas as views). Com o
+    # matplotlib e o xhtml2pdf carregados no import, passava de 1,5 s.
+    ORCAMENTO_MS = 500
+    MODULOS_PESADOS = ('matplotlib', 'xhtml2pdf', 'reportlab', 'openpyxl', 'numpy')
+
+    def test_urlconf_nao_carrega_bibliotecas_de_relatorio(self):
+        codigo = (
+            "import django, sys; django.setup(); import controle_estoque.urls; "
+            f"print(','.join(m for m in {self.MODULOS_PESADOS!r} if m in sys.modules))"
+        )
+        processo = subprocess.run([sys.executable, '-X', 'importtime', '-c', codigo], cwd=settings.BASE_DIR,
+                                  capture_output=True, text=True, check=True)
+        self.assertEqual(processo.stdout.strip(), '')
+
+        # Formato do -X importtime: "import time: próprio | acumulado | módulo", em microssegundos.
+        acumulado = next(int(linha.split('|')[1]) for linha in processo.stderr.splitlines()
+                         if linha.split('|')[-1].strip() == 'controle_estoque.urls')
+        self.assertLess(acumulado / 1000, self.ORCAMENTO_MS)
+
+
+class ImportacaoTransacoesTests(EstoqueTestMixin, TestCase):
+    def importar(self, texto):
+        return importacao.importar_csv(StringIO(texto), self.usuario, 'entrega.csv')
+
+    def test_importa_entradas_e_saidas_no_livro_de_lotes(self):
+        self.registrar(self.entrada, 5, lote='ANTIGO')
+        resultado = self.importar(
+            "produto;tipo;quantidade;lote;observacoes\n"
+            f"Cabo de Rede;Compra;10;NF-1;Entrega\n"
+            f"{self.produto.pk};Venda;8;;\n"
+            f"Cabo de Rede;{self.saida.pk};4;;\n"
+        )
+        self.assertEqual(resultado.erros, [])
+        self.assertEqual(resultado.importacao.transacoes.count(), 3)
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.estoque_total, 3)
+        # FIFO: a primeira saída esgota o lote antigo antes de usar o novo.
+        self.assertEqual(dict(LoteEstoque.objects.values_list('lote', 'quantidade')), {'ANTIGO': 0, 'NF-1': 3})
+        venda = resultado.importacao.transacoes.get(quantidade=8)
+        self.assertEqual(sorted(venda.movimentacoes.values_list('lote_estoque__lote', 'quantidade')),
+                         [('ANTIGO', 5), ('NF-1', 3)])
+        self.assertEqual(resumo_mensal.total_de_transacoes(timezone.localtime().year, timezone.localtime().month), 4)
+
+    def test_erros_por_linha_e_nada_gravado(self):
+        resultado = self.importar(
+            "produto,tipo,quantidade,lote\n"
+            "Cabo de Rede,Compra,10,L1\n"
+            "Produto Fantasma,Compra,1,L1\n"
+            "Cabo de Rede,Compra,0,\n"
+        )
+        self.assertEqual([erro.linha for erro in resultado.erros], [3, 4])
+        self.assertIn("Informe o lote", resultado.erros[1].mensagem)
+
+        resultado = self.importar("produto;tipo;quantidade\nCabo de Rede;Compra;2;\nCabo de Rede;Venda;3\n")
+        self.assertEqual(resultado.erros[0].linha, 2)  # entrada sem lote
+
+        resultado = self.importar("produto;tipo;quantidade;lote\nCabo de Rede;Compra;2;L1\nCabo de Rede;Venda;3;\n")
+        self.assertEqual([erro.linha for erro in resultado.erros], [3])
+        self.assertIn("Estoque insuficiente", resultado.erros[0].mensagem)
+        self.assertFalse(Transacao.objects.exists())
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.estoque_total, 0)
+
+    def test_upload_pela_tela_e_comando(self):
+        self.client.force_login(self.usuario)
+        arquivo = SimpleUploadedFile('entrega.csv', '\ufeffproduto;tipo;quantidade;lote\nCabo de Rede;Compra;7;L1\n'.encode('utf-8'))
+        resposta = self.client.post(reverse('importar_transacoes'), {'arquivo': arquivo})
+        self.assertRedirects(resposta, reverse('listar_transacao'))
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as arquivo:
+            arquivo.write('produto;tipo;quantidade\nCabo de Rede;Venda;2\n')
+        self.addCleanup(os.remove, arquivo.name)
+        call_command('import_transacoes', arquivo.name, '--usuario', self.usuario.username, stdout=StringIO())
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.estoque_total, 5)
+
+
+class DocumentoTransacaoTests(EstoqueTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+        self.outro = Produto.objects.create(nome='Conector RJ45')
+
+    def enviar(self, tipo, itens):
+        dados = {'tipo_transacao': tipo.pk, 'numero': 'NF-123', 'form-TOTAL_FORMS': len(itens) + 1,
+                 'form-INITIAL_FORMS': 0}
+        for i, (produto, quantidade, lote) in enumerate(itens):
+            dados.update({f'form-{i}-produto': produto.pk, f'form-{i}-quantidade': quantidade, f'form-{i}-lote': lote})
+        return self.client.post(reverse('criar_documento'), dados)
+
+    def test_documento_grava_todas_as_linhas_de_uma_vez(self):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.enviar(self.entrada, [(self.produto, 10, 'L1'), (self.outro, 5, 'L2'), (self.produto, 2, 'L3')])
+        inserts = [q for q in consultas.captured_queries if q['sql'].startswith('INSERT INTO "inventario_transacao"')]
+        self.assertEqual(len(inserts), 1)
+        documento = DocumentoTransacao.objects.get()
+        self.assertRedirects(resposta, reverse('detalhe_documento', args=[documento.pk]))
+        self.assertEqual(documento.itens.count(), 3)
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.estoque_total, 12)
+
+        resposta = self.enviar(self.saida, [(self.produto, 7, ''), (self.outro, 5, '')])
+        self.assertEqual(resposta.status_code, 302)
+        self.assertEqual(dict(Produto.objects.values_list('nome', 'estoque_total')), {'Cabo de Rede': 5, 'Conector RJ45': 0})
+
+    def test_saldo_conferido_pelo_total_de_cada_produto(self):
+        self.registrar(self.entrada, 5, lote='L1')
+        # Cada linha cabe no saldo, mas a soma das duas não.
+        resposta = self.enviar(self.saida, [(self.produto, 3, ''), (self.produto, 3, '')])
+        self.assertContains(resposta, 'Estoque insuficiente')
+        self.assertFalse(DocumentoTransacao.objects.exists())
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.estoque_total, 5)
+
+    def test_formulario_nao_carrega_o_catalogo(self):
+        # Os produtos vêm do autocompletar; a página vazia não consulta a tabela.
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('criar_documento'))
+        produtos = [q for q in consultas.captured_queries if 'FROM "inventario_produto"' in q['sql']]
+        self.assertEqual(len(produtos), 0)
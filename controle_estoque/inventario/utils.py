@@ -1,13 +1,28 @@
 from io import BytesIO
 from django.http import HttpResponse
 from django.template.loader import get_template
-from xhtml2pdf import pisa
 import os
 from django.conf import settings
 
 def render_to_pdf(template_src, context_dict={}):
-    template = get_template(template_src)
-    html = template.render(context_dict)
+    pdf = render_to_pdf_bytes(template_src, context_dict)
+    if pdf is not None:
+        return HttpResponse(pdf, content_type='application/pdf')
+    return None
+
+def render_to_pdf_bytes(template_src, context_dict={}):
+    """Same as render_to_pdf, but returns the raw PDF bytes (or None on error)."""
+    return html_to_pdf_bytes(get_template(template_src).render(context_dict))
+
+def html_to_pdf_bytes(html):
+    """Converts already rendered HTML to PDF bytes (or None on error).
+
+    Top-level and database-free, so it can run in a worker process
+    (relatorios.converter_em_paralelo)."""
+    # Imported on first use: xhtml2pdf (and reportlab) are slow to load and
+    # only the report worker needs them.
+    from xhtml2pdf import pisa
+
     result = BytesIO()
     
     # Set encoding to handle Portuguese characters
@@ -16,7 +31,7 @@ def render_to_pdf(template_src, context_dict={}):
                            link_callback=link_callback)
     
     if not pdf.err:
-        return HttpResponse(result.getvalue(), content_type='application/pdf')
+        return result.getvalue()
     return None
 
 def link_callback(uri, rel):
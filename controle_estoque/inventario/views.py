@@ -1,8 +1,10 @@
-import calendar
-from datetime import datetime
+import io
+from datetime import date
+
 from django.db import IntegrityError
 from django.forms import ValidationError
-from django.http import HttpResponse, HttpResponseForbidden
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.urls import reverse
 from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import AuthenticationForm, PasswordResetForm
@@ -18,47 +20,19 @@ from django.template.loader import render_to_string
 from django.core.mail import send_mail
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
-from .forms import CadastroUsuarioForm, CategoriaForm, DateFilterForm, ProdutoForm, TransacaoForm
-from .models import Produto, Categoria, TipoTransacao, Transacao, Item
+from .forms import (CadastroUsuarioForm, CategoriaForm, DateFilterForm, DocumentoTransacaoForm, ImportacaoTransacaoForm,
+                    ItensDocumentoFormSet, ProdutoForm, TransacaoForm)
+from .models import Produto, Categoria, Transacao, DocumentoTransacao, LoteEstoque, TarefaRelatorio
 from django.conf import settings
 from django.db.models.deletion import ProtectedError
-from django.db.models import Sum
-from .utils import render_to_pdf
+from . import alertas, autocompletar, estoque, exportacao, importacao, indicadores, metricas, paginacao, posicao_estoque, referencias, relatorios
 from django.utils import timezone
 
-# IMPORTAÇÕES PARA GERAR GRÁFICOS
-import matplotlib
-matplotlib.use('Agg')  # Configura o Matplotlib para não usar interface gráfica
-import matplotlib.pyplot as plt
-import io
-import base64
 from django.db.models.functions import Coalesce
 
-
-# FUNÇÃO AUXILIAR PARA CRIAR GRÁFICOS DE PIZZA
-def generate_pie_chart_image(data, title):
-    """Gera um gráfico de pizza como uma imagem base64."""
-    if not data:
-        return None
-
-    labels = [item['produto__nome'] for item in data]
-    sizes = [item['total_quantidade'] for item in data]
-
-    fig, ax = plt.subplots(figsize=(6, 4)) # Tamanho ajustado para PDF
-    ax.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90, textprops={'fontsize': 8})
-    ax.axis('equal')  # Garante que o gráfico seja um círculo.
-    
-    plt.title(title, fontsize=12)
-    
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight')
-    plt.close(fig)
-    
-    image_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
-    buf.close()
-    
-    return f"data:image/png;base64,{image_base64}"
-
+TRANSACOES_POR_PAGINA = 15
+# Erros de importação exibidos na tela (o arquivo pode ter milhares de linhas inválidas).
+ERROS_IMPORTACAO_EXIBIDOS = 200
 
 def staff_required(view_func):
     def _wrapped_view(request, *args, **kwargs):
@@ -70,7 +44,13 @@ def staff_required(view_func):
 
 @login_required
 def navegacao_view(request):
-    return render(request, 'navegacao/navegacao.html')
+    # Só os alertas abertos (índice por data_resolucao): não percorre o catálogo.
+    abertos = alertas.abertos()
+    return render(request, 'navegacao/navegacao.html', {
+        'alertas': abertos[:10],
+        'total_alertas': abertos.count(),
+        'indicadores': indicadores.obter(),
+    })
 
 def root_redirect(request):
     if request.user.is_authenticated:
@@ -228,7 +208,7 @@ def listar_produtos(request):
     
     paginator = Paginator(produtos, 10)
     page_obj = paginator.get_page(request.GET.get('page'))
-    return render(request, 'produto/listar.html', {'page_obj': page_obj, 'categorias': Categoria.objects.all()})
+    return render(request, 'produto/listar.html', {'page_obj': page_obj, 'categorias': referencias.categorias()})
 
 @login_required
 @staff_required
@@ -267,7 +247,7 @@ def excluir_produto(request, pk):
     produto = get_object_or_404(Produto, pk=pk)
     if request.method == 'POST':
         nome_produto = produto.nome
-        if Item.objects.filter(produto=produto, disponivel=True).exists():
+        if produto.estoque_total > 0:
             messages.warning(request, f'Produto "{nome_produto}" possui estoque e não pode ser excluído.')
         elif Transacao.objects.filter(produto=produto).exists():
             produto.ativo = 1
@@ -279,17 +259,69 @@ def excluir_produto(request, pk):
         return redirect('listar_produtos')
     return render(request, 'produto/confirmar_exclusao.html', {'produto': produto})
 
+def filtrar_transacoes(params):
+    """Transações filtradas como na listagem (produto e tipo); usado também pela exportação."""
+    transacoes = Transacao.objects.all()
+    if params.get('produto'):
+        transacoes = transacoes.filter(produto_id=params['produto'])
+    if params.get('tipo'):
+        transacoes = transacoes.filter(tipo_transacao_id=params['tipo'])
+    return transacoes
+
 @login_required
 def listar_transacao(request):
-    transacoes = Transacao.objects.select_related('tipo_transacao', 'usuario', 'produto').order_by('-data')
-    if 'produto' in request.GET and request.GET['produto']:
-        transacoes = transacoes.filter(produto_id=request.GET['produto'])
-    if 'tipo' in request.GET and request.GET['tipo']:
-        transacoes = transacoes.filter(tipo_transacao_id=request.GET['tipo'])
-    
-    paginator = Paginator(transacoes, 15)
-    page_obj = paginator.get_page(request.GET.get('page'))
-    return render(request, 'transacao/listar.html', {'page_obj': page_obj, 'produtos': Produto.objects.all(), 'tipos_transacao': TipoTransacao.objects.all()})
+    transacoes = filtrar_transacoes(request.GET)
+    page_obj = paginacao.paginar_por_cursor(
+        transacoes.select_related('tipo_transacao', 'usuario', 'produto'),
+        ['-data', '-pk'], request.GET.get('cursor'), tamanho=TRANSACOES_POR_PAGINA,
+    )
+    # COUNT(*) exato só quando pedido; sem filtros, usa a estimativa do banco.
+    if request.GET.get('contar'):
+        total, total_exato = transacoes.count(), True
+    else:
+        total, total_exato = paginacao.estimar_total(transacoes), False
+    # O filtro de produto é um autocompletar: só o produto escolhido vai para a página.
+    produto = request.GET.get('produto', '')
+    produto_filtro = Produto.objects.filter(pk=produto).only('nome').first() if produto.isdigit() else None
+    return render(request, 'transacao/listar.html', {
+        'page_obj': page_obj, 'total': total, 'total_exato': total_exato,
+        'produto_filtro': produto_filtro, 'tipos_transacao': referencias.tipos_transacao(),
+    })
+
+@login_required
+def exportar_transacoes(request):
+    linhas = exportacao.linhas_por_pk(
+        filtrar_transacoes(request.GET),
+        ['data', 'tipo_transacao__nome', 'tipo_transacao__entrada', 'produto__nome', 'quantidade', 'usuario__username', 'observacoes'],
+    )
+    linhas = ((data, tipo, 'Entrada' if entrada else 'Saída', produto, quantidade, usuario, observacoes)
+              for data, tipo, entrada, produto, quantidade, usuario, observacoes in linhas)
+    cabecalho = ['Data/Hora', 'Tipo', 'Sentido', 'Produto', 'Quantidade', 'Usuário', 'Observações']
+    return exportacao.exportar(request.GET.get('formato'), 'transacoes', cabecalho, linhas)
+
+@login_required
+def exportar_estoque(request):
+    lotes = LoteEstoque.objects.all()
+    if request.GET.get('produto'):
+        lotes = lotes.filter(produto_id=request.GET['produto'])
+    if request.GET.get('categoria'):
+        lotes = lotes.filter(produto__categoria_id=request.GET['categoria'])
+    campos = ['produto__nome', 'produto__categoria__nome', 'lote', 'quantidade', 'data_criacao']
+    cabecalho = ['Produto', 'Categoria', 'Lote', 'Quantidade', 'Data de Entrada']
+    if not request.GET.get('data'):
+        linhas = exportacao.linhas_por_pk(lotes.filter(quantidade__gt=0), campos)
+        return exportacao.exportar(request.GET.get('formato'), 'estoque_por_lote', cabecalho, linhas)
+
+    # Posição no fim do dia informado (ex.: fechamento do mês), a partir do último snapshot.
+    try:
+        dia = date.fromisoformat(request.GET['data'])
+    except ValueError:
+        return HttpResponseBadRequest("Data inválida; use AAAA-MM-DD.")
+    saldos = posicao_estoque.saldos_lotes_em(posicao_estoque.fim_do_dia(dia))
+    linhas = ((nome, categoria, lote, saldos[pk], entrada)
+              for pk, nome, categoria, lote, _, entrada in exportacao.linhas_por_pk(lotes, ['pk'] + campos)
+              if saldos.get(pk))
+    return exportacao.exportar(request.GET.get('formato'), f'estoque_por_lote_{dia:%Y%m%d}', cabecalho, linhas)
 
 @login_required
 @staff_required
@@ -297,13 +329,70 @@ def criar_transacao(request):
     if request.method == 'POST':
         form = TransacaoForm(request.POST, user=request.user)
         if form.is_valid():
-            form.save()
-            messages.success(request, "Transação registrada com sucesso!")
-            return redirect('listar_produtos')
+            try:
+                form.save()
+            except ValidationError as e:
+                form.add_error(None, e)
+            else:
+                messages.success(request, "Transação registrada com sucesso!")
+                return redirect('listar_produtos')
     else:
         form = TransacaoForm(user=request.user)
     return render(request, 'transacao/form.html', {'form': form})
 
+@login_required
+@staff_required
+def criar_documento(request):
+    if request.method == 'POST':
+        form = DocumentoTransacaoForm(request.POST)
+        # O formset precisa do tipo para validar lotes (entrada) ou saldo (saída).
+        tipo = form.cleaned_data['tipo_transacao'] if form.is_valid() else None
+        formset = ItensDocumentoFormSet(request.POST, tipo_transacao=tipo)
+        if form.is_valid() and formset.is_valid():
+            documento = form.save(commit=False)
+            documento.usuario = request.user
+            try:
+                estoque.registrar_documento(documento, formset.itens())
+            except ValidationError as e:
+                form.add_error(None, e)
+            else:
+                messages.success(request, f"Documento registrado com {len(formset.itens())} item(ns)!")
+                return redirect('detalhe_documento', pk=documento.pk)
+    else:
+        form = DocumentoTransacaoForm()
+        formset = ItensDocumentoFormSet()
+    return render(request, 'transacao/documento_form.html', {'form': form, 'formset': formset})
+
+@login_required
+def detalhe_documento(request, pk):
+    documento = get_object_or_404(DocumentoTransacao.objects.select_related('tipo_transacao', 'usuario'), pk=pk)
+    itens = documento.itens.select_related('produto').order_by('pk')
+    return render(request, 'transacao/documento_detalhe.html', {'documento': documento, 'itens': itens})
+
+@login_required
+@staff_required
+def importar_transacoes(request):
+    erros = []
+    if request.method == 'POST':
+        form = ImportacaoTransacaoForm(request.POST, request.FILES)
+        if form.is_valid():
+            arquivo = form.cleaned_data['arquivo']
+            texto = io.TextIOWrapper(arquivo.file, encoding='utf-8-sig', newline='')
+            try:
+                resultado = importacao.importar_csv(texto, request.user, arquivo.name)
+            except UnicodeDecodeError:
+                form.add_error('arquivo', "O arquivo deve estar codificado em UTF-8.")
+            else:
+                if resultado.importacao:
+                    messages.success(request, f"{resultado.linhas} transação(ões) importada(s) com sucesso!")
+                    return redirect('listar_transacao')
+                erros = resultado.erros
+    else:
+        form = ImportacaoTransacaoForm()
+    return render(request, 'transacao/importar.html', {
+        'form': form, 'erros': erros[:ERROS_IMPORTACAO_EXIBIDOS], 'total_erros': len(erros),
+    })
+
 @login_required
 def gerenciamento_usuario(request):
     if request.user.is_superuser:
@@ -348,55 +437,57 @@ def excluir_usuario(request, user_id):
             messages.error(request, f"Não é possível deletar {user_to_delete.username} devido a registros vinculados.")
     return redirect('gerenciamento_usuario')
 
+@login_required
 def transacao_pdf_view(request):
     if request.method == 'POST':
         form = DateFilterForm(request.POST)
         if form.is_valid():
             month = int(form.cleaned_data['month'])
             year = int(form.cleaned_data['year'])
-            
-            start_date = timezone.make_aware(datetime(year, month, 1))
-            _, last_day = calendar.monthrange(year, month)
-            end_date = timezone.make_aware(datetime(year, month, last_day, 23, 59, 59))
-            
-            transacoes = Transacao.objects.filter(data__range=(start_date, end_date)).order_by('data')
-            
-            entradas_data = list(transacoes.filter(tipo_transacao__entrada=True)
-                .values('produto__nome')
-                .annotate(total_quantidade=Sum('quantidade'))
-                .order_by('-total_quantidade'))
-
-            saidas_data = list(transacoes.filter(tipo_transacao__entrada=False)
-                .values('produto__nome')
-                .annotate(total_quantidade=Sum('quantidade'))
-                .order_by('-total_quantidade'))
-
-            chart_entradas_b64 = generate_pie_chart_image(entradas_data, f"Entradas de Produtos - {month}/{year}")
-            chart_saidas_b64 = generate_pie_chart_image(saidas_data, f"Saídas de Produtos - {month}/{year}")
-            
-            total_entradas = sum(item['total_quantidade'] for item in entradas_data)
-            total_saidas = sum(item['total_quantidade'] for item in saidas_data)
-
-            month_name = calendar.month_name[month]
-            
-            context = {
-                'transacoes': transacoes,
-                'month_name': month_name,
-                'year': year,
-                'total_entradas': total_entradas,
-                'total_saidas': total_saidas,
-                'data_geracao': timezone.now(),
-                'chart_entradas_b64': chart_entradas_b64,
-                'chart_saidas_b64': chart_saidas_b64,
-            }
-            
-            pdf = render_to_pdf('pdf_template.html', context)
-            if pdf:
-                response = HttpResponse(pdf, content_type='application/pdf')
-                response['Content-Disposition'] = f'attachment; filename="relatorio_{month}_{year}.pdf"'
-                return response
-            return HttpResponse("Erro ao gerar o PDF.", status=500)
+            tarefa = relatorios.solicitar('transacoes_mensal', {'ano': year, 'mes': month}, usuario=request.user)
+            if tarefa.status == 'CONCLUIDA':
+                return redirect('baixar_relatorio', pk=tarefa.pk)
+            return redirect('acompanhar_relatorio', pk=tarefa.pk)
     else:
         form = DateFilterForm(initial={'month': timezone.now().month, 'year': timezone.now().year})
     
-    return render(request, 'relatorio/relatorio_form.html', {'form': form})
\ No newline at end of file
+    return render(request, 'relatorio/relatorio_form.html', {'form': form})
+
+@login_required
+def acompanhar_relatorio(request, pk):
+    tarefa = get_object_or_404(TarefaRelatorio.objects.defer('arquivo'), pk=pk)
+    return render(request, 'relatorio/tarefa.html', {'tarefa': tarefa})
+
+@login_required
+def status_relatorio(request, pk):
+    tarefa = get_object_or_404(TarefaRelatorio.objects.defer('arquivo'), pk=pk)
+    dados = {'status': tarefa.status, 'erro': tarefa.erro}
+    if tarefa.status == 'CONCLUIDA':
+        dados['download_url'] = reverse('baixar_relatorio', args=[tarefa.pk])
+    return JsonResponse(dados)
+
+@login_required
+def baixar_relatorio(request, pk):
+    tarefa = get_object_or_404(TarefaRelatorio, pk=pk)
+    if tarefa.status != 'CONCLUIDA':
+        return redirect('acompanhar_relatorio', pk=tarefa.pk)
+    return relatorios.resposta_pdf(tarefa)
+
+@login_required
+def autocompletar_opcoes(request, tabela):
+    """Opções em JSON para os campos de autocompletar (?q=prefixo; ?todos=1 inclui produtos inativos)."""
+    if tabela not in autocompletar.BUSCAS:
+        raise Http404
+    resultados = autocompletar.buscar(tabela, request.GET.get('q', ''), todos=request.GET.get('todos') == '1')
+    return JsonResponse({'resultados': resultados})
+
+@login_required
+@staff_required
+def metricas_desempenho(request):
+    """Histogramas de consultas e tempos por rota deste processo (POST zera os contadores)."""
+    if request.method == 'POST':
+        metricas.registro.limpar()
+    return JsonResponse({
+        'ativo': settings.MEDIR_DESEMPENHO,
+        'rotas': metricas.registro.resumo(),
+    }, json_dumps_params={'indent': 2})
@@ -1,50 +1,126 @@
+from datetime import date, timedelta
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
-from django.urls import reverse_lazy
+from django.db.models import Count, Q
+from django.http import Http404, JsonResponse
+from django.urls import reverse, reverse_lazy
 from django.utils import timezone
-from django.http import HttpResponse
 
-from .models import Cliente, Sistema, Tecnico, Agendamento, OrdemDeServico
+from .models import Cliente, Agendamento, OrdemDeServico
 from .forms import (ClienteForm, SistemaForm, TecnicoForm, AgendamentoForm, 
-                    FinalizarAgendamentoForm, OrdemDeServicoAberturaForm, OrdemDeServicoFechamentoForm)
-from .utils import render_to_pdf
+                    FinalizarAgendamentoForm, ImpressaoOrdensServicoForm, OrdemDeServicoAberturaForm,
+                    OrdemDeServicoFechamentoForm)
+from . import agenda, analise_os, escalonamento, exportacao, indicadores, referencias, relatorios
+from .paginacao import paginar_por_cursor
+
+CLIENTES_POR_PAGINA = 25
+HISTORICO_POR_PAGINA = 10
 
 # ==================================
 # Views para Clientes
 # ==================================
-@login_required
-def listar_clientes(request):
-    clientes = Cliente.objects.select_related('sistema').all()
-    sistemas = Sistema.objects.all()
-    busca = request.GET.get('busca')
-    sistema_id = request.GET.get('sistema')
+def filtrar_clientes(params):
+    """Clientes filtrados como na listagem (busca e sistema); usado também pela exportação."""
+    clientes = Cliente.objects.all()
+    busca = params.get('busca')
+    sistema_id = params.get('sistema')
 
     if busca:
-        clientes = clientes.filter(
-            Q(razao_social__icontains=busca) |
-            Q(fantasia__icontains=busca) |
-            Q(cnpj__icontains=busca)
-        )
+        clientes = clientes.buscar(busca)
     if sistema_id:
         clientes = clientes.filter(sistema_id=sistema_id)
+    return clientes
+
+@login_required
+def listar_clientes(request):
+    clientes = filtrar_clientes(request.GET).select_related('sistema')
+    sistemas = referencias.sistemas()
+    page_obj = paginar_por_cursor(clientes, ['razao_social', 'pk'], request.GET.get('cursor'), tamanho=CLIENTES_POR_PAGINA)
     
-    context = {'page_obj': clientes, 'sistemas': sistemas}
+    context = {'page_obj': page_obj, 'sistemas': sistemas}
     return render(request, 'cliente/listar_clientes.html', context)
 
+@login_required
+def exportar_clientes(request):
+    campos = ['razao_social', 'fantasia', 'cnpj', 'inscricao_estadual', 'tipo_contrato', 'contato', 'telefone',
+              'email', 'endereco', 'bairro', 'cidade', 'estado', 'cep', 'sistema__nome', 'data_cadastro']
+    cabecalho = ['Razão Social', 'Fantasia', 'CNPJ', 'Inscrição Estadual', 'Tipo de Contrato', 'Contato', 'Telefone',
+                 'Email', 'Endereço', 'Bairro', 'Cidade', 'UF', 'CEP', 'Sistema', 'Data de Cadastro']
+    tipos_contrato = dict(Cliente.TIPO_CONTRATO_CHOICES)
+    linhas = (linha[:4] + (tipos_contrato.get(linha[4], linha[4]),) + linha[5:]
+              for linha in exportacao.linhas_por_pk(filtrar_clientes(request.GET), campos))
+    return exportacao.exportar(request.GET.get('formato'), 'clientes', cabecalho, linhas)
+
 @login_required
 def detalhe_cliente(request, pk):
+    # Resumo + a primeira página de cada aba; o restante do histórico vem de
+    # historico_cliente sob demanda. O custo não cresce com a idade do cliente.
     cliente = get_object_or_404(Cliente, pk=pk)
-    agendamentos = Agendamento.objects.filter(cliente=cliente).order_by('-data_agendamento')
-    ordens_servico = OrdemDeServico.objects.filter(cliente=cliente)
+    resumo_os = OrdemDeServico.objects.filter(cliente=cliente).aggregate(
+        total=Count('pk'), em_aberto=Count('pk', filter=Q(status__in=indicadores.STATUS_EM_ABERTO)))
+    resumo_agendamentos = Agendamento.objects.filter(cliente=cliente).aggregate(
+        total=Count('pk'), pendentes=Count('pk', filter=Q(situacao='AGENDADO')))
     context = {
         'cliente': cliente,
-        'agendamentos': agendamentos,
-        'ordens_servico': ordens_servico,
+        'resumo_os': resumo_os,
+        'resumo_agendamentos': resumo_agendamentos,
+        'ordens_servico': _pagina_historico(cliente, 'os'),
+        'agendamentos': _pagina_historico(cliente, 'agendamentos'),
     }
     return render(request, 'cliente/detalhe_cliente.html', context)
 
+@login_required
+def historico_cliente(request, pk, aba):
+    """Próxima página de uma aba do histórico: linhas da tabela (HTML) ou, com ?formato=json, JSON."""
+    if aba not in HISTORICOS:
+        raise Http404
+    cliente = get_object_or_404(Cliente, pk=pk)
+    page_obj = _pagina_historico(cliente, aba, request.GET.get('cursor'))
+    if request.GET.get('formato') == 'json':
+        serializar = HISTORICOS[aba][3]
+        return JsonResponse({
+            'resultados': [serializar(objeto) for objeto in page_obj],
+            'proximo': page_obj.next_cursor if page_obj.has_next() else None,
+        })
+    return render(request, HISTORICOS[aba][2], {'cliente': cliente, 'page_obj': page_obj})
+
+def _pagina_historico(cliente, aba, cursor=None):
+    consulta, ordenacao, _, _ = HISTORICOS[aba]
+    return paginar_por_cursor(consulta(cliente), ordenacao, cursor, tamanho=HISTORICO_POR_PAGINA)
+
+def _ordem_em_json(os):
+    return {
+        'id': os.pk,
+        'data_abertura': os.data_abertura.isoformat(),
+        'tecnico': os.tecnico_responsavel.nome if os.tecnico_responsavel else None,
+        'status': os.status,
+        'status_display': os.get_status_display(),
+        'url': reverse('detalhe_os', args=[os.pk]),
+    }
+
+def _agendamento_em_json(agendamento):
+    return {
+        'id': agendamento.pk,
+        'data_agendamento': agendamento.data_agendamento.isoformat(),
+        'hora_agendamento': agendamento.hora_agendamento.isoformat(),
+        'tecnico': agendamento.tecnico.nome if agendamento.tecnico else None,
+        'atendido_por': agendamento.atendido_por.nome if agendamento.atendido_por else None,
+        'situacao': agendamento.situacao,
+        'situacao_display': agendamento.get_situacao_display(),
+        'descricao': agendamento.descricao,
+    }
+
+# Abas do histórico do cliente: consulta (com os relacionados num JOIN),
+# ordenação pelos índices (cliente, data), template das linhas e JSON.
+HISTORICOS = {
+    'os': (lambda cliente: OrdemDeServico.objects.filter(cliente=cliente).select_related('tecnico_responsavel'),
+           ['-data_abertura', '-pk'], 'cliente/historico_os.html', _ordem_em_json),
+    'agendamentos': (lambda cliente: Agendamento.objects.filter(cliente=cliente).select_related('tecnico', 'atendido_por'),
+                     ['-data_agendamento', '-pk'], 'cliente/historico_agendamentos.html', _agendamento_em_json),
+}
+
 @login_required
 def criar_cliente(request):
     if request.method == 'POST':
@@ -87,7 +163,7 @@ def excluir_cliente(request, pk):
 # ==================================
 @login_required
 def listar_sistemas(request):
-    sistemas = Sistema.objects.all()
+    sistemas = referencias.sistemas()
     return render(request, 'cliente/listar_sistemas.html', {'sistemas': sistemas})
 
 @login_required
@@ -108,7 +184,7 @@ def criar_sistema(request):
 # ==================================
 @login_required
 def listar_tecnicos(request):
-    tecnicos = Tecnico.objects.all()
+    tecnicos = referencias.tecnicos()
     return render(request, 'cliente/listar_tecnicos.html', {'tecnicos': tecnicos})
 
 @login_required
@@ -130,7 +206,86 @@ def criar_tecnico(request):
 @login_required
 def listar_agendamentos(request):
     agendamentos = Agendamento.objects.filter(situacao='AGENDADO').select_related('cliente', 'tecnico')
-    return render(request, 'cliente/listar_agendamentos.html', {'agendamentos': agendamentos})
+    # Filtro por cliente com autocompletar: só o cliente escolhido vai para a página.
+    cliente_id = request.GET.get('cliente', '')
+    cliente_filtro = Cliente.objects.filter(pk=cliente_id).first() if cliente_id.isdigit() else None
+    if cliente_filtro:
+        agendamentos = agendamentos.filter(cliente=cliente_filtro)
+    return render(request, 'cliente/listar_agendamentos.html', {'agendamentos': agendamentos, 'cliente_filtro': cliente_filtro})
+
+@login_required
+def agenda_tecnicos(request):
+    """Calendário técnico x dia (visões dia, semana e mês) com uma única consulta de agendamentos."""
+    visao = request.GET.get('visao') if request.GET.get('visao') in agenda.VISOES else 'semana'
+    try:
+        referencia = date.fromisoformat(request.GET.get('data', ''))
+    except ValueError:
+        referencia = timezone.localdate()
+    tecnico_id = request.GET.get('tecnico', '')
+    tecnico_id = int(tecnico_id) if tecnico_id.isdigit() else None
+
+    dias = agenda.periodo(visao, referencia)
+    anterior = dias[0] - timedelta(days=1)
+    proxima = dias[-1] + timedelta(days=1)
+    context = {
+        'visao': visao,
+        'dias': dias,
+        'linhas': agenda.grade(dias, tecnico_id),
+        'tecnicos': referencias.tecnicos(),
+        'tecnico_id': tecnico_id,
+        'anterior': agenda.periodo(visao, anterior)[0],
+        'proxima': proxima,
+        'hoje': timezone.localdate(),
+    }
+    return render(request, 'cliente/agenda_tecnicos.html', context)
+
+@login_required
+def escalonar_agendamentos(request):
+    """Proposta de distribuição das visitas pendentes de um dia entre os técnicos; POST grava a escala."""
+    dados = request.POST if request.method == 'POST' else request.GET
+    try:
+        dia = date.fromisoformat(dados.get('data', ''))
+    except ValueError:
+        dia = timezone.localdate() + timedelta(days=1)
+    tecnicos = referencias.tecnicos()
+    escolhidos = {int(pk) for pk in dados.getlist('tecnicos') if pk.isdigit()}
+    tecnico_ids = [tecnico.pk for tecnico in tecnicos if tecnico.pk in escolhidos] if escolhidos else None
+    reatribuir = dados.get('reatribuir') == '1'
+    if escolhidos and not tecnico_ids:
+        # Formulário antigo, com técnicos que já foram excluídos: não distribui entre todos sem avisar.
+        messages.error(request, f"Técnico(s) inexistente(s): {', '.join(map(str, sorted(escolhidos)))}.")
+        return redirect(f"{reverse('escalonar_agendamentos')}?data={dia.isoformat()}")
+
+    if request.method == 'POST':
+        _, alterados = escalonamento.aplicar(dia, tecnico_ids, reatribuir)
+        messages.success(request, f'Escala de {dia:%d/%m/%Y} gravada: {len(alterados)} agendamento(s) atualizado(s).')
+        return redirect(f"{reverse('agenda_tecnicos')}?visao=dia&data={dia.isoformat()}")
+
+    agendamentos, escala = escalonamento.propor(dia, tecnico_ids, reatribuir)
+    por_pk = {agendamento.pk: agendamento for agendamento in agendamentos}
+    disponiveis = [tecnico.pk for tecnico in tecnicos] if tecnico_ids is None else tecnico_ids
+    nomes = {tecnico.pk: tecnico for tecnico in tecnicos}
+    grupos = [
+        {
+            'tecnico': nomes[tecnico_id],
+            'carga': escala.carga[tecnico_id],
+            'visitas': [por_pk[pk] for pk, atribuido in escala.atribuicoes.items() if atribuido == tecnico_id],
+        }
+        for tecnico_id in disponiveis
+    ]
+    for grupo in grupos:
+        grupo['visitas'].sort(key=lambda agendamento: (agendamento.hora_agendamento, agendamento.pk))
+    context = {
+        'dia': dia,
+        'tecnicos': tecnicos,
+        'escolhidos': set(disponiveis),
+        'reatribuir': reatribuir,
+        'grupos': grupos,
+        'sem_tecnico': [por_pk[pk] for pk in escala.sem_tecnico],
+        'alteracoes': sum(1 for agendamento in agendamentos
+                          if escala.atribuicoes.get(agendamento.pk, agendamento.tecnico_id) != agendamento.tecnico_id),
+    }
+    return render(request, 'cliente/escalonar_agendamentos.html', context)
 
 @login_required
 def criar_agendamento(request, cliente_pk):
@@ -205,11 +360,34 @@ def fechar_ordem_de_servico(request, pk):
 @login_required
 def imprimir_ordem_de_servico_pdf(request, pk):
     os = get_object_or_404(OrdemDeServico, pk=pk)
-    pdf = render_to_pdf('cliente/pdf_os.html', {'os': os})
-    if pdf:
-        response = HttpResponse(pdf, content_type='application/pdf')
-        filename = f"OS_{os.id}_{os.cliente.razao_social}.pdf"
-        content = f"inline; filename={filename}"
-        response['Content-Disposition'] = content
-        return response
-    return HttpResponse("Erro ao gerar PDF", status=400)
\ No newline at end of file
+    tarefa = relatorios.solicitar('ordem_servico', {'pk': os.pk}, usuario=request.user)
+    if tarefa.status == 'CONCLUIDA':
+        return redirect('baixar_relatorio', pk=tarefa.pk)
+    return redirect('acompanhar_relatorio', pk=tarefa.pk)
+
+@login_required
+def imprimir_ordens_servico_lote(request):
+    """Um PDF com as OS de um período e/ou cliente, gerado pela fila de relatórios."""
+    form = ImpressaoOrdensServicoForm(request.GET or None)
+    if form.is_valid():
+        parametros = form.parametros()
+        quantidade = relatorios.ordens_do_lote(parametros).count()
+        if not quantidade:
+            form.add_error(None, "Nenhuma ordem de serviço encontrada.")
+        elif quantidade > relatorios.LIMITE_ORDENS_LOTE:
+            form.add_error(None, f"{quantidade} ordens de serviço: o limite por impressão é {relatorios.LIMITE_ORDENS_LOTE}. "
+                                 "Reduza o período.")
+        else:
+            tarefa = relatorios.solicitar('ordens_servico_lote', parametros, usuario=request.user)
+            if tarefa.status == 'CONCLUIDA':
+                return redirect('baixar_relatorio', pk=tarefa.pk)
+            return redirect('acompanhar_relatorio', pk=tarefa.pk)
+    return render(request, 'cliente/imprimir_os_lote.html', {'form': form})
+
+@login_required
+def analise_ordens_servico(request):
+    """Faturamento por mês, sistema e técnico e tempo de fechamento (média e p90) das OS concluídas."""
+    meses = request.GET.get('meses', '')
+    meses = min(int(meses), analise_os.MESES_MAXIMO) if meses.isdigit() and int(meses) else analise_os.MESES_PADRAO
+    context = {'meses': meses, 'opcoes_meses': (3, 6, 12, 24, 36), **analise_os.painel(meses)}
+    return render(request, 'cliente/analise_os.html', context)